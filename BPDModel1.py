@@ -1,4 +1,5 @@
-from Helpers.AbstractModel import AbstractModel
+from Helpers.AbstractModel import AbstractModel, MODEL_INTEGRATORS
+from Helpers.ModelOutputArrays import ModelOutputArrays
 import numpy as np
 
 class BPDModel1(AbstractModel):
@@ -9,21 +10,50 @@ class BPDModel1(AbstractModel):
     OMEGA2:float = 1.0      # restoring coefficient (ω²)
     B:float = -1.0          # nonlinear damping coeff
     _moodVelocity:float = 0
+    _integrator:str = 'euler'
+
+    @property
+    def Integrator(self):
+        return self._integrator
 
     # --------------------------
     # Constructor
     # --------------------------
-    def __init__(self, initialMood:float=0.5, initialMoodVelocity:float=0, initialTreatmentEffect:float=0):
+    def __init__(self, initialMood:float=0.5, initialMoodVelocity:float=0, initialTreatmentEffect:float=0,
+                 integrator:str='euler'):
         super().__init__(initialMood, initialTreatmentEffect)
+        if integrator not in MODEL_INTEGRATORS:
+            raise ValueError(f'Unknown integrator {integrator}, expected one of {MODEL_INTEGRATORS}')
         self._moodVelocity = initialMoodVelocity
+        self._integrator = integrator
 
     # --------------------------
-    # ODE step (Euler integration)
+    # Classic RK4 step of the mood oscillator; returns the new mood (before the model state clamps it) and velocity
+    # --------------------------
+    def _rk4(self, mood:float, moodVel:float, treatmentEffect:float, DT:float) -> tuple:
+        alpha:float = self.ALPHA; omega2:float = self.OMEGA2; b:float = self.B
+        def accel(m, v):
+            return -alpha * v - omega2 * m - b * (m**2) * v + treatmentEffect
+        k1m = moodVel;                  k1v = accel(mood, moodVel)
+        k2m = moodVel + 0.5 * DT * k1v; k2v = accel(mood + 0.5 * DT * k1m, k2m)
+        k3m = moodVel + 0.5 * DT * k2v; k3v = accel(mood + 0.5 * DT * k2m, k3m)
+        k4m = moodVel + DT * k3v;       k4v = accel(mood + DT * k3m, k4m)
+        return (mood + DT * (k1m + 2 * k2m + 2 * k3m + k4m) / 6,
+                moodVel + DT * (k1v + 2 * k2v + 2 * k3v + k4v) / 6)
+
+    # --------------------------
+    # ODE step (Euler integration, or RK4 with integrator='rk4')
     # --------------------------
     def step(self, treatmentEffect:float, DT:float=0.04):
         curMood:float = super().ModelState.BpdMood
         curMoodVel:float = self._moodVelocity
 
+        if self._integrator == 'rk4':
+            newMood, self._moodVelocity = self._rk4(curMood, curMoodVel, treatmentEffect, DT)
+            super().ModelState.BpdMood = newMood
+            super().ModelState.BpdTreatmentEffect = treatmentEffect
+            return
+
         dMood:float = curMoodVel
         dMoodVelocity:float = -self.ALPHA * curMoodVel - self.OMEGA2 * curMood - self.B * (curMood**2) * curMoodVel + treatmentEffect
         
@@ -33,4 +63,32 @@ class BPDModel1(AbstractModel):
         self._moodVelocity = newMoodVelocity
         super().ModelState.BpdMood = newMood
         super().ModelState.BpdTreatmentEffect = treatmentEffect
-    
+
+    # --------------------------
+    # Batch of Euler steps on local floats (same result as calling step() per treatment effect)
+    # --------------------------
+    def step_many(self, treatmentEffects:np.ndarray, DT:float=0.04, out:ModelOutputArrays=None) -> ModelOutputArrays:
+        if self._integrator == 'rk4':
+            return super().step_many(treatmentEffects, DT=DT, out=out)
+        treatmentEffects = np.asarray(treatmentEffects, dtype=np.float64)
+        out = ModelOutputArrays.Prepare(len(treatmentEffects), out)
+        alpha:float = self.ALPHA; omega2:float = self.OMEGA2; b:float = self.B
+        curMood = self.ModelState.BpdMood
+        curMoodVel = self._moodVelocity
+        moodOut:np.ndarray = out.BpdMood
+
+        for k, treatmentEffect in enumerate(treatmentEffects.tolist()):
+            dMood = curMoodVel
+            dMoodVelocity = -alpha * curMoodVel - omega2 * curMood - b * (curMood**2) * curMoodVel + treatmentEffect
+            newMood = curMood + dMood * DT
+            curMoodVel = curMoodVel + dMoodVelocity * DT
+            # the model state clamps the mood, and the next step continues from the clamped value
+            curMood = min(max(newMood, -1.0), 1.0)
+            moodOut[k] = curMood
+
+        out.BpdTreatmentEffect[:len(treatmentEffects)] = treatmentEffects
+        self._moodVelocity = curMoodVel
+        if len(treatmentEffects) > 0:
+            super().ModelState.BpdMood = curMood
+            super().ModelState.BpdTreatmentEffect = treatmentEffects[-1].item()
+        return out
@@ -1,8 +1,12 @@
-from Helpers.AbstractModel import AbstractModel
+from Helpers.AbstractModel import AbstractModel, MODEL_INTEGRATORS
 import numpy as np
 import os
 from math import erf   # ✅ error function
-from BPDModel2Configuration import BPDModel2Configuration
+from BPDModel2Configuration import BPDModel2Configuration, CompiledBPDModel2Configuration, INJECT_MODES
+from BPDModel2Configuration import INJECT_ADD_TO_LAMBDA, INJECT_ADD_TO_G, INJECT_ADD_TO_P, INJECT_ADD_TO_EB, INJECT_TILT_TO_PN
+from Helpers.SigmoidTransfer import SigmoidTransfer
+from Helpers.ModelOutputArrays import ModelOutputArrays
+from Helpers.BPDModel2Kernel import GetStepKernel, GetStepManyKernel, GetRK4StepKernel, bpd_model2_step_many
 
 class BPDModel2(AbstractModel):
 
@@ -10,12 +14,33 @@ class BPDModel2(AbstractModel):
     # State variables
     # --------------------------
     _currentConfiguration:BPDModel2Configuration
+    # snapshot of the current configuration that the step reads (rebuilt when the configuration changes)
+    _compiled:CompiledBPDModel2Configuration
     _P0:float
     _N0:float
     _buf_len:int
     _P_buf:np.ndarray
     _N_buf:np.ndarray
     _i:int
+    _bufDt:float
+
+    # --------------------------
+    # S1/S2 transfer functions (rebuilt when G1/G2 change)
+    # --------------------------
+    _s1:SigmoidTransfer
+    _s2:SigmoidTransfer
+
+    # --------------------------
+    # Compiled step kernel (None when using the Python step)
+    # --------------------------
+    _kernel:object
+    _kernelMany:object
+
+    # --------------------------
+    # Integrator ('euler' or 'rk4', see MODEL_INTEGRATORS) and the rk4 step (always set, Python or compiled)
+    # --------------------------
+    _integrator:str
+    _kernelRK4:object
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -24,7 +49,14 @@ class BPDModel2(AbstractModel):
     
     @CurrentConfiguration.setter
     def CurrentConfiguration(self, val):
-        self._currentConfiguration = val
+        if val is not self._currentConfiguration:
+            self._currentConfiguration = val
+            self._compiled = None
+            self.SyncDelayBuffer()
+
+    @property
+    def Integrator(self):
+        return self._integrator
 
     # --------------------------
     # Constructor
@@ -46,10 +78,27 @@ class BPDModel2(AbstractModel):
                  P0:float=100.0, 
                  N0:float=100.0,
                  initialMood:float=0.5, 
-                 initialTreatmentEffect:float=0):
+                 initialTreatmentEffect:float=0,
+                 kernel:str='auto',
+                 integrator:str='euler',
+                 reference_dt:float=None):
 
         super().__init__(mood=initialMood, treatmentEffect=initialTreatmentEffect)
 
+        self._s1 = None
+        self._s2 = None
+        self._compiled = None
+
+        self._kernel = GetStepKernel(kernel)
+        self._kernelMany = GetStepManyKernel(kernel)
+
+        # 'euler' runs the per-tick map of the model; 'rk4' integrates the delay equation behind it, with Gain and the
+        # injection amounts taken per reference_dt seconds (default: dt), and S1/S2 always evaluated exactly
+        if integrator not in MODEL_INTEGRATORS:
+            raise ValueError(f'Unknown integrator {integrator}, expected one of {MODEL_INTEGRATORS}')
+        self._integrator = integrator
+        self._kernelRK4 = GetRK4StepKernel(kernel)
+
         self._currentConfiguration = BPDModel2Configuration(
                  g1 = g1,
                  g2 = g2,
@@ -63,7 +112,8 @@ class BPDModel2(AbstractModel):
                  tmax = tmax,
                  injectMode = injectMode,
                  delay_seconds = delay_seconds,
-                 g_gain = g_gain
+                 g_gain = g_gain,
+                 reference_dt = reference_dt
         )
 
         self.reset(P0, N0)
@@ -77,19 +127,56 @@ class BPDModel2(AbstractModel):
         self._P_buf[0] = P0
         self._N_buf[0] = N0
         self._i = 0
+        self._bufDt = self.CurrentConfiguration.Dt
+
+    # --------------------------
+    # Fit the delay ring buffer to the current configuration's Dt and Delay_Steps without losing the trajectory:
+    # the P/N history is resampled onto the new time grid. Called when the configuration is swapped; call it
+    # after changing Dt or Delay_Seconds of the current configuration in place
+    # --------------------------
+    def SyncDelayBuffer(self):
+        dt = self.CurrentConfiguration.Dt
+        buf_len = max(8, self.CurrentConfiguration.Delay_Steps + 10)
+        if dt == self._bufDt and buf_len == self._buf_len:
+            return
+
+        # history written so far, newest first, at lags of 0, 1, 2, ... old time steps
+        valid = min(self._i + 1, self._buf_len)
+        oldTimes = -np.arange(valid) * self._bufDt
+        oldIdx = (self._i - np.arange(valid)) % self._buf_len
+
+        # sample it at lags of the new time step (np.interp holds the oldest value beyond the history)
+        newLags = np.arange(buf_len)
+        newTimes = -newLags * dt
+        newIdx = (self._i - newLags) % buf_len
+        P_buf = np.empty(buf_len)
+        N_buf = np.empty(buf_len)
+        P_buf[newIdx] = np.interp(newTimes, oldTimes[::-1], self._P_buf[oldIdx][::-1])
+        N_buf[newIdx] = np.interp(newTimes, oldTimes[::-1], self._N_buf[oldIdx][::-1])
+
+        self._P_buf = P_buf
+        self._N_buf = N_buf
+        self._buf_len = buf_len
+        self._bufDt = dt
 
     # --------------------------
     def f(self, x): return erf(x - 2.0)
 
+    # --------------------------
+    def _transfer(self, transfer:SigmoidTransfer, g:float) -> SigmoidTransfer:
+        if transfer is None or transfer.G != g:
+            transfer = SigmoidTransfer(g)
+        return transfer
+
     # --------------------------
     def S1(self, x):
-        denom = (self.f(self.CurrentConfiguration.G1) - self.f(0.0))
-        return (self.f(self.CurrentConfiguration.G1 * x) - self.f(0.0)) / denom if denom != 0 else 0.0
+        self._s1 = self._transfer(self._s1, self.CurrentConfiguration.G1)
+        return self._s1.Evaluate(x)
 
     # --------------------------
     def S2(self, x):
-        denom = (self.f(self.CurrentConfiguration.G2) - self.f(0.0))
-        return (self.f(self.CurrentConfiguration.G2 * x) - self.f(0.0)) / denom if denom != 0 else 0.0
+        self._s2 = self._transfer(self._s2, self.CurrentConfiguration.G2)
+        return self._s2.Evaluate(x)
 
     # --------------------------
     def qP(self, eb): return self.CurrentConfiguration.QPMin + self.S1(eb) * (self.CurrentConfiguration.QPMax - self.CurrentConfiguration.QPMin)
@@ -106,47 +193,99 @@ class BPDModel2(AbstractModel):
     # --------------------------
     def current_indices(self):
         cur_idx = self._i % self._buf_len
-        delay_idx = (self._i - self.CurrentConfiguration.Delay_Steps) % self._buf_len
+        delay_idx = (self._i - self._compiledConfiguration().Delay_Steps) % self._buf_len
         return cur_idx, delay_idx
 
+    # --------------------------
+    # Compiled snapshot of the current configuration; recompiled (with the S1/S2 transfers) only after the
+    # configuration was swapped or one of its setters changed a value
+    def _compiledConfiguration(self) -> CompiledBPDModel2Configuration:
+        compiled = self._compiled
+        if compiled is None or compiled.Version != self._currentConfiguration.Version:
+            compiled = self._currentConfiguration.Compile()
+            self._compiled = compiled
+            self._s1 = self._transfer(self._s1, compiled.G1)
+            self._s2 = self._transfer(self._s2, compiled.G2)
+        return compiled
+
+    # --------------------------
+    # Configuration values in the argument order of the step kernels (after P_buf, N_buf, i)
+    def _kernel_parameters(self) -> tuple:
+        return self._compiledConfiguration().KernelParameters
+
+    # --------------------------
+    def _step_kernel(self, treatmentEffect:float):
+        EB_next, P_next, N_next = self._kernel(self._P_buf, self._N_buf, self._i, *self._kernel_parameters(), treatmentEffect)
+        self._i += 1
+
+        self.ModelState.BpdMood = 2 * (EB_next - 0.5)
+        self.ModelState.BpdTreatmentEffect = treatmentEffect
+
+        return EB_next, P_next, N_next
+
+    # --------------------------
+    def _step_rk4(self, treatmentEffect:float):
+        EB_next, P_next, N_next = self._kernelRK4(self._P_buf, self._N_buf, self._i,
+                                                  *self._compiledConfiguration().RK4KernelParameters, treatmentEffect)
+        self._i += 1
+
+        self.ModelState.BpdMood = 2 * (EB_next - 0.5)
+        self.ModelState.BpdTreatmentEffect = treatmentEffect
+
+        return EB_next, P_next, N_next
+
     # --------------------------
     def step(self, treatmentEffect:float=0.0, DT:float=0.04):
 
         # self.CurrentConfiguration.Dt = DT
 
-        cur_idx, delay_idx = self.current_indices()
-        P_cur = self._P_buf[cur_idx]; N_cur = self._N_buf[cur_idx]
+        if self._integrator == 'rk4':
+            return self._step_rk4(treatmentEffect)
+        if self._kernel is not None:
+            return self._step_kernel(treatmentEffect)
+
+        # everything configuration dependent comes from the compiled snapshot, read once into locals
+        cfg = self._compiledConfiguration()
+        mode = cfg.InjectModeCode
+        P_buf, N_buf, buf_len, i = self._P_buf, self._N_buf, self._buf_len, self._i
+        cur_idx = i % buf_len
+        delay_idx = (i - cfg.Delay_Steps) % buf_len
+        P_cur = P_buf[cur_idx]; N_cur = N_buf[cur_idx]
         total = P_cur + N_cur
         EB = P_cur / total if total > 1e-9 else 0.5
 
-        qP_val, qN_val = self.qP(EB), self.qN(EB)
-        tP_val, tN_val = self.tP(EB), self.tN(EB)
+        # S1/S2 are shared by qP/tP and qN/tN, so evaluate each once
+        s1, s2 = self._s1.Evaluate(EB), self._s2.Evaluate(EB)
+        qP_val = cfg.QPMin + s1 * cfg.QPRange
+        qN_val = cfg.QNMin + (1.0 - s2) * cfg.QNRange
+        tP_val = cfg.TMin + s1 * cfg.TRange
+        tN_val = cfg.TMin + (1.0 - s2) * cfg.TRange
 
-        lamb_eff, g_eff = self.CurrentConfiguration.Lamb, self.CurrentConfiguration.Gain
+        lamb_eff, g_eff = cfg.Lamb, cfg.Gain
         P_next, N_next = P_cur, N_cur  # init with current
 
-        if self.CurrentConfiguration.InjectMode == 'add_to_lambda':
-            lamb_eff = self.CurrentConfiguration.Lamb + treatmentEffect
-        elif self.CurrentConfiguration.InjectMode == 'add_to_g':
-            g_eff = self.CurrentConfiguration.Gain + treatmentEffect
+        if mode == INJECT_ADD_TO_LAMBDA:
+            lamb_eff = lamb_eff + treatmentEffect
+        elif mode == INJECT_ADD_TO_G:
+            g_eff = g_eff + treatmentEffect
 
         # base dynamics
-        P_delay, N_delay = self._P_buf[delay_idx], self._N_buf[delay_idx]
+        P_delay, N_delay = P_buf[delay_idx], N_buf[delay_idx]
         diffP, diffN = (P_cur - P_delay), (N_cur - N_delay)
 
         dP = -P_cur / tP_val + lamb_eff * qP_val
         dN = -N_cur / tN_val + lamb_eff * qN_val
-        P_next = P_cur + self.CurrentConfiguration.Dt * dP + g_eff * diffP
-        N_next = N_cur + self.CurrentConfiguration.Dt * dN + g_eff * diffN
+        P_next = P_cur + cfg.Dt * dP + g_eff * diffP
+        N_next = N_cur + cfg.Dt * dN + g_eff * diffN
 
         # ✅ Injection modes
-        if self.CurrentConfiguration.InjectMode == 'add_to_P':
+        if mode == INJECT_ADD_TO_P:
             P_next += treatmentEffect * 1.0
-        elif self.CurrentConfiguration.InjectMode == 'add_to_EB':
+        elif mode == INJECT_ADD_TO_EB:
             # push EB directly by biasing P vs N
             P_next += treatmentEffect * 10.0
             N_next -= treatmentEffect * 10.0
-        elif self.CurrentConfiguration.InjectMode == 'tilt_to_PN':
+        elif mode == INJECT_TILT_TO_PN:
             if treatmentEffect > 0:
                 P_next += abs(treatmentEffect) * 10.0
             else:
@@ -156,10 +295,10 @@ class BPDModel2(AbstractModel):
         P_next = max(1e-6, min(P_next, 1e6))
         N_next = max(1e-6, min(N_next, 1e6))
 
-        next_idx = (self._i + 1) % self._buf_len
-        self._P_buf[next_idx] = P_next
-        self._N_buf[next_idx] = N_next
-        self._i += 1
+        next_idx = (i + 1) % buf_len
+        P_buf[next_idx] = P_next
+        N_buf[next_idx] = N_next
+        self._i = i + 1
 
         EB_next = P_next / (P_next + N_next) if (P_next + N_next) > 1e-9 else 0.5
         EB_next = min(1.0, max(0.0, EB_next))
@@ -169,32 +308,64 @@ class BPDModel2(AbstractModel):
 
         return EB_next, P_next, N_next
     
+    # --------------------------
+    # Advance one tick per treatment effect with the current configuration, writing EB/P/N/mood of every tick
+    # into 'out' (allocated when not given). Leaves the model in the same state as calling step() per effect
+    # --------------------------
+    def step_many(self, treatmentEffects:np.ndarray, DT:float=0.04, out:ModelOutputArrays=None) -> ModelOutputArrays:
+        treatmentEffects = np.asarray(treatmentEffects, dtype=np.float64)
+        count:int = len(treatmentEffects)
+        out = ModelOutputArrays.Prepare(count, out, includeState=True)
+        if count == 0:
+            return out
+
+        if self._integrator == 'rk4':
+            for k, treatmentEffect in enumerate(treatmentEffects.tolist()):
+                out.EB[k], out.P[k], out.N[k] = self.step(treatmentEffect, DT=DT)
+                out.BpdMood[k] = self.ModelState.BpdMood
+        elif self._kernelMany is not None:
+            self._kernelMany(self._P_buf, self._N_buf, self._i, *self._kernel_parameters(),
+                             treatmentEffects, out.EB, out.P, out.N, out.BpdMood)
+            self._i += count
+        else:
+            P_buf, N_buf = self._P_buf.tolist(), self._N_buf.tolist()
+            bpd_model2_step_many(P_buf, N_buf, self._i, *self._kernel_parameters(),
+                                 treatmentEffects.tolist(), out.EB, out.P, out.N, out.BpdMood)
+            self._P_buf[:] = P_buf
+            self._N_buf[:] = N_buf
+            self._i += count
+
+        out.BpdTreatmentEffect[:count] = treatmentEffects
+        self.ModelState.BpdMood = out.BpdMood[count - 1].item()
+        self.ModelState.BpdTreatmentEffect = treatmentEffects[-1].item()
+        return out
+
     # ------------------------------------------------------------------------------------------------------------
     def on_key(self, event):
         printMsg:bool = False
 
         if event.key == 'l': 
-            self.CurrentConfiguration.Lamb = max(0.0, self.lamb - 0.05)
+            self.CurrentConfiguration.Lamb = max(0.0, self.CurrentConfiguration.Lamb - 0.05)
             printMsg = True
         elif event.key == 'L': 
             self.CurrentConfiguration.Lamb += 0.05
             printMsg = True
         elif event.key == 'g': 
-            self.CurrentConfiguration.Gain = max(0.0, self.g_gain - 0.005)
+            self.CurrentConfiguration.Gain = max(0.0, self.CurrentConfiguration.Gain - 0.005)
             printMsg = True
         elif event.key == 'G': 
             self.CurrentConfiguration.Gain += 0.005
             printMsg = True
         elif event.key == 't': 
-            self.CurrentConfiguration.Dt = max(0.0005, self.dt - 0.0005)
-            self.reset()
+            self.CurrentConfiguration.Dt = max(0.0005, self.CurrentConfiguration.Dt - 0.0005)
+            self.SyncDelayBuffer()
             printMsg = True
         elif event.key == 'T': 
             self.CurrentConfiguration.Dt += 0.0005
-            self.reset()
+            self.SyncDelayBuffer()
             printMsg = True
         elif event.key == 'm':
-            modes = ['add_to_lambda', 'add_to_g', 'add_to_P', 'add_to_EB', 'tilt_to_PN']
+            modes = INJECT_MODES
             self.CurrentConfiguration.InjectMode = modes[(modes.index(self.CurrentConfiguration.InjectMode) + 1) % len(modes)]
             printMsg = True
         elif event.key == 'r': 
@@ -0,0 +1,335 @@
+# ------------------------------------------------------------------------------------------------------------
+# Equilibrium and linear stability analysis of BPDModel2 configurations, without simulating them. For a constant
+# treatment effect, the fixed points of the model's per-tick map (the 'euler' integrator) solve
+#   P = tP(EB) * (lambda * qP(EB) + injectionP / Dt),  N = tN(EB) * (lambda * qN(EB) + injectionN / Dt)
+# with EB = P / (P + N), found as the roots of a scalar equation in EB. Around every fixed point the map is
+# linearised, including the Gain * (x[n] - x[n - Delay_Steps]) term: per eigenvalue mu of the 2x2 Jacobian of the
+# P/N rates, the characteristic polynomial of the delayed map is
+#   z^(D+1) - (1 + Dt*mu + Gain) * z^D + Gain = 0
+# The fixed point is stable when all its roots lie inside the unit circle; the dominant root gives the growth rate
+# and the predicted oscillation frequency. Everything is vectorised over arrays of configurations (a sweep point
+# per entry, as in Sweep.py).
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+from math import pi, sqrt
+
+import numpy as np
+
+from BPDModel2Configuration import BPDModel2Configuration
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from Helpers.SigmoidTransfer import SIGMOID_F0, ErfArray, SigmoidDenominators
+from ModelSetup import MODEL_UPDATE_INTERVAL, CreateModel, AddModelConfigurations, ScheduleDefaults
+from Sweep import CONFIGURATION_FIELDS, ParseParameter, GridPoints, LatinHypercubePoints
+
+# Per fixed point results (arrays of shape points x fixed points, NaN / False where a point has fewer fixed points)
+FIXED_POINT_FIELDS:list = ['eb', 'p', 'n', 'stable', 'spectral_radius', 'growth_rate', 'frequency']
+
+# Points on the EB axis searched for sign changes (fixed points closer together than 1/resolution can be missed)
+_ROOT_RESOLUTION:int = 512
+_BISECTION_STEPS:int = 40
+_NEWTON_STEPS:int = 30
+
+# ------------------------------------------------------------------------------------------------------------
+# One array per configuration field (see CONFIGURATION_FIELDS), 'points' overriding the fields of 'baseConfiguration'
+def _ParameterArrays(points:dict, baseConfiguration:BPDModel2Configuration) -> tuple:
+    count = len(next(iter(points.values()))) if len(points) > 0 else 1
+    arrays = {field: np.full(count, float(getattr(baseConfiguration, field))) for field in CONFIGURATION_FIELDS}
+    for field, values in points.items():
+        if field not in CONFIGURATION_FIELDS:
+            raise ValueError(f'Unknown configuration field {field}, expected one of {list(CONFIGURATION_FIELDS)}')
+        arrays[field] = np.asarray(values, dtype=np.float64).reshape(count)
+    return count, arrays
+
+# ------------------------------------------------------------------------------------------------------------
+# Per tick injection into P and N for a constant treatment effect, and the lambda and gain it leaves
+# (same rules as BPDModel2.step)
+def _Injection(injectMode:str, treatmentEffect:float, lamb:np.ndarray, gain:np.ndarray) -> tuple:
+    injectP, injectN = 0.0, 0.0
+    if injectMode == 'add_to_lambda':
+        lamb = lamb + treatmentEffect
+    elif injectMode == 'add_to_g':
+        gain = gain + treatmentEffect
+    elif injectMode == 'add_to_P':
+        injectP = treatmentEffect * 1.0
+    elif injectMode == 'add_to_EB':
+        injectP, injectN = treatmentEffect * 10.0, -treatmentEffect * 10.0
+    elif injectMode == 'tilt_to_PN':
+        if treatmentEffect > 0:
+            injectP = abs(treatmentEffect) * 10.0
+        else:
+            injectN = abs(treatmentEffect) * 10.0
+    return injectP, injectN, lamb, gain
+
+# ------------------------------------------------------------------------------------------------------------
+# S(EB) and dS/dEB of the normalized sigmoid with gain g and normalizer f(g) - f(0) (arrays broadcast against
+# each other)
+def _Sigmoid(g:np.ndarray, eb:np.ndarray, denominator:np.ndarray) -> tuple:
+    safe = np.where(denominator != 0, denominator, 1.0)
+    u = g * eb - 2.0
+    s = np.where(denominator != 0, (ErfArray(u) - SIGMOID_F0) / safe, 0.0)
+    ds = np.where(denominator != 0, g * (2.0 / sqrt(pi)) * np.exp(-u * u) / safe, 0.0)
+    return s, ds
+
+# ------------------------------------------------------------------------------------------------------------
+# Equilibrium P and N for an assumed EB, and the rate terms at it: (P, N, S1, dS1, S2, dS2, tP, tN).
+# sigmoids are (S1, dS1, S2, dS2) at eb when already known
+def _Equilibrium(p:dict, eb:np.ndarray, lamb, injectP, injectN, sigmoids:tuple=None) -> tuple:
+    if sigmoids is None:
+        sigmoids = _Sigmoid(p['G1'], eb, p['S1Denominator']) + _Sigmoid(p['G2'], eb, p['S2Denominator'])
+    s1, ds1, s2, ds2 = sigmoids
+    qP = p['QPMin'] + s1 * (p['QPMax'] - p['QPMin'])
+    qN = p['QNMin'] + (1.0 - s2) * (p['QNMax'] - p['QNMin'])
+    tP = p['TMin'] + s1 * (p['TMax'] - p['TMin'])
+    tN = p['TMin'] + (1.0 - s2) * (p['TMax'] - p['TMin'])
+    # the model clamps P and N to [1e-6, 1e6]
+    P = np.clip(tP * (lamb * qP + injectP / p['Dt']), 1e-6, 1e6)
+    N = np.clip(tN * (lamb * qN + injectN / p['Dt']), 1e-6, 1e6)
+    return P, N, s1, ds1, s2, ds2, tP, tN
+
+# ------------------------------------------------------------------------------------------------------------
+# Fixed points of every configuration: EB of each root of EB - P(EB) / (P(EB) + N(EB)) in [0, 1], as a
+# (points x fixed points) array padded with NaN
+def _FixedPoints(p:dict, lamb, injectP:float, injectN:float, resolution:int) -> np.ndarray:
+    count = len(p['Dt'])
+    lamb = np.broadcast_to(lamb, (count,))
+    grid = np.linspace(0.0, 1.0, resolution + 1)
+
+    # S1/S2 on the grid only depend on G1/G2, so they are evaluated once per distinct gain
+    sigmoids = ()
+    for name in ('G1', 'G2'):
+        gains, inverse = np.unique(p[name], return_inverse=True)
+        s, ds = _Sigmoid(gains[:, None], grid[None, :], SigmoidDenominators(gains)[:, None])
+        sigmoids += (s[inverse], ds[inverse])
+    P, N = _Equilibrium({field: values[:, None] for field, values in p.items()}, grid[None, :], lamb[:, None],
+                        injectP, injectN, sigmoids)[:2]
+    positive = (grid[None, :] - P / (P + N)) > 0
+    points, brackets = np.nonzero(positive[:, :-1] != positive[:, 1:])
+
+    # bisection of all brackets at once
+    low = grid[brackets]
+    high = grid[brackets + 1]
+    lowPositive = positive[points, brackets]
+    pb = {field: values[points] for field, values in p.items()}
+    lambb = lamb[points]
+    for _ in range(_BISECTION_STEPS):
+        middle = 0.5 * (low + high)
+        P, N = _Equilibrium(pb, middle, lambb, injectP, injectN)[:2]
+        moveLow = ((middle - P / (P + N)) > 0) == lowPositive
+        low = np.where(moveLow, middle, low)
+        high = np.where(moveLow, high, middle)
+
+    perPoint = np.bincount(points, minlength=count)
+    fixedPoints = np.full((count, max(1, perPoint.max())), np.nan)
+    slot = np.arange(len(points)) - np.concatenate(([0], np.cumsum(perPoint)[:-1]))[points]
+    fixedPoints[points, slot] = 0.5 * (low + high)
+    return fixedPoints
+
+# ------------------------------------------------------------------------------------------------------------
+# True where all roots of the polynomials (rows of coefficients, column j for z^j) lie strictly inside the unit
+# circle, by the Schur-Cohn recursion (each step removes one degree; rows are rescaled so they do not overflow)
+def _SchurStable(coefficients:np.ndarray) -> np.ndarray:
+    c = coefficients.astype(np.complex128)
+    stable = np.ones(len(c), dtype=bool)
+    for degree in range(c.shape[1] - 1, 0, -1):
+        leading, constant = c[:, degree], c[:, 0]
+        stable &= np.abs(leading) > np.abs(constant)
+        reflected = np.conj(c[:, degree::-1])
+        c = (np.conj(leading)[:, None] * c - constant[:, None] * reflected)[:, 1:]
+        c = c / np.maximum(np.abs(c).max(axis=1), 1e-300)[:, None]
+    return stable
+
+# ------------------------------------------------------------------------------------------------------------
+# Root of largest modulus of z^(D+1) - a * z^D + gain = 0 for arrays of complex a and gain with the same D.
+# The root that continues z = 1 (a = 1 + gain) is found by Newton's method, and is kept where its residual is
+# small and the Schur-Cohn test shows no root outside its circle; the remaining rows are solved as eigenvalue
+# problems of the companion matrix
+def _DominantRoot(a:np.ndarray, D:int, gain:np.ndarray) -> np.ndarray:
+    with np.errstate(all='ignore'):
+        candidates = []
+        slope = 1.0 - gain * D
+        for z in (a.copy(), 1.0 + (a - 1.0 - gain) / np.where(np.abs(slope) > 1e-3, slope, 1e-3)):
+            for _ in range(_NEWTON_STEPS):
+                zD1 = z ** (D - 1)
+                zD = zD1 * z
+                derivative = (D + 1) * zD - a * D * zD1
+                z = z - (zD * (z - a) + gain) / np.where(derivative != 0, derivative, 1.0)
+            candidates.append(z)
+        z = np.where(np.abs(candidates[1]) > np.abs(candidates[0]), candidates[1], candidates[0])
+
+        radius = np.abs(z)
+        residual = np.abs(z ** D * (z - a) + gain)
+        converged = np.isfinite(z) & (residual <= 1e-9 * (radius ** D * (radius + np.abs(a)) + np.abs(gain)))
+        coefficients = np.zeros((len(a), D + 2), dtype=np.complex128)
+        coefficients[:, 0], coefficients[:, D], coefficients[:, D + 1] = gain, -a, 1.0
+        scale = np.where(converged, radius, 1.0) * (1.0 + 1e-7)
+        coefficients *= scale[:, None] ** np.arange(D + 2)
+        certified = converged & _SchurStable(coefficients)
+
+    rows = np.nonzero(~certified)[0]
+    if len(rows) > 0:
+        companion = np.zeros((len(rows), D + 1, D + 1), dtype=np.complex128)
+        companion[:, 0, 0] = a[rows]
+        companion[:, 0, D] = -gain[rows]
+        companion[:, np.arange(1, D + 1), np.arange(D)] = 1.0
+        roots = np.linalg.eigvals(companion)
+        z[rows] = roots[np.arange(len(rows)), np.argmax(np.abs(roots), axis=1)]
+    return z
+
+# ------------------------------------------------------------------------------------------------------------
+# Fixed points and their linear stability for many configurations at once. 'points' maps configuration field names
+# (see CONFIGURATION_FIELDS) to one value per configuration; other fields come from 'baseConfiguration'. Returns
+# the FIXED_POINT_FIELDS arrays (points x fixed points), 'fixed_points' (number per point), 'stable_points'
+# (number of stable fixed points per point) and the swept fields. 'growth_rate' is ln|z|/Dt of the dominant root
+# (1/s, positive when perturbations grow) and 'frequency' its oscillation frequency in Hz (0 for a real root)
+def AnalyzeConfigurations(points:dict,
+                          baseConfiguration:BPDModel2Configuration,
+                          treatmentEffect:float=0.0,
+                          resolution:int=_ROOT_RESOLUTION) -> dict:
+    count, p = _ParameterArrays(points, baseConfiguration)
+    p['S1Denominator'] = SigmoidDenominators(p['G1'])
+    p['S2Denominator'] = SigmoidDenominators(p['G2'])
+    delaySteps = np.maximum(1, np.round(p['Delay_Seconds'] / p['Dt']).astype(np.int64))
+    injectP, injectN, lamb, gain = _Injection(baseConfiguration.InjectMode, treatmentEffect, p['Lamb'], p['Gain'])
+
+    fixedPoints = _FixedPoints(p, lamb, injectP, injectN, resolution)
+    rows, slots = np.nonzero(~np.isnan(fixedPoints))
+    eb = fixedPoints[rows, slots]
+
+    # Jacobian of the P/N rates at every fixed point
+    pr = {field: values[rows] for field, values in p.items()}
+    lambr = np.broadcast_to(lamb, (count,))[rows]
+    P, N, s1, ds1, s2, ds2, tP, tN = _Equilibrium(pr, eb, lambr, injectP, injectN)
+    dEBdP = N / (P + N) ** 2
+    dEBdN = -P / (P + N) ** 2
+    # d(rate)/dEB through qP/tP and qN/tN
+    dfPdEB = P * ds1 * (pr['TMax'] - pr['TMin']) / tP ** 2 + lambr * ds1 * (pr['QPMax'] - pr['QPMin'])
+    dfNdEB = -N * ds2 * (pr['TMax'] - pr['TMin']) / tN ** 2 - lambr * ds2 * (pr['QNMax'] - pr['QNMin'])
+    j11 = -1.0 / tP + dfPdEB * dEBdP
+    j12 = dfPdEB * dEBdN
+    j21 = dfNdEB * dEBdP
+    j22 = -1.0 / tN + dfNdEB * dEBdN
+    halfTrace = 0.5 * (j11 + j22)
+    root = np.sqrt((halfTrace ** 2 - (j11 * j22 - j12 * j21)).astype(np.complex128))
+    mu = np.concatenate([halfTrace + root, halfTrace - root])
+
+    # dominant root of the delayed map per Jacobian eigenvalue (grouped by delay), the larger of the two decides
+    a = 1.0 + np.tile(pr['Dt'], 2) * mu + np.tile(np.broadcast_to(gain, (count,))[rows], 2)
+    g = np.tile(np.broadcast_to(gain, (count,))[rows], 2).astype(np.complex128)
+    D = np.tile(delaySteps[rows], 2)
+    roots = np.zeros(len(a), dtype=np.complex128)
+    for steps in np.unique(D):
+        group = np.nonzero(D == steps)[0]
+        roots[group] = _DominantRoot(a[group], int(steps), g[group])
+    roots = roots.reshape(2, len(eb))
+    dominant = roots[np.argmax(np.abs(roots), axis=0), np.arange(len(eb))]
+    radius = np.abs(dominant)
+
+    shape = fixedPoints.shape
+    results = {name: np.full(shape, np.nan) for name in FIXED_POINT_FIELDS}
+    results['stable'] = np.zeros(shape, dtype=bool)
+    results['eb'] = fixedPoints
+    results['p'][rows, slots] = P
+    results['n'][rows, slots] = N
+    results['stable'][rows, slots] = radius < 1.0
+    results['spectral_radius'][rows, slots] = radius
+    with np.errstate(divide='ignore'):
+        results['growth_rate'][rows, slots] = np.log(radius) / pr['Dt']
+    # a real dominant root (up to rounding in the eigenvalue solver) does not oscillate
+    oscillating = np.abs(dominant.imag) > 1e-9 * radius
+    results['frequency'][rows, slots] = np.where(oscillating, np.abs(np.angle(dominant)), 0.0) / (2.0 * pi * pr['Dt'])
+    results['fixed_points'] = np.count_nonzero(~np.isnan(fixedPoints), axis=1)
+    results['stable_points'] = np.count_nonzero(results['stable'], axis=1)
+    results.update({field: np.asarray(values) for field, values in points.items()})
+    return results
+
+# ------------------------------------------------------------------------------------------------------------
+# Fixed points of a single configuration, as a list of {field: value} (see FIXED_POINT_FIELDS)
+def AnalyzeConfiguration(configuration:BPDModel2Configuration, treatmentEffect:float=0.0) -> list:
+    results = AnalyzeConfigurations({}, configuration, treatmentEffect)
+    return [{name: results[name][0, k].item() for name in FIXED_POINT_FIELDS} for k in range(results['fixed_points'][0])]
+
+# ------------------------------------------------------------------------------------------------------------
+def PrintAnalysis(title:str, configuration:BPDModel2Configuration, treatmentEffect:float=0.0):
+    fixedPoints = AnalyzeConfiguration(configuration, treatmentEffect)
+    print(f'{title}: {len(fixedPoints)} fixed point(s)')
+    for fixedPoint in fixedPoints:
+        behaviour = 'stable' if fixedPoint['stable'] else 'unstable'
+        if fixedPoint['frequency'] > 0:
+            behaviour += f', oscillates at {fixedPoint["frequency"]:.3f} Hz'
+        print(f'\tEB={fixedPoint["eb"]:.4f} P={fixedPoint["p"]:.3f} N={fixedPoint["n"]:.3f} '
+              f'|z|={fixedPoint["spectral_radius"]:.6f} growth={fixedPoint["growth_rate"]:+.4f}/s: {behaviour}')
+
+# ------------------------------------------------------------------------------------------------------------
+def WriteAnalysisOutput(path:str, results:dict):
+    if os.path.splitext(path)[1].lower() == '.csv':
+        columns, names = [], []
+        for name, values in results.items():
+            if values.ndim == 1:
+                columns.append(values)
+                names.append(name)
+            else:
+                for k in range(values.shape[1]):
+                    columns.append(values[:, k])
+                    names.append(f'{name}_{k}')
+        np.savetxt(path, np.column_stack(columns), delimiter=',', header=','.join(names), comments='')
+    else:
+        np.savez(path, **results)
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='BPDModel2Analysis.py',
+            description='Fixed points and linear stability of BPDModel2 configurations, without simulating them.\n' +
+            'Without --param, analyzes every period of the configuration schedule (ModelSetup.py or --schedule).\n' +
+            'With --param, analyzes a grid or Latin hypercube sample of configurations as in Sweep.py.\n',
+            epilog='Examples:\n' +
+            '  python BPDModel2Analysis.py --schedule schedule.yaml\n' +
+            '  python BPDModel2Analysis.py --param Lamb=0.1:2.0:200 --param Gain=0.0:0.2:50 -o stability.npz\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--schedule', '-s', dest='schedule', required=False, type=str, default=None,
+            help='JSON or YAML file with the model configuration schedule (default: the schedule in ModelSetup.py)')
+    parser.add_argument('--param', '-p', dest='params', action='append', required=False, default=None,
+            help='Swept field: Name=start:stop:count, Name=start:stop (with --lhs) or Name=v1,v2,...\n' +
+            'Fields: ' + ', '.join(CONFIGURATION_FIELDS))
+    parser.add_argument('--lhs', dest='lhs', required=False, type=int, default=None,
+            help='Draw this many Latin hypercube points instead of a full grid')
+    parser.add_argument('--seed', dest='seed', required=False, type=int, default=None,
+            help='Random seed for --lhs')
+    parser.add_argument('--model-rate', dest='model_rate', required=False, type=float, default=1.0 / MODEL_UPDATE_INTERVAL,
+            help=f'Model updates per second the configurations step at (default: {1.0 / MODEL_UPDATE_INTERVAL:.0f} Hz),\n' +
+            'as in main.py. Sets Dt where the schedule or --param does not')
+    parser.add_argument('--treatment', dest='treatment', required=False, type=float, default=0.0,
+            help='Constant treatment effect (default: 0)')
+    parser.add_argument('--output', '-o', dest='output', required=False, default='analysis_output.npz',
+            help='Output file for --param, .npz or .csv (default: analysis_output.npz)')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+    modelUpdateInterval:float = 1.0 / opts.model_rate
+
+    if opts.params:
+        parameters:dict = dict(ParseParameter(spec) for spec in opts.params)
+        points:dict = LatinHypercubePoints(parameters, opts.lhs, opts.seed) if opts.lhs else GridPoints(parameters)
+        results:dict = AnalyzeConfigurations(points, CreateModel(modelUpdateInterval).CurrentConfiguration, opts.treatment)
+        count:int = len(results['fixed_points'])
+        print(f'Analyzed {count} points over {", ".join(parameters)}: '
+              f'{np.count_nonzero(results["stable_points"] == 0)} without a stable fixed point, '
+              f'{np.count_nonzero(results["stable_points"] > 1)} with more than one')
+        WriteAnalysisOutput(opts.output, results)
+        print(f'Analysis written to {opts.output}')
+    else:
+        tracker:BPDModel2ConfigurationTracker = BPDModel2ConfigurationTracker()
+        if opts.schedule:
+            tracker.LoadConfigurations(opts.schedule, ScheduleDefaults(modelUpdateInterval))
+        else:
+            AddModelConfigurations(tracker, modelUpdateInterval)
+        for period in tracker.Periods:
+            PrintAnalysis(f'{period.StartTimeSeconds} - {period.EndTimeSeconds} s', period.Configuration, opts.treatment)
+        PrintAnalysis('Default configuration', tracker.DefaultConfiguration, opts.treatment)
@@ -1,5 +1,68 @@
+from Helpers.SigmoidTransfer import SigmoidDenominator
+
+# Supported ways of injecting the treatment effect into the model, in the order the 'm' key cycles through them
+INJECT_MODES:list = ['add_to_lambda', 'add_to_g', 'add_to_P', 'add_to_EB', 'tilt_to_PN']
+
+# Integer codes for the inject modes (index into INJECT_MODES), for the vectorized and compiled model paths
+INJECT_ADD_TO_LAMBDA:int = INJECT_MODES.index('add_to_lambda')
+INJECT_ADD_TO_G:int = INJECT_MODES.index('add_to_g')
+INJECT_ADD_TO_P:int = INJECT_MODES.index('add_to_P')
+INJECT_ADD_TO_EB:int = INJECT_MODES.index('add_to_EB')
+INJECT_TILT_TO_PN:int = INJECT_MODES.index('tilt_to_PN')
+
+# ------------------------------------------------------------------------------------------------------------
+# Immutable snapshot of a BPDModel2Configuration at one version (see BPDModel2Configuration.Compile): the raw values,
+# plus what the model derives from them on every tick, so a model step only reads plain attributes. KernelParameters
+# holds the values in the argument order of the step kernels (see Helpers/BPDModel2Kernel.py).
+# ------------------------------------------------------------------------------------------------------------
+class CompiledBPDModel2Configuration:
+    __slots__ = ('Version', 'InjectMode', 'InjectModeCode', 'G1', 'G2', 'QPMin', 'QPMax', 'QNMin', 'QNMax', 'Lamb', 'Dt',
+                 'TMin', 'TMax', 'Delay_Seconds', 'Gain', 'ReferenceDt', 'Delay_Steps', 'QPRange', 'QNRange', 'TRange',
+                 'S1Denominator', 'S2Denominator', 'KernelParameters', 'RK4KernelParameters')
+
+    # --------------------------
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable, change the BPDModel2Configuration instead')
+
+    # --------------------------
+    def __init__(self, configuration:'BPDModel2Configuration'):
+        values = {'Version': configuration.Version,
+                  'InjectMode': configuration.InjectMode,
+                  'InjectModeCode': INJECT_MODES.index(configuration.InjectMode),
+                  'G1': configuration.G1,
+                  'G2': configuration.G2,
+                  'QPMin': configuration.QPMin,
+                  'QPMax': configuration.QPMax,
+                  'QNMin': configuration.QNMin,
+                  'QNMax': configuration.QNMax,
+                  'Lamb': configuration.Lamb,
+                  'Dt': configuration.Dt,
+                  'TMin': configuration.TMin,
+                  'TMax': configuration.TMax,
+                  'Delay_Seconds': configuration.Delay_Seconds,
+                  'Gain': configuration.Gain,
+                  'ReferenceDt': configuration.ReferenceDt,
+                  'Delay_Steps': configuration.Delay_Steps}
+        values['QPRange'] = values['QPMax'] - values['QPMin']
+        values['QNRange'] = values['QNMax'] - values['QNMin']
+        values['TRange'] = values['TMax'] - values['TMin']
+        # S1/S2 normalizers f(G) - f(0), as in SigmoidTransfer
+        values['S1Denominator'] = SigmoidDenominator(values['G1'])
+        values['S2Denominator'] = SigmoidDenominator(values['G2'])
+        values['KernelParameters'] = (values['Delay_Steps'], values['G1'], values['G2'], values['S1Denominator'],
+                                      values['S2Denominator'], values['QPMin'], values['QPMax'], values['QNMin'],
+                                      values['QNMax'], values['Lamb'], values['Gain'], values['Dt'], values['TMin'],
+                                      values['TMax'], values['InjectModeCode'])
+        # the rk4 step takes the delay in (fractional) steps and the rate per second of the per-tick terms
+        values['RK4KernelParameters'] = ((values['Delay_Seconds'] / values['Dt'],) + values['KernelParameters'][1:] +
+                                         (1.0 / values['ReferenceDt'],))
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
 
 class BPDModel2Configuration:
+    # Slotted: read many times per model tick, and instances carry no __dict__
+    __slots__ = ('_injectMode', '_g1', '_g2', '_qPmin', '_qPmax', '_qNmin', '_qNmax', '_lamb', '_dt', '_tmin', '_tmax',
+                 '_delay_seconds', '_g_gain', '_referenceDt', '_version', '_compiled')
 
     # --------------------------
     # State variables
@@ -17,6 +80,11 @@ class BPDModel2Configuration:
     _tmax:float
     _delay_seconds:float
     _g_gain:float
+    _referenceDt:float
+
+    # Bumped by every setter that changes a value; the compiled snapshot is rebuilt when it is out of date
+    _version:int
+    _compiled:CompiledBPDModel2Configuration
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -25,7 +93,9 @@ class BPDModel2Configuration:
     
     @InjectMode.setter
     def InjectMode(self, val):
-        self._injectMode = val
+        if val != self._injectMode:
+            self._injectMode = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -34,7 +104,9 @@ class BPDModel2Configuration:
     
     @G1.setter
     def G1(self, val):
-        self._g1 = val
+        if val != self._g1:
+            self._g1 = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -43,7 +115,9 @@ class BPDModel2Configuration:
     
     @G2.setter
     def G2(self, val):
-        self._g2 = val
+        if val != self._g2:
+            self._g2 = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -52,16 +126,20 @@ class BPDModel2Configuration:
     
     @QPMin.setter
     def QPMin(self, val):
-        self._qPmin = val
+        if val != self._qPmin:
+            self._qPmin = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
     def QPMax(self):
         return self._qPmax
     
-    @QPMin.setter
+    @QPMax.setter
     def QPMax(self, val):
-        self._qPmax = val
+        if val != self._qPmax:
+            self._qPmax = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -70,16 +148,20 @@ class BPDModel2Configuration:
     
     @QNMin.setter
     def QNMin(self, val):
-        self._qNmin = val
+        if val != self._qNmin:
+            self._qNmin = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
     def QNMax(self):
         return self._qNmax
     
-    @QNMin.setter
+    @QNMax.setter
     def QNMax(self, val):
-        self._qNmax = val
+        if val != self._qNmax:
+            self._qNmax = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -88,7 +170,9 @@ class BPDModel2Configuration:
     
     @Lamb.setter
     def Lamb(self, val):
-        self._lamb = val
+        if val != self._lamb:
+            self._lamb = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -97,7 +181,9 @@ class BPDModel2Configuration:
     
     @Dt.setter
     def Dt(self, val):
-        self._dt = val
+        if val != self._dt:
+            self._dt = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -106,7 +192,9 @@ class BPDModel2Configuration:
     
     @TMin.setter
     def TMin(self, val):
-        self._tmin = val
+        if val != self._tmin:
+            self._tmin = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -115,7 +203,9 @@ class BPDModel2Configuration:
     
     @TMax.setter
     def TMax(self, val):
-        self._tmax = val
+        if val != self._tmax:
+            self._tmax = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -124,7 +214,9 @@ class BPDModel2Configuration:
     
     @Delay_Seconds.setter
     def Delay_Seconds(self, val):
-        self._delay_seconds = val
+        if val != self._delay_seconds:
+            self._delay_seconds = val
+            self._version += 1
 
     # ------------------------------------------------------------------------------------------------------------
     @property
@@ -133,13 +225,53 @@ class BPDModel2Configuration:
     
     @Gain.setter
     def Gain(self, val):
-        self._g_gain = val
+        if val != self._g_gain:
+            self._g_gain = val
+            self._version += 1
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Time step that Gain and the treatment injection amounts are specified for (they are applied once per step of
+    # this size); None means Dt. The euler integrator always applies them once per tick, the rk4 integrator turns them
+    # into rates, so the model can run at a larger Dt with the same dynamics (see BPDModel2)
+    @property
+    def ReferenceDt(self):
+        return self._referenceDt if self._referenceDt is not None else self._dt
+
+    @ReferenceDt.setter
+    def ReferenceDt(self, val):
+        if val != self._referenceDt:
+            self._referenceDt = val
+            self._version += 1
 
     # --------------------------
     @property
     def Delay_Steps(self):
         return max(1, int(round(self.Delay_Seconds / self.Dt)))
 
+    # --------------------------
+    @property
+    def Version(self):
+        return self._version
+
+    # --------------------------
+    # Snapshot of the current values (the same instance until a setter changes something)
+    def Compile(self) -> CompiledBPDModel2Configuration:
+        compiled = self._compiled
+        if compiled is None or compiled.Version != self._version:
+            compiled = CompiledBPDModel2Configuration(self)
+            self._compiled = compiled
+        return compiled
+
+    # --------------------------
+    # Pickled (e.g. to worker processes) without the snapshot, which is rebuilt on first use
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_compiled'}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        self._compiled = None
+
     # --------------------------
     # Constructor
     # --------------------------
@@ -156,7 +288,8 @@ class BPDModel2Configuration:
                  tmax:float=5.0,
                  injectMode:str = 'tilt_to_PN',
                  delay_seconds:float=0.02,
-                 g_gain:float=0.2):
+                 g_gain:float=0.2,
+                 reference_dt:float=None):
 
         self._g1 = g1; 
         self._g2 = g2
@@ -171,4 +304,7 @@ class BPDModel2Configuration:
         self._g_gain = g_gain
         self._dt = dt
         self._injectMode = injectMode
+        self._referenceDt = reference_dt
+        self._version = 0
+        self._compiled = None
 
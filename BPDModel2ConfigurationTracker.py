@@ -1,6 +1,12 @@
+import json
+import os
+from bisect import bisect_right
+
 from BPDModel2Configuration import BPDModel2Configuration
 
 class ConfigurationTimePeriod:
+    __slots__ = ('_startTimeSeconds', '_endTimeSeconds', '_configuration')
+
     _startTimeSeconds:float
     _endTimeSeconds:float
     _configuration:BPDModel2Configuration
@@ -28,6 +34,14 @@ class BPDModel2ConfigurationTracker:
 
     _defaultConfiguration:BPDModel2Configuration
 
+    # Sorted interval index over the configuration periods, rebuilt after periods are added
+    _indexIsValid:bool
+    _starts:list
+    _ends:list
+    _indexedConfigurations:list
+    _gaps:list
+    _cursor:int
+
     @property
     def DefaultConfiguration(self):
         return self._defaultConfiguration
@@ -36,28 +50,102 @@ class BPDModel2ConfigurationTracker:
     def DefaultConfiguration(self, value):
         self._defaultConfiguration = value
 
+    # ConfigurationTimePeriod of every added configuration, in the order they were added
+    @property
+    def Periods(self):
+        return list(self._configurations)
+
+    # (start, end) of every stretch between the first and last period that is not covered by a period
+    @property
+    def Gaps(self):
+        self._BuildIndex()
+        return self._gaps
+
     def GetActiveConfiguration(self, timeSeconds:float=0) -> BPDModel2Configuration:
-        tSec:float=timeSeconds
-        for configuration in self._configurations:
-            if configuration.StartTimeSeconds <= tSec:
-                if configuration.EndTimeSeconds > tSec:
-#                    print(f'Returning configuration for {configuration.StartTimeSeconds} - {configuration.EndTimeSeconds} time {tSec}')
-                    return configuration.Configuration
+        if not self._indexIsValid:
+            self._BuildIndex()
+        tSec:float = timeSeconds
+        starts = self._starts
+        ends = self._ends
+
+        # model time only moves forward, so the active period is usually the one found last time, or the next one
+        cursor:int = self._cursor
+        if cursor >= 0 and starts[cursor] <= tSec < ends[cursor]:
+            return self._indexedConfigurations[cursor]
+        cursor += 1
+        if cursor < len(starts) and starts[cursor] <= tSec < ends[cursor]:
+            self._cursor = cursor
+            return self._indexedConfigurations[cursor]
+
+        cursor = bisect_right(starts, tSec) - 1
+        self._cursor = cursor
+        if cursor >= 0 and tSec < ends[cursor]:
+#            print(f'Returning configuration for {starts[cursor]} - {ends[cursor]} time {tSec}')
+            return self._indexedConfigurations[cursor]
         return self.DefaultConfiguration
 
     def AddConfiguration(self, configuration:BPDModel2Configuration, startTimeSeconds:float, endTimeSeconds:float):
         self._configurations.append(ConfigurationTimePeriod(configuration, startTimeSeconds, endTimeSeconds))
-        
+        self._indexIsValid = False
+
+    # Sort the periods into the interval index. Raises ValueError for empty or overlapping periods, and records
+    # the gaps between periods (where the default configuration is used)
+    def _BuildIndex(self):
+        if self._indexIsValid:
+            return
+        periods = sorted(self._configurations, key=lambda period: period.StartTimeSeconds)
+        gaps = []
+        for period in periods:
+            if period.EndTimeSeconds <= period.StartTimeSeconds:
+                raise ValueError(f'Configuration period {period.StartTimeSeconds} - {period.EndTimeSeconds} is empty')
+        for previous, period in zip(periods, periods[1:]):
+            if period.StartTimeSeconds < previous.EndTimeSeconds:
+                raise ValueError(f'Configuration periods {previous.StartTimeSeconds} - {previous.EndTimeSeconds} and ' +
+                                 f'{period.StartTimeSeconds} - {period.EndTimeSeconds} overlap')
+            if period.StartTimeSeconds > previous.EndTimeSeconds:
+                gaps.append((previous.EndTimeSeconds, period.StartTimeSeconds))
+
+        self._starts = [period.StartTimeSeconds for period in periods]
+        self._ends = [period.EndTimeSeconds for period in periods]
+        self._indexedConfigurations = [period.Configuration for period in periods]
+        self._gaps = gaps
+        self._cursor = -1
+        self._indexIsValid = True
+
+    # Load a schedule from a JSON or YAML file:
+    #   default: {<BPDModel2Configuration arguments>}
+    #   periods: [{start: <seconds>, end: <seconds>, configuration: {<arguments that differ from the default>}}, ...]
+    # baseDefaults holds arguments for the ones the file does not set (e.g. dt and reference_dt, see ModelSetup.py)
+    def LoadConfigurations(self, path:str, baseDefaults:dict=None):
+        with open(path) as f:
+            if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+                import yaml
+                schedule = yaml.safe_load(f)
+            else:
+                schedule = json.load(f)
+
+        defaults:dict = {**(baseDefaults or {}), **schedule.get('default', {})}
+        self.DefaultConfiguration = BPDModel2Configuration(**defaults)
+        for period in schedule.get('periods', []):
+            self.AddConfiguration(configuration=BPDModel2Configuration(**{**defaults, **period.get('configuration', {})}),
+                                  startTimeSeconds=float(period['start']),
+                                  endTimeSeconds=float(period['end']))
+        self._BuildIndex()
+
     def PrintConfigurationInfo(self):
         print(f'Listing Configurations')
         print(f'======================')
         for configuration in self._configurations:
             duration:float = configuration.EndTimeSeconds - configuration.StartTimeSeconds
             print(f'\tStart {configuration.StartTimeSeconds} End {configuration.EndTimeSeconds} Duration {duration}')
+        for start, end in self.Gaps:
+            print(f'\tGap {start} - {end}: default configuration is used')
         input('Press ENTER to continue...')
         print()
 
-    
+
     def __init__(self):
         self._configurations = []
         self._defaultConfiguration = BPDModel2Configuration()
+        self._indexIsValid = False
+        self._cursor = -1
@@ -0,0 +1,308 @@
+import numpy as np
+from BPDModel2Configuration import BPDModel2Configuration, INJECT_MODES
+from BPDModel2Configuration import INJECT_ADD_TO_LAMBDA, INJECT_ADD_TO_G, INJECT_ADD_TO_P, INJECT_ADD_TO_EB, INJECT_TILT_TO_PN
+from Helpers.SigmoidTransfer import SIGMOID_F0, ErfArray, SigmoidDenominators
+
+# ------------------------------------------------------------------------------------------------------------
+# Runs many BPDModel2 instances (members) in lockstep. Every parameter is an array with one entry per member,
+# and the P/N state and delay ring buffers are 2-D arrays of shape (members, buffer length). A single call to
+# step() advances all members by one tick, with the same update rule as BPDModel2.step().
+# ------------------------------------------------------------------------------------------------------------
+class BPDModel2Ensemble:
+
+    # --------------------------
+    # Per-member parameters
+    # --------------------------
+    _size:int
+    _g1:np.ndarray
+    _g2:np.ndarray
+    _qPmin:np.ndarray
+    _qPmax:np.ndarray
+    _qNmin:np.ndarray
+    _qNmax:np.ndarray
+    _lamb:np.ndarray
+    _dt:np.ndarray
+    _tmin:np.ndarray
+    _tmax:np.ndarray
+    _g_gain:np.ndarray
+    _delay_steps:np.ndarray
+    _injectMode:np.ndarray
+
+    # --------------------------
+    # Cached S1/S2 normalizers
+    # --------------------------
+    _f0:float
+    _s1_denom:np.ndarray
+    _s2_denom:np.ndarray
+
+    # --------------------------
+    # State variables
+    # --------------------------
+    _rows:np.ndarray
+    _buf_len:int
+    _P_buf:np.ndarray
+    _N_buf:np.ndarray
+    _i:int
+    _eb:np.ndarray
+    _mood:np.ndarray
+    _treatmentEffect:np.ndarray
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Size(self):
+        return self._size
+
+    @property
+    def Delay_Steps(self):
+        return self._delay_steps
+
+    @property
+    def InjectMode(self):
+        return self._injectMode
+
+    @property
+    def P(self):
+        return self._P_buf[:, self._i % self._buf_len]
+
+    @property
+    def N(self):
+        return self._N_buf[:, self._i % self._buf_len]
+
+    @property
+    def EB(self):
+        return self._eb
+
+    @property
+    def BpdMood(self):
+        return self._mood
+
+    @property
+    def BpdTreatmentEffect(self):
+        return self._treatmentEffect
+
+    # --------------------------
+    # Constructor
+    # --------------------------
+    def __init__(self,
+                 size:int=None,
+                 g1=3.0,
+                 g2=3.0,
+                 qPmin=10.0,
+                 qPmax=10.0,
+                 qNmin=2.5,
+                 qNmax=7.0,
+                 lamb=4,
+                 dt=0.001,
+                 tmin=1.0,
+                 tmax=5.0,
+                 injectMode='tilt_to_PN',
+                 delay_seconds=0.02,
+                 g_gain=0.2,
+                 delay_steps=None,
+                 P0=100.0,
+                 N0=100.0,
+                 initialMood=0.5,
+                 initialTreatmentEffect=0):
+
+        # number of members: given explicitly, or taken from the longest parameter array
+        if size is None:
+            size = max([np.size(v) for v in (g1, g2, qPmin, qPmax, qNmin, qNmax, lamb, dt, tmin, tmax, injectMode, delay_seconds, g_gain, delay_steps, P0, N0) if v is not None])
+        self._size = int(size)
+
+        self._g1 = self._member_array(g1)
+        self._g2 = self._member_array(g2)
+        self._qPmin = self._member_array(qPmin)
+        self._qPmax = self._member_array(qPmax)
+        self._qNmin = self._member_array(qNmin)
+        self._qNmax = self._member_array(qNmax)
+        self._lamb = self._member_array(lamb)
+        self._dt = self._member_array(dt)
+        self._tmin = self._member_array(tmin)
+        self._tmax = self._member_array(tmax)
+        self._g_gain = self._member_array(g_gain)
+
+        if delay_steps is None:
+            delay_steps = np.maximum(1, np.round(self._member_array(delay_seconds) / self._dt))
+        self._delay_steps = self._member_array(delay_steps).astype(np.int64)
+
+        modes = np.broadcast_to(np.asarray(injectMode), (self._size,))
+        if modes.dtype.kind in 'US':
+            modes = np.array([INJECT_MODES.index(str(m)) for m in modes])
+        self._injectMode = modes.astype(np.int64)
+
+        # the S1/S2 denominators only depend on G1/G2, so compute them once per member
+        self._f0 = SIGMOID_F0
+        self._s1_denom = SigmoidDenominators(self._g1)
+        self._s2_denom = SigmoidDenominators(self._g2)
+
+        self._rows = np.arange(self._size)
+        self._mood = np.full(self._size, initialMood, dtype=np.float64)
+        self._treatmentEffect = np.full(self._size, initialTreatmentEffect, dtype=np.float64)
+
+        self.reset(P0, N0)
+
+    # --------------------------
+    @classmethod
+    def FromConfigurations(cls, configurations:list, P0=100.0, N0=100.0):
+        def field(name):
+            return np.array([getattr(c, name) for c in configurations])
+
+        return cls(size=len(configurations),
+                   g1=field('G1'),
+                   g2=field('G2'),
+                   qPmin=field('QPMin'),
+                   qPmax=field('QPMax'),
+                   qNmin=field('QNMin'),
+                   qNmax=field('QNMax'),
+                   lamb=field('Lamb'),
+                   dt=field('Dt'),
+                   tmin=field('TMin'),
+                   tmax=field('TMax'),
+                   injectMode=field('InjectMode'),
+                   g_gain=field('Gain'),
+                   delay_steps=field('Delay_Steps'),
+                   P0=P0,
+                   N0=N0)
+
+    # --------------------------
+    def _member_array(self, val) -> np.ndarray:
+        return np.array(np.broadcast_to(np.asarray(val, dtype=np.float64), (self._size,)))
+
+    # --------------------------
+    def reset(self, P0=100.0, N0=100.0):
+        buf_len = max(8, int(self._delay_steps.max()) + 10)
+        self._buf_len = buf_len
+        self._P_buf = np.zeros((self._size, buf_len))
+        self._N_buf = np.zeros((self._size, buf_len))
+        self._P_buf[:, 0] = P0
+        self._N_buf[:, 0] = N0
+        self._i = 0
+        total = self._P_buf[:, 0] + self._N_buf[:, 0]
+        self._eb = np.divide(self._P_buf[:, 0], total, out=np.full(self._size, 0.5), where=total > 1e-9)
+
+    # --------------------------
+    def S1(self, x:np.ndarray) -> np.ndarray:
+        return np.divide(ErfArray(self._g1 * x - 2.0) - self._f0, self._s1_denom, out=np.zeros(self._size), where=self._s1_denom != 0)
+
+    # --------------------------
+    def S2(self, x:np.ndarray) -> np.ndarray:
+        return np.divide(ErfArray(self._g2 * x - 2.0) - self._f0, self._s2_denom, out=np.zeros(self._size), where=self._s2_denom != 0)
+
+    # --------------------------
+    def step(self, treatmentEffect=0.0):
+        te = np.broadcast_to(np.asarray(treatmentEffect, dtype=np.float64), (self._size,))
+        mode = self._injectMode
+
+        cur_idx = self._i % self._buf_len
+        delay_idx = (self._i - self._delay_steps) % self._buf_len
+        P_cur = self._P_buf[:, cur_idx]; N_cur = self._N_buf[:, cur_idx]
+        total = P_cur + N_cur
+        EB = np.divide(P_cur, total, out=np.full(self._size, 0.5), where=total > 1e-9)
+
+        # S1/S2 are shared by qP/tP and qN/tN, so each is evaluated once per tick
+        s1 = self.S1(EB)
+        s2 = self.S2(EB)
+        qP_val = self._qPmin + s1 * (self._qPmax - self._qPmin)
+        qN_val = self._qNmin + (1.0 - s2) * (self._qNmax - self._qNmin)
+        tP_val = self._tmin + s1 * (self._tmax - self._tmin)
+        tN_val = self._tmin + (1.0 - s2) * (self._tmax - self._tmin)
+
+        lamb_eff = np.where(mode == INJECT_ADD_TO_LAMBDA, self._lamb + te, self._lamb)
+        g_eff = np.where(mode == INJECT_ADD_TO_G, self._g_gain + te, self._g_gain)
+
+        # base dynamics
+        P_delay = self._P_buf[self._rows, delay_idx]; N_delay = self._N_buf[self._rows, delay_idx]
+        diffP, diffN = (P_cur - P_delay), (N_cur - N_delay)
+
+        dP = -P_cur / tP_val + lamb_eff * qP_val
+        dN = -N_cur / tN_val + lamb_eff * qN_val
+        P_next = P_cur + self._dt * dP + g_eff * diffP
+        N_next = N_cur + self._dt * dN + g_eff * diffN
+
+        # Injection modes
+        P_next += np.where(mode == INJECT_ADD_TO_P, te * 1.0, 0.0)
+        P_next += np.where(mode == INJECT_ADD_TO_EB, te * 10.0, 0.0)
+        N_next -= np.where(mode == INJECT_ADD_TO_EB, te * 10.0, 0.0)
+        tilt = mode == INJECT_TILT_TO_PN
+        P_next += np.where(tilt & (te > 0), np.abs(te) * 10.0, 0.0)
+        N_next += np.where(tilt & (te <= 0), np.abs(te) * 10.0, 0.0)
+
+        # Clamp to avoid runaway
+        np.clip(P_next, 1e-6, 1e6, out=P_next)
+        np.clip(N_next, 1e-6, 1e6, out=N_next)
+
+        next_idx = (self._i + 1) % self._buf_len
+        self._P_buf[:, next_idx] = P_next
+        self._N_buf[:, next_idx] = N_next
+        self._i += 1
+
+        total = P_next + N_next
+        EB_next = np.divide(P_next, total, out=np.full(self._size, 0.5), where=total > 1e-9)
+        np.clip(EB_next, 0.0, 1.0, out=EB_next)
+
+        self._eb = EB_next
+        self._mood = np.clip(2 * (EB_next - 0.5), -1, 1)
+        self._treatmentEffect = np.array(te)
+
+        return EB_next, P_next, N_next
+
+    # --------------------------
+    # Give every member the parameters of 'configuration' (as assigning BPDModel2.CurrentConfiguration does). When
+    # the time step or delay changes, the delay history is resampled like BPDModel2.SyncDelayBuffer()
+    def ApplyConfiguration(self, configuration:BPDModel2Configuration):
+        oldDt = self._dt.copy()
+        self._g1[:] = configuration.G1
+        self._g2[:] = configuration.G2
+        self._qPmin[:] = configuration.QPMin
+        self._qPmax[:] = configuration.QPMax
+        self._qNmin[:] = configuration.QNMin
+        self._qNmax[:] = configuration.QNMax
+        self._lamb[:] = configuration.Lamb
+        self._dt[:] = configuration.Dt
+        self._tmin[:] = configuration.TMin
+        self._tmax[:] = configuration.TMax
+        self._g_gain[:] = configuration.Gain
+        self._delay_steps[:] = configuration.Delay_Steps
+        self._injectMode[:] = INJECT_MODES.index(configuration.InjectMode)
+        self._s1_denom = SigmoidDenominators(self._g1)
+        self._s2_denom = SigmoidDenominators(self._g2)
+        self._SyncDelayBuffer(oldDt)
+
+    # --------------------------
+    def _SyncDelayBuffer(self, oldDt:np.ndarray):
+        buf_len = max(8, int(self._delay_steps.max()) + 10)
+        if buf_len == self._buf_len and np.array_equal(oldDt, self._dt):
+            return
+
+        # history written so far, newest first, sampled at lags of the new time step of each member
+        valid = min(self._i + 1, self._buf_len)
+        oldLags = np.arange(valid)
+        oldIdx = (self._i - oldLags) % self._buf_len
+        newLags = np.arange(buf_len)
+        newIdx = (self._i - newLags) % buf_len
+        P_buf = np.empty((self._size, buf_len))
+        N_buf = np.empty((self._size, buf_len))
+        for member in range(self._size):
+            oldTimes = (-oldLags * oldDt[member])[::-1]
+            newTimes = -newLags * self._dt[member]
+            P_buf[member, newIdx] = np.interp(newTimes, oldTimes, self._P_buf[member, oldIdx][::-1])
+            N_buf[member, newIdx] = np.interp(newTimes, oldTimes, self._N_buf[member, oldIdx][::-1])
+
+        self._P_buf = P_buf
+        self._N_buf = N_buf
+        self._buf_len = buf_len
+
+    # --------------------------
+    # Restart one member from P0/N0 (as a new BPDModel2 would start), leaving the others running
+    def ResetMember(self, member:int, P0:float=100.0, N0:float=100.0, initialMood:float=0.5):
+        cur_idx = self._i % self._buf_len
+        self._P_buf[member, :] = 0.0
+        self._N_buf[member, :] = 0.0
+        self._P_buf[member, cur_idx] = P0
+        self._N_buf[member, cur_idx] = N0
+        eb = self._eb.copy()
+        eb[member] = P0 / (P0 + N0) if P0 + N0 > 1e-9 else 0.5
+        self._eb = eb
+        mood = self._mood.copy()
+        mood[member] = initialMood
+        self._mood = mood
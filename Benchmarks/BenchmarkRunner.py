@@ -0,0 +1,258 @@
+# ------------------------------------------------------------------------------------------------------------
+# Benchmark runner for the simulation hot paths. Every benchmark is a (name, setup) pair: setup() builds whatever
+# the benchmark needs and returns a function that performs one operation (or raises ImportError when an optional
+# dependency is missing, which skips the benchmark). Results are written as JSON and can be compared against a
+# stored baseline run. Benchmarks/baseline.json is the reference run committed with the code; its 'environment'
+# records the machine and versions it was taken with. Timings only compare on the same machine, so save a baseline
+# of your own on the machine you deploy to:
+#
+#   python -m Benchmarks.BenchmarkRunner --output results.json
+#   python -m Benchmarks.BenchmarkRunner --save-baseline my_baseline.json
+#   python -m Benchmarks.BenchmarkRunner --baseline my_baseline.json --tolerance 0.15
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Modules that provide benchmarks, each with a BENCHMARKS list of (name, setup) pairs
+BENCHMARK_MODULES:list = ['Benchmarks.SimulationBenchmarks', 'Benchmarks.RecordBenchmarks']
+
+# The reference run committed with the code
+DEFAULT_BASELINE:str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Packages whose versions are recorded with every run (None when not installed)
+VERSIONED_PACKAGES:list = ['numpy', 'numba', 'matplotlib', 'pythonosc', 'pyo']
+
+# ------------------------------------------------------------------------------------------------------------
+def CollectBenchmarks(nameFilter:str=None) -> list:
+    benchmarks = []
+    for moduleName in BENCHMARK_MODULES:
+        for name, setup in importlib.import_module(moduleName).BENCHMARKS:
+            if nameFilter is None or nameFilter in name:
+                benchmarks.append((name, setup))
+    return benchmarks
+
+# ------------------------------------------------------------------------------------------------------------
+# Seconds per call of op(), as the best and median of 'repeats' timed runs that each last at least minTime
+def TimeOperation(op, minTime:float=0.2, repeats:int=5) -> tuple:
+    clock = time.perf_counter
+
+    # calibrate the number of calls per run
+    iterations = 1
+    while True:
+        start = clock()
+        for _ in range(iterations):
+            op()
+        elapsed = clock() - start
+        if elapsed >= minTime / 10:
+            break
+        iterations *= 10
+    iterations = max(1, int(iterations * minTime / max(elapsed, 1e-9)))
+
+    timings = []
+    gcWasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = clock()
+            for _ in range(iterations):
+                op()
+            timings.append((clock() - start) / iterations)
+    finally:
+        if gcWasEnabled:
+            gc.enable()
+    timings.sort()
+    return timings[0], timings[len(timings) // 2], iterations
+
+# ------------------------------------------------------------------------------------------------------------
+# Memory traced by tracemalloc while calling op() 'iterations' times: the peak above the starting point, and what
+# is still allocated afterwards, per call (growth that is never released)
+def MeasureAllocations(op, iterations:int=1000) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        op()
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(iterations):
+            op()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, (after - before) / iterations
+
+# ------------------------------------------------------------------------------------------------------------
+# Machine, Python and package versions a run was taken with
+def Environment() -> dict:
+    packages = {}
+    for name in VERSIONED_PACKAGES:
+        try:
+            module = importlib.import_module(name)
+            packages[name] = getattr(module, '__version__', 'unknown')
+        except ImportError:
+            packages[name] = None
+    return {'python': sys.version,
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'packages': packages}
+
+# ------------------------------------------------------------------------------------------------------------
+def RunBenchmarks(benchmarks:list, minTime:float=0.2, repeats:int=5, allocationIterations:int=1000, verbose:bool=True) -> dict:
+    results = {}
+    skipped = {}
+    loopOverhead, _, _ = TimeOperation(lambda: None, minTime, repeats)
+
+    for name, setup in benchmarks:
+        try:
+            op = setup()
+        except ImportError as e:
+            skipped[name] = str(e)
+            if verbose:
+                print(f'{name:55s} skipped ({e})')
+            continue
+
+        best, median, iterations = TimeOperation(op, minTime, repeats)
+        peakBytes, retainedBytesPerOp = MeasureAllocations(op, allocationIterations)
+        results[name] = {'ns_per_op': best * 1e9,
+                         'ns_per_op_median': median * 1e9,
+                         'ops_per_sec': 1.0 / best,
+                         'iterations': iterations,
+                         'repeats': repeats,
+                         'alloc_peak_bytes': peakBytes,
+                         'alloc_retained_bytes_per_op': retainedBytesPerOp}
+        if verbose:
+            print(f'{name:55s} {best * 1e9:12.1f} ns/op {1.0 / best:14.0f} ops/s  peak alloc {peakBytes:9d} B  retained {retainedBytesPerOp:8.1f} B/op')
+
+    return {'environment': Environment(),
+            'min_time': minTime,
+            'repeats': repeats,
+            'loop_overhead_ns': loopOverhead * 1e9,
+            'results': results,
+            'skipped': skipped}
+
+# ------------------------------------------------------------------------------------------------------------
+# Benchmarks whose ns/op grew by more than 'tolerance' (as a fraction) against the baseline, as
+# (name, baseline ns/op, current ns/op) tuples. Benchmarks missing from either run are ignored.
+def CompareToBaseline(run:dict, baseline:dict, tolerance:float=0.15) -> list:
+    regressions = []
+    for name, result in run['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        if result['ns_per_op'] > reference['ns_per_op'] * (1.0 + tolerance):
+            regressions.append((name, reference['ns_per_op'], result['ns_per_op']))
+    return regressions
+
+# ------------------------------------------------------------------------------------------------------------
+# Baseline results file; the error says how to create one when it does not exist
+def LoadBaseline(path:str) -> dict:
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f'Baseline {path} does not exist. Create it on this machine with\n' +
+                                f'  python -m Benchmarks.BenchmarkRunner --save-baseline {path}')
+    with open(path) as f:
+        baseline = json.load(f)
+    if 'environment' not in baseline or 'results' not in baseline:
+        raise ValueError(f'{path} is not a baseline written by --save-baseline')
+    return baseline
+
+# ------------------------------------------------------------------------------------------------------------
+# Environment entries that differ between two runs, as (key, baseline value, current value) tuples
+def EnvironmentDifferences(run:dict, baseline:dict) -> list:
+    current, reference = run['environment'], baseline['environment']
+    differences = [(key, reference.get(key), current[key]) for key in current if key != 'packages' and reference.get(key) != current[key]]
+    for name, version in current['packages'].items():
+        if reference.get('packages', {}).get(name) != version:
+            differences.append((name, reference.get('packages', {}).get(name), version))
+    return differences
+
+# ------------------------------------------------------------------------------------------------------------
+def PrintComparison(run:dict, baseline:dict, tolerance:float):
+    print()
+    print(f'Comparison against baseline (tolerance {tolerance * 100:.0f}%)')
+    print(f'=========================================')
+    differences = EnvironmentDifferences(run, baseline)
+    if differences:
+        print('The baseline was taken in another environment, so timings may not compare:')
+        for key, reference, current in differences:
+            print(f'\t{key}: {reference} -> {current}')
+    for name, result in run['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f'{name:55s} {"(not in baseline, not compared)":>12s}')
+            continue
+        ratio = result['ns_per_op'] / reference['ns_per_op']
+        flag = 'REGRESSION' if ratio > 1.0 + tolerance else ''
+        print(f'{name:55s} {reference["ns_per_op"]:12.1f} -> {result["ns_per_op"]:12.1f} ns/op ({ratio:5.2f}x) {flag}')
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='BenchmarkRunner.py',
+            description='Benchmarks the simulation hot paths and reports ns/op, ops/s and allocations as JSON.\n' +
+            'Run from the repository root: python -m Benchmarks.BenchmarkRunner\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--output', '-o', dest='output', required=False, type=str, default=None,
+            help='Write the results (JSON) to this file')
+    parser.add_argument('--baseline', dest='baseline', required=False, type=str, default=None, nargs='?', const=DEFAULT_BASELINE,
+            help='Compare against this baseline results file (default: Benchmarks/baseline.json);\n' +
+            'the exit code is 1 when a benchmark regressed, and 2 when the file does not exist')
+    parser.add_argument('--save-baseline', dest='save_baseline', required=False, type=str, default=None,
+            help='Write the results (JSON) to this file, to be used as a baseline later')
+    parser.add_argument('--tolerance', dest='tolerance', required=False, type=float, default=0.15,
+            help='Allowed slowdown against the baseline, as a fraction (default: 0.15)')
+    parser.add_argument('--filter', '-f', dest='filter', required=False, type=str, default=None,
+            help='Only run benchmarks whose name contains this text')
+    parser.add_argument('--min-time', dest='min_time', required=False, type=float, default=0.2,
+            help='Minimum duration of each timed run in seconds (default: 0.2)')
+    parser.add_argument('--repeats', dest='repeats', required=False, type=int, default=5,
+            help='Number of timed runs per benchmark; the best is reported (default: 5)')
+    parser.add_argument('--list', dest='list', required=False, action='store_true',
+            help='List the benchmarks and exit')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+
+    # fail before running anything when there is nothing to compare against
+    baseline = None
+    if opts.baseline:
+        try:
+            baseline = LoadBaseline(opts.baseline)
+        except (FileNotFoundError, ValueError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+
+    benchmarks = CollectBenchmarks(opts.filter)
+    if opts.list:
+        for name, _ in benchmarks:
+            print(name)
+        sys.exit(0)
+
+    run = RunBenchmarks(benchmarks, minTime=opts.min_time, repeats=opts.repeats)
+
+    for path in (opts.output, opts.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(run, f, indent=2)
+            print(f'Results written to {path}')
+
+    if baseline is not None:
+        PrintComparison(run, baseline, opts.tolerance)
+        regressions = CompareToBaseline(run, baseline, opts.tolerance)
+        if regressions:
+            print(f'{len(regressions)} benchmark(s) regressed')
+            sys.exit(1)
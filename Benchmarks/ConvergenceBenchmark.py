@@ -0,0 +1,103 @@
+# ------------------------------------------------------------------------------------------------------------
+# Accuracy against CPU cost of the BPDModel2 integrators. A reference trajectory is integrated with rk4 at a very
+# small step; every integrator and step size is then run over the same simulated time and scored by the largest
+# EB error on a common time grid, next to the CPU seconds it needs per simulated second:
+#
+#   python -m Benchmarks.ConvergenceBenchmark
+#   python -m Benchmarks.ConvergenceBenchmark --kernel python --duration 5 --output convergence.json
+#
+# The model is the one of ModelSetup.py with Gain and the injection amounts specified per MODEL_UPDATE_INTERVAL
+# (ReferenceDt), so the euler map at that interval and the rk4 runs describe the same dynamics. The treatment effect
+# is held for SAMPLE_INTERVAL seconds at a time, like IMU input. Every step size divides DELAY_SECONDS: the euler
+# map rounds the delay to whole steps (the trajectory is sensitive to that), and as the history jumps at the start
+# of the run, an rk4 step that straddles the delayed jump only converges to first order.
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from BPDModel2 import BPDModel2
+from ModelSetup import MODEL_UPDATE_INTERVAL
+
+# Seconds the treatment effect is held, and the grid the trajectories are compared on
+SAMPLE_INTERVAL:float = 0.03
+DELAY_SECONDS:float = 0.015
+
+# Step of the reference run, and the (integrator, step) pairs scored against it
+REFERENCE_DT:float = 0.000125
+CASES:list = ([('euler', MODEL_UPDATE_INTERVAL)] +
+              [('rk4', dt) for dt in (0.00025, 0.0005, 0.001, 0.0015, 0.0025, 0.005, 0.0075)])
+
+# ------------------------------------------------------------------------------------------------------------
+# Treatment effect at time t: a slow sine, sampled every SAMPLE_INTERVAL seconds
+def TreatmentEffect(t:float) -> float:
+    return 0.3 * np.sin(2 * np.pi * 0.5 * SAMPLE_INTERVAL * np.floor(t / SAMPLE_INTERVAL + 1e-9))
+
+# ------------------------------------------------------------------------------------------------------------
+# (times, EB, CPU seconds) of one run of 'duration' simulated seconds
+def Run(integrator:str, dt:float, duration:float, kernel:str='auto') -> tuple:
+    model = BPDModel2(dt=dt, delay_seconds=DELAY_SECONDS, g_gain=0.07, lamb=0.5, kernel=kernel, integrator=integrator,
+                      reference_dt=MODEL_UPDATE_INTERVAL)
+    count = int(round(duration / dt))
+    effects = [TreatmentEffect(k * dt) for k in range(count)]
+    model.step(0.0, DT=dt)
+    model.reset()
+
+    EB = np.empty(count)
+    step = model.step
+    start = time.process_time()
+    for k in range(count):
+        EB[k] = step(effects[k], DT=dt)[0]
+    cpu = time.process_time() - start
+    return (np.arange(1, count + 1) * dt, EB, cpu)
+
+# ------------------------------------------------------------------------------------------------------------
+def RunConvergence(duration:float=3.0, kernel:str='auto') -> list:
+    grid = np.arange(SAMPLE_INTERVAL, duration, SAMPLE_INTERVAL)
+    times, EB, _ = Run('rk4', REFERENCE_DT, duration, kernel)
+    reference = np.interp(grid, times, EB)
+
+    results = []
+    for integrator, dt in CASES:
+        times, EB, cpu = Run(integrator, dt, duration, kernel)
+        results.append({'integrator': integrator, 'dt': dt, 'rate': 1.0 / dt,
+                        'max_error': float(np.max(np.abs(np.interp(grid, times, EB) - reference))),
+                        'cpu_per_second': cpu / duration})
+    return results
+
+# ------------------------------------------------------------------------------------------------------------
+def PrintResults(results:list):
+    print(f'{"integrator":<10} {"dt":>9} {"rate (Hz)":>10} {"max EB error":>13} {"CPU s / sim s":>14}')
+    for result in results:
+        print(f'{result["integrator"]:<10} {result["dt"]:>9.6f} {result["rate"]:>10.0f} '
+              f'{result["max_error"]:>13.3e} {result["cpu_per_second"]:>14.3e}')
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='python -m Benchmarks.ConvergenceBenchmark',
+            description='Scores the BPDModel2 integrators by their largest EB error against a fine rk4 reference\n' +
+            'and by the CPU seconds they need per simulated second.\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--duration', dest='duration', required=False, type=float, default=3.0,
+            help='Simulated seconds per run (default: 3)')
+    parser.add_argument('--kernel', dest='kernel', required=False, default='auto', choices=['auto', 'python', 'numba'],
+            help='Step kernel backend (default: auto)')
+    parser.add_argument('--output', dest='output', required=False, type=str, default=None,
+            help='Write the results as JSON to this file')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+    results = RunConvergence(opts.duration, opts.kernel)
+    PrintResults(results)
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,156 @@
+# ------------------------------------------------------------------------------------------------------------
+# Benchmarks of the small state records written on every model tick (ModelOutputData, ImuData, ThereminOutputData)
+# and of the configuration records, against dict-backed reference versions with the same property wrappers and the
+# same min/max clamp of the mood, so the difference is what __slots__ saves. The 'x1000' benchmarks build 1000
+# records per operation, so their allocation peak shows the memory per record.
+# See BenchmarkRunner.py for how they are run.
+# ------------------------------------------------------------------------------------------------------------
+import numpy as np
+
+from BPDModel2Configuration import BPDModel2Configuration
+from BPDModel2ConfigurationTracker import ConfigurationTimePeriod
+from Helpers.ImuData import ImuData
+from Helpers.ModelOutputData import ModelOutputData
+from Helpers.ThereminOutputData import ThereminOutputData
+
+# ------------------------------------------------------------------------------------------------------------
+# Dict-backed references
+# ------------------------------------------------------------------------------------------------------------
+class _DictModelOutputData:
+    _bpdMood:float
+    _bpdTreatmentEffect:float
+
+    @property
+    def BpdMood(self):
+        return self._bpdMood
+
+    @BpdMood.setter
+    def BpdMood(self, val):
+        self._bpdMood = min(max(val, -1.0), 1.0)
+
+    @property
+    def BpdTreatmentEffect(self):
+        return self._bpdTreatmentEffect
+
+    @BpdTreatmentEffect.setter
+    def BpdTreatmentEffect(self, val):
+        self._bpdTreatmentEffect = val
+
+    def __init__(self, mood:float=0, treatmentEffect:float=0):
+        self._bpdMood = mood
+        self._bpdTreatmentEffect = treatmentEffect
+
+class _DictImuData:
+    _xAngle:float = 0
+    _xGyro:float = 0
+    _xAccelAngle:float = 0
+
+    @property
+    def xAngle(self):
+        return self._xAngle
+
+    @xAngle.setter
+    def xAngle(self, val):
+        self._xAngle = val
+
+    @property
+    def xGyro(self):
+        return self._xGyro
+
+    @xGyro.setter
+    def xGyro(self, val):
+        self._xGyro = val
+
+    @property
+    def xAccelAngle(self):
+        return self._xAccelAngle
+
+    @xAccelAngle.setter
+    def xAccelAngle(self, val):
+        self._xAccelAngle = val
+
+class _DictThereminOutputData:
+    _frequency:float
+    _volume:float
+
+    @property
+    def Frequency(self):
+        return self._frequency
+
+    @Frequency.setter
+    def Frequency(self, val):
+        self._frequency = val
+
+    @property
+    def Volume(self):
+        return self._volume
+
+    @Volume.setter
+    def Volume(self, val):
+        self._volume = val
+
+    def __init__(self, frequency:float=0, volume:float=0):
+        self._frequency = frequency
+        self._volume = volume
+
+# ------------------------------------------------------------------------------------------------------------
+# What the model tick does with the records: set the mood and treatment effect, read them back for the theremin,
+# and set the theremin frequency and volume
+def _TickWrites(modelOutputClass, thereminOutputClass):
+    def setup():
+        modelState = modelOutputClass()
+        thereminState = thereminOutputClass()
+        moods = np.linspace(-1.2, 1.2, 1024).tolist()
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            modelState.BpdMood = moods[i & 1023]
+            modelState.BpdTreatmentEffect = 0.01
+            thereminState.Volume = 0.5 + 0.5 * (1 - abs(modelState.BpdTreatmentEffect / 2.70))
+            thereminState.Frequency = 55 + 4945 * (modelState.BpdMood + 1) / 2
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+# What the treatment reads from the IMU data, and an OSC handler writing an angle message
+def _ImuReadWrite(imuClass):
+    def setup():
+        imuData = imuClass()
+        def op():
+            imuData.xAngle = imuData.xAngle + imuData.xGyro * 0.001 + imuData.xAccelAngle * 0.0
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+def _Construct1000(create):
+    def setup():
+        def op():
+            records = [create() for _ in range(1000)]
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+# The configuration reads of one BPDModel2.step (python kernel)
+def _ConfigurationReads():
+    cfg = BPDModel2Configuration()
+    def op():
+        cfg.QPMin + cfg.QPMax + cfg.QNMin + cfg.QNMax + cfg.TMin + cfg.TMax + cfg.Lamb + cfg.Gain + cfg.Dt
+        cfg.InjectMode == 'tilt_to_PN'
+    return op
+
+# ------------------------------------------------------------------------------------------------------------
+BENCHMARKS:list = [
+    ('Records: tick writes[slots]', _TickWrites(ModelOutputData, ThereminOutputData)),
+    ('Records: tick writes[dict]', _TickWrites(_DictModelOutputData, _DictThereminOutputData)),
+    ('Records: ImuData read/write[slots]', _ImuReadWrite(ImuData)),
+    ('Records: ImuData read/write[dict]', _ImuReadWrite(_DictImuData)),
+    ('Records: ModelOutputData x1000[slots]', _Construct1000(ModelOutputData)),
+    ('Records: ModelOutputData x1000[dict]', _Construct1000(_DictModelOutputData)),
+    ('Records: ImuData x1000[slots]', _Construct1000(ImuData)),
+    ('Records: ThereminOutputData x1000[slots]', _Construct1000(ThereminOutputData)),
+    ('Records: ThereminOutputData x1000[dict]', _Construct1000(_DictThereminOutputData)),
+    ('Records: BPDModel2Configuration x1000', _Construct1000(BPDModel2Configuration)),
+    ('Records: ConfigurationTimePeriod x1000', _Construct1000(lambda: ConfigurationTimePeriod(None))),
+    ('Records: BPDModel2Configuration reads per step', _ConfigurationReads),
+]
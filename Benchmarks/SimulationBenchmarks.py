@@ -0,0 +1,256 @@
+# ------------------------------------------------------------------------------------------------------------
+# Benchmarks of the per-tick work done by main.py: the models, configuration lookup, treatment, theremin update,
+# plotting and OSC input dispatch, plus the full model tick and batch stepping as macro benchmarks.
+# See BenchmarkRunner.py for how they are run.
+# ------------------------------------------------------------------------------------------------------------
+import random
+
+import numpy as np
+
+from BPDModel1 import BPDModel1
+from BPDModel2 import BPDModel2
+from BPDModel2Configuration import BPDModel2Configuration, INJECT_MODES
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from Helpers.ImuData import ImuData
+from Helpers.ImuFusion import ImuFusion, IMU_FILTERS
+from Helpers.ImuHistory import ImuHistory
+from Helpers.ModelChannel import ModelChannel
+from Helpers.ModelOutputArrays import ModelOutputArrays
+from ModelSetup import MODEL_UPDATE_INTERVAL, CreateModel, CreateTreatment, AddModelConfigurations
+
+# OSC addresses the IMU sends to (see main.py)
+IMU_OSC_ADDRESSES:list = ['/Brandeis/BPD/SendAngle', '/Brandeis/BPD/SendGyro', '/Brandeis/BPD/SendAccel',
+                          '/Brandeis/BPD/SendAccelAngle', '/Brandeis/BPD/SendTemp']
+
+# ------------------------------------------------------------------------------------------------------------
+# Treatment effects that swing through the clamp range, cycled through by the model benchmarks
+def _TreatmentEffects(count:int=1024) -> list:
+    return (0.05 * np.sin(np.linspace(0.0, 8.0 * np.pi, count))).tolist()
+
+# ------------------------------------------------------------------------------------------------------------
+def _ModelStep(injectMode:str, kernel:str, integrator:str='euler'):
+    def setup():
+        if kernel == 'numba':
+            import numba
+        model = BPDModel2(dt=MODEL_UPDATE_INTERVAL, delay_seconds=0.02, g_gain=0.07, lamb=0.5, injectMode=injectMode, kernel=kernel,
+                          integrator=integrator)
+        effects = _TreatmentEffects()
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            model.step(effects[i & 1023], DT=MODEL_UPDATE_INTERVAL)
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+def _Model1Step(integrator:str='euler'):
+    def setup():
+        model = BPDModel1(integrator=integrator)
+        effects = _TreatmentEffects()
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            model.step(effects[i & 1023], DT=MODEL_UPDATE_INTERVAL)
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+# Lookups with model time moving forward (crossing into the next period every few ticks), or at random times
+def _TrackerLookup(periodCount:int, sequential:bool=True):
+    def setup():
+        tracker = BPDModel2ConfigurationTracker()
+        for index in range(periodCount):
+            tracker.AddConfiguration(BPDModel2Configuration(lamb=0.5 + index * 1e-4), float(index), float(index + 1))
+        tracker.GetActiveConfiguration(0.0)
+        span = float(periodCount)
+        if sequential:
+            times = [(k * 0.37) % span for k in range(4096)]
+        else:
+            generator = random.Random(0)
+            times = [generator.uniform(0.0, span) for _ in range(4096)]
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            tracker.GetActiveConfiguration(times[i & 4095])
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+def _TreatmentEffect():
+    treatment = CreateTreatment()
+    imuData = ImuData()
+    imuData.xAngle = 12.5
+    imuData.xAccelAngle = -3.0
+    def op():
+        treatment.CalculateTreatmentEffect(imuData)
+    return op
+
+# ------------------------------------------------------------------------------------------------------------
+# One IMU angle message appended to the history and run through a fusion filter
+def _FusionUpdate(filterName:str):
+    def setup():
+        imuHistory = ImuHistory()
+        fusion = ImuFusion(imuHistory, IMU_FILTERS[filterName]())
+        angles = (20.0 * np.sin(np.linspace(0.0, 2.0 * np.pi, 1024))).tolist()
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            imuHistory.AppendAngle(angles[i & 1023], 0.0, 0.0, timestamp=i * 0.01)
+            fusion.Update()
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+# Theremin.Update with the pyo objects replaced by plain stand-ins (the Theremin module itself still needs pyo).
+# 'perTick' passes the targets to the (fake) ramps on every Update, as with control_rate=0; otherwise Update only
+# stores them for the control pattern
+class _FakeSoundProcessor:
+    discrete = False
+
+class _FakeRamp:
+    value:float = 0.0
+
+def _ThereminUpdate(perTick:bool):
+    def setup():
+        from Helpers.Theremin import Theremin
+        from Helpers.ModelOutputData import ModelOutputData
+        from Helpers.ThereminOutputData import ThereminOutputData
+
+        # skip the constructor, which boots a pyo audio server
+        theremin = Theremin.__new__(Theremin)
+        theremin._dsp = _FakeSoundProcessor()
+        theremin._frequencyRamp = _FakeRamp()
+        theremin._volumeRamp = _FakeRamp()
+        theremin._controlPattern = None if perTick else object()
+        theremin._sentFrequency = None
+        theremin._sentVolume = None
+        theremin._controlUpdates = 0
+        theremin._minFrequency = 55
+        theremin._maxFrequency = 5000
+        theremin._minVolume = 0.5
+        theremin._maxVolume = 1
+        theremin._thereminState = ThereminOutputData()
+        theremin._targets = (55.0, 1.0)
+        theremin._isPlaying = True
+
+        modelStates = [ModelOutputData(mood, effect) for mood, effect in zip(np.linspace(-1, 1, 256), np.linspace(-0.05, 0.05, 256))]
+        state = {'i': 0}
+        def op():
+            i = state['i']
+            theremin.Update(modelStates[i & 255])
+            state['i'] = i + 1
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+# ModelPlot.UpdatePlot on the Agg backend, redrawing on every update (no frame rate cap)
+def _PlotUpdate():
+    import matplotlib
+    matplotlib.use('Agg')
+    from Helpers.ModelPlot import ModelPlot
+    from Helpers.ModelOutputData import ModelOutputData
+
+    modelPlot = ModelPlot(maxFrameRate=0)
+    modelPlot.Fig.canvas.draw()
+    modelStates = [ModelOutputData(mood, effect) for mood, effect in zip(np.linspace(-1, 1, 256), np.linspace(-0.05, 0.05, 256))]
+    state = {'i': 0}
+    def op():
+        i = state['i']
+        modelPlot.UpdatePlot(modelStates[i & 255])
+        state['i'] = i + 1
+    return op
+
+# ------------------------------------------------------------------------------------------------------------
+# One IMU OSC message sent over loopback UDP, received and dispatched to a handler that appends it to ImuHistory
+def _OscDispatch():
+    from pythonosc.dispatcher import Dispatcher
+    from pythonosc.osc_server import BlockingOSCUDPServer
+    from pythonosc.udp_client import SimpleUDPClient
+
+    imuData = ImuHistory()
+    def handleAngle(address, *args):
+        imuData.AppendAngle(args[0], args[1], args[2])
+    def handleGyro(address, *args):
+        imuData.AppendGyro(args[0], args[1], args[2])
+    def handleAccel(address, *args):
+        imuData.AppendAccel(args[0], args[1], args[2])
+    def handleAccelAngle(address, *args):
+        imuData.AppendAccelAngle(args[0], args[1])
+    def handleTemp(address, *args):
+        imuData.AppendTemp(args[0])
+
+    dispatcher = Dispatcher()
+    for address, handler in zip(IMU_OSC_ADDRESSES, [handleAngle, handleGyro, handleAccel, handleAccelAngle, handleTemp]):
+        dispatcher.map(address, handler)
+    server = BlockingOSCUDPServer(('127.0.0.1', 0), dispatcher)
+    client = SimpleUDPClient('127.0.0.1', server.server_address[1])
+
+    messages = [(address, [0.5 * k, -0.25 * k, 0.125 * k]) for k, address in enumerate(IMU_OSC_ADDRESSES)]
+    state = {'i': 0}
+    def op():
+        i = state['i']
+        address, values = messages[i % 5]
+        client.send_message(address, values)
+        server.handle_request()
+        state['i'] = i + 1
+    return op
+
+# ------------------------------------------------------------------------------------------------------------
+# The model tick of main.py without sound: configuration lookup, treatment, model step and plotting channel
+def _ModelTick():
+    model = CreateModel(MODEL_UPDATE_INTERVAL)
+    treatment = CreateTreatment()
+    tracker = BPDModel2ConfigurationTracker()
+    AddModelConfigurations(tracker)
+    channel = ModelChannel()
+    imuData = ImuData()
+    angles = (20.0 * np.sin(np.linspace(0.0, 2.0 * np.pi, 1024))).tolist()
+    state = {'i': 0}
+    def op():
+        i = state['i']
+        simTime = i * MODEL_UPDATE_INTERVAL
+        imuData.xAngle = angles[i & 1023]
+        model.CurrentConfiguration = tracker.GetActiveConfiguration(simTime)
+        EB, _, _ = model.step(treatment.CalculateTreatmentEffect(imuData), DT=MODEL_UPDATE_INTERVAL)
+        channel.Write((simTime, model.ModelState.BpdMood, model.ModelState.BpdTreatmentEffect, EB))
+        state['i'] = i + 1
+    return op
+
+# ------------------------------------------------------------------------------------------------------------
+# BPDModel2.step_many over 1000 ticks (one operation = one batch)
+def _ModelStepMany(kernel:str):
+    def setup():
+        if kernel == 'numba':
+            import numba
+        model = BPDModel2(dt=MODEL_UPDATE_INTERVAL, delay_seconds=0.02, g_gain=0.07, lamb=0.5, kernel=kernel)
+        effects = np.array(_TreatmentEffects(1000))
+        out = ModelOutputArrays(len(effects), includeState=True)
+        def op():
+            model.step_many(effects, DT=MODEL_UPDATE_INTERVAL, out=out)
+        return op
+    return setup
+
+# ------------------------------------------------------------------------------------------------------------
+BENCHMARKS:list = (
+    [(f'BPDModel2.step[{mode},python]', _ModelStep(mode, 'python')) for mode in INJECT_MODES] +
+    [(f'BPDModel2.step[{mode},numba]', _ModelStep(mode, 'numba')) for mode in INJECT_MODES] +
+    [('BPDModel2.step[tilt_to_PN,python,rk4]', _ModelStep('tilt_to_PN', 'python', 'rk4')),
+     ('BPDModel2.step[tilt_to_PN,numba,rk4]', _ModelStep('tilt_to_PN', 'numba', 'rk4')),
+     ('BPDModel1.step', _Model1Step()),
+     ('BPDModel1.step[rk4]', _Model1Step('rk4'))] +
+    [(f'Tracker.GetActiveConfiguration[{count} periods]', _TrackerLookup(count)) for count in (1, 100, 10000)] +
+    [('Tracker.GetActiveConfiguration[10000 periods,random]', _TrackerLookup(10000, sequential=False)),
+     ('BPDTreatment1.CalculateTreatmentEffect', _TreatmentEffect)] +
+    [(f'ImuFusion.Update[{name}]', _FusionUpdate(name)) for name in IMU_FILTERS] +
+    [('Theremin.Update[fake pyo,control rate]', _ThereminUpdate(False)),
+     ('Theremin.Update[fake pyo,per tick]', _ThereminUpdate(True)),
+     ('ModelPlot.UpdatePlot[Agg]', _PlotUpdate),
+     ('OSC dispatch[loopback UDP]', _OscDispatch),
+     ('macro: model tick', _ModelTick),
+     ('macro: BPDModel2.step_many[1000 ticks,python]', _ModelStepMany('python')),
+     ('macro: BPDModel2.step_many[1000 ticks,numba]', _ModelStepMany('numba'))]
+)
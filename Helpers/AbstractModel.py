@@ -1,5 +1,11 @@
 from abc import abstractmethod
+import numpy as np
 from Helpers.ModelOutputData import ModelOutputData
+from Helpers.ModelOutputArrays import ModelOutputArrays
+
+# Integrators the models support: 'euler' is the explicit Euler step the models were written with, 'rk4' the
+# classic fourth order Runge-Kutta step (a method of steps scheme for the delay equation of BPDModel2)
+MODEL_INTEGRATORS:list = ['euler', 'rk4']
 
 class AbstractModel:
     # --------------------------
@@ -21,6 +27,19 @@ class AbstractModel:
     def step(self, treatmentEffect:float, DT:float=0.04):
         pass
 
+    # --------------------------
+    # Advance one tick per treatment effect and collect the per-tick output. Leaves the model in the same state
+    # as calling step() for each treatment effect; models override this with a faster loop
+    # --------------------------
+    def step_many(self, treatmentEffects:np.ndarray, DT:float=0.04, out:ModelOutputArrays=None) -> ModelOutputArrays:
+        treatmentEffects = np.asarray(treatmentEffects, dtype=np.float64)
+        out = ModelOutputArrays.Prepare(len(treatmentEffects), out)
+        for k, treatmentEffect in enumerate(treatmentEffects.tolist()):
+            self.step(treatmentEffect, DT=DT)
+            out.BpdMood[k] = self.ModelState.BpdMood
+            out.BpdTreatmentEffect[k] = self.ModelState.BpdTreatmentEffect
+        return out
+
     # --------------------------
     # Method to handle key press
     # --------------------------
@@ -20,7 +20,8 @@ class AbstractTreatment:
       self._treatment_scale = TreatmentScale
 
    # ------------------------------------------------------------------------------------------------------------
-   # Abstract method to calculate treatment effect based on IMU state data
+   # Abstract method to calculate treatment effect based on IMU state data. In main.py imuData is an ImuHistory,
+   # which has the same properties as ImuData plus windows of the recent samples (Window, Column, WindowSince)
    @abstractmethod
    def CalculateTreatmentEffect(self, imuData:ImuData)->float :
       pass
@@ -0,0 +1,281 @@
+from math import erf, floor
+
+from BPDModel2Configuration import INJECT_ADD_TO_LAMBDA, INJECT_ADD_TO_G, INJECT_ADD_TO_P, INJECT_ADD_TO_EB, INJECT_TILT_TO_PN
+from Helpers.SigmoidTransfer import SIGMOID_F0
+
+# Numba is optional: without it BPDModel2 runs its regular Python step
+try:
+    from numba import njit
+    NUMBA_AVAILABLE:bool = True
+except ImportError:
+    NUMBA_AVAILABLE:bool = False
+
+# Supported kernel backends: 'auto' uses numba when it is installed, 'python' always uses the Python step
+KERNEL_BACKENDS:list = ['auto', 'python', 'numba']
+
+# ------------------------------------------------------------------------------------------------------------
+# One BPDModel2 tick on plain floats and the P/N ring buffers: transfer functions, delay lookup, injection,
+# clamping and the ring buffer write. denom1/denom2 are the cached S1/S2 normalizers f(G) - f(0).
+# Returns (EB_next, P_next, N_next). The arithmetic is the same, in the same order, as BPDModel2.step() so both
+# paths produce identical trajectories.
+# ------------------------------------------------------------------------------------------------------------
+def bpd_model2_step(P_buf, N_buf, i, delay_steps,
+                    g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb, gain, dt, tmin, tmax, injectMode,
+                    treatmentEffect):
+    buf_len = len(P_buf)
+    cur_idx = i % buf_len
+    delay_idx = (i - delay_steps) % buf_len
+    P_cur = P_buf[cur_idx]; N_cur = N_buf[cur_idx]
+    total = P_cur + N_cur
+    EB = P_cur / total if total > 1e-9 else 0.5
+
+    s1 = (erf(g1 * EB - 2.0) - SIGMOID_F0) / denom1 if denom1 != 0 else 0.0
+    s2 = (erf(g2 * EB - 2.0) - SIGMOID_F0) / denom2 if denom2 != 0 else 0.0
+    qP_val = qPmin + s1 * (qPmax - qPmin)
+    qN_val = qNmin + (1.0 - s2) * (qNmax - qNmin)
+    tP_val = tmin + s1 * (tmax - tmin)
+    tN_val = tmin + (1.0 - s2) * (tmax - tmin)
+
+    lamb_eff, g_eff = lamb, gain
+    if injectMode == INJECT_ADD_TO_LAMBDA:
+        lamb_eff = lamb + treatmentEffect
+    elif injectMode == INJECT_ADD_TO_G:
+        g_eff = gain + treatmentEffect
+
+    # base dynamics
+    P_delay, N_delay = P_buf[delay_idx], N_buf[delay_idx]
+    diffP, diffN = (P_cur - P_delay), (N_cur - N_delay)
+
+    dP = -P_cur / tP_val + lamb_eff * qP_val
+    dN = -N_cur / tN_val + lamb_eff * qN_val
+    P_next = P_cur + dt * dP + g_eff * diffP
+    N_next = N_cur + dt * dN + g_eff * diffN
+
+    # Injection modes
+    if injectMode == INJECT_ADD_TO_P:
+        P_next += treatmentEffect * 1.0
+    elif injectMode == INJECT_ADD_TO_EB:
+        P_next += treatmentEffect * 10.0
+        N_next -= treatmentEffect * 10.0
+    elif injectMode == INJECT_TILT_TO_PN:
+        if treatmentEffect > 0:
+            P_next += abs(treatmentEffect) * 10.0
+        else:
+            N_next += abs(treatmentEffect) * 10.0
+
+    # Clamp to avoid runaway
+    P_next = max(1e-6, min(P_next, 1e6))
+    N_next = max(1e-6, min(N_next, 1e6))
+
+    next_idx = (i + 1) % buf_len
+    P_buf[next_idx] = P_next
+    N_buf[next_idx] = N_next
+
+    EB_next = P_next / (P_next + N_next) if (P_next + N_next) > 1e-9 else 0.5
+    EB_next = min(1.0, max(0.0, EB_next))
+
+    return EB_next, P_next, N_next
+
+# ------------------------------------------------------------------------------------------------------------
+# Batch version of the step kernel: one tick per treatment effect, starting at ring buffer position i, writing
+# EB/P/N and the clamped mood of every tick into the output arrays
+# ------------------------------------------------------------------------------------------------------------
+def _make_step_many(step):
+    def bpd_model2_step_many(P_buf, N_buf, i, delay_steps,
+                             g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb, gain, dt, tmin, tmax, injectMode,
+                             treatmentEffects, ebOut, pOut, nOut, moodOut):
+        for k in range(len(treatmentEffects)):
+            EB_next, P_next, N_next = step(P_buf, N_buf, i + k, delay_steps,
+                                           g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb, gain, dt, tmin, tmax, injectMode,
+                                           treatmentEffects[k])
+            ebOut[k] = EB_next
+            pOut[k] = P_next
+            nOut[k] = N_next
+            moodOut[k] = min(max(2 * (EB_next - 0.5), -1.0), 1.0)
+    return bpd_model2_step_many
+
+# Python batch kernel; runs on lists rather than arrays, so the arithmetic stays on plain floats
+bpd_model2_step_many = _make_step_many(bpd_model2_step)
+
+# ------------------------------------------------------------------------------------------------------------
+# Value of a ring buffer 'lag' (fractional) steps before position i, by cubic Lagrange interpolation over the four
+# entries around it. Lags below 0 would need values that are not known yet and are clamped to 0; near lag 0 the
+# four entries are the newest ones. The history starts at position 0 (the step after reset): before it the value
+# is the stored one (0 after reset), and the stencil does not reach across it, as the history jumps there.
+# fromLeft takes the value just before position 0 when lag is exactly i (for the end of a step)
+# ------------------------------------------------------------------------------------------------------------
+def bpd_model2_delayed(buf, i, lag, fromLeft):
+    buf_len = len(buf)
+    if lag < 0.0:
+        lag = 0.0
+    if lag > i or (fromLeft and lag == i):
+        return buf[(i - int(floor(lag)) - 1) % buf_len]
+    base = int(floor(lag)) - 1
+    if base > i - 3:
+        base = i - 3
+    if base < 0:
+        base = 0
+    # stencil entries at lags base .. base + 3, x is the position of 'lag' within it
+    x = lag - base
+    y0 = buf[(i - base) % buf_len]
+    y1 = buf[(i - base - 1) % buf_len]
+    y2 = buf[(i - base - 2) % buf_len]
+    y3 = buf[(i - base - 3) % buf_len]
+    return (-y0 * (x - 1.0) * (x - 2.0) * (x - 3.0) / 6.0 + y1 * x * (x - 2.0) * (x - 3.0) / 2.0
+            - y2 * x * (x - 1.0) * (x - 3.0) / 2.0 + y3 * x * (x - 1.0) * (x - 2.0) / 6.0)
+
+# ------------------------------------------------------------------------------------------------------------
+# Right hand side of the BPDModel2 delay equation: dP/dt and dN/dt at state (P, N) with delayed values (Pd, Nd).
+# gRate and the injection rates are the per-tick amounts of the euler map divided by the reference time step
+# ------------------------------------------------------------------------------------------------------------
+def bpd_model2_rates(P, N, Pd, Nd, g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb, gRate, tmin, tmax,
+                     injectP, injectN):
+    total = P + N
+    EB = P / total if total > 1e-9 else 0.5
+    s1 = (erf(g1 * EB - 2.0) - SIGMOID_F0) / denom1 if denom1 != 0 else 0.0
+    s2 = (erf(g2 * EB - 2.0) - SIGMOID_F0) / denom2 if denom2 != 0 else 0.0
+    qP_val = qPmin + s1 * (qPmax - qPmin)
+    qN_val = qNmin + (1.0 - s2) * (qNmax - qNmin)
+    tP_val = tmin + s1 * (tmax - tmin)
+    tN_val = tmin + (1.0 - s2) * (tmax - tmin)
+    dP = -P / tP_val + lamb * qP_val + gRate * (P - Pd) + injectP
+    dN = -N / tN_val + lamb * qN_val + gRate * (N - Nd) + injectN
+    return dP, dN
+
+# ------------------------------------------------------------------------------------------------------------
+# One classic RK4 step of dt seconds for the delay equation that the euler map discretises:
+#   dP/dt = -P/tP(EB) + lambda*qP(EB) + g/refDt * (P(t) - P(t - delay)) + injection/refDt   (N alike)
+# (method of steps: the delayed values at the stage times come from the history in the ring buffers, interpolated
+# with bpd_model2_delayed). delay is in steps of dt, rateScale is 1 / ReferenceDt. Gain, the treatment effect and
+# the injection modes act as in the euler map, spread over ReferenceDt; the treatment effect is held over the step.
+# Same arguments (with the delay as a float) and result as bpd_model2_step, plus rateScale.
+# ------------------------------------------------------------------------------------------------------------
+def _make_step_rk4(rates, delayed):
+    def bpd_model2_step_rk4(P_buf, N_buf, i, delay,
+                            g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb, gain, dt, tmin, tmax, injectMode,
+                            rateScale, treatmentEffect):
+        buf_len = len(P_buf)
+        cur_idx = i % buf_len
+        P0 = P_buf[cur_idx]; N0 = N_buf[cur_idx]
+
+        lamb_eff, g_eff = lamb, gain
+        injectP, injectN = 0.0, 0.0
+        if injectMode == INJECT_ADD_TO_LAMBDA:
+            lamb_eff = lamb + treatmentEffect
+        elif injectMode == INJECT_ADD_TO_G:
+            g_eff = gain + treatmentEffect
+        elif injectMode == INJECT_ADD_TO_P:
+            injectP = treatmentEffect * 1.0
+        elif injectMode == INJECT_ADD_TO_EB:
+            injectP = treatmentEffect * 10.0
+            injectN = -treatmentEffect * 10.0
+        elif injectMode == INJECT_TILT_TO_PN:
+            if treatmentEffect > 0:
+                injectP = abs(treatmentEffect) * 10.0
+            else:
+                injectN = abs(treatmentEffect) * 10.0
+        gRate = g_eff * rateScale
+        injectP *= rateScale
+        injectN *= rateScale
+
+        # delayed values at the start, middle and end of the step
+        Pd0 = delayed(P_buf, i, delay, False); Nd0 = delayed(N_buf, i, delay, False)
+        Pdh = delayed(P_buf, i, delay - 0.5, False); Ndh = delayed(N_buf, i, delay - 0.5, False)
+        Pd1 = delayed(P_buf, i, delay - 1.0, True); Nd1 = delayed(N_buf, i, delay - 1.0, True)
+
+        k1P, k1N = rates(P0, N0, Pd0, Nd0, g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb_eff, gRate, tmin, tmax, injectP, injectN)
+        k2P, k2N = rates(P0 + 0.5 * dt * k1P, N0 + 0.5 * dt * k1N, Pdh, Ndh, g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb_eff, gRate, tmin, tmax, injectP, injectN)
+        k3P, k3N = rates(P0 + 0.5 * dt * k2P, N0 + 0.5 * dt * k2N, Pdh, Ndh, g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb_eff, gRate, tmin, tmax, injectP, injectN)
+        k4P, k4N = rates(P0 + dt * k3P, N0 + dt * k3N, Pd1, Nd1, g1, g2, denom1, denom2, qPmin, qPmax, qNmin, qNmax, lamb_eff, gRate, tmin, tmax, injectP, injectN)
+        P_next = P0 + dt * (k1P + 2.0 * k2P + 2.0 * k3P + k4P) / 6.0
+        N_next = N0 + dt * (k1N + 2.0 * k2N + 2.0 * k3N + k4N) / 6.0
+
+        # Clamp to avoid runaway
+        P_next = max(1e-6, min(P_next, 1e6))
+        N_next = max(1e-6, min(N_next, 1e6))
+
+        next_idx = (i + 1) % buf_len
+        P_buf[next_idx] = P_next
+        N_buf[next_idx] = N_next
+
+        EB_next = P_next / (P_next + N_next) if (P_next + N_next) > 1e-9 else 0.5
+        EB_next = min(1.0, max(0.0, EB_next))
+
+        return EB_next, P_next, N_next
+    return bpd_model2_step_rk4
+
+bpd_model2_step_rk4 = _make_step_rk4(bpd_model2_rates, bpd_model2_delayed)
+
+# ------------------------------------------------------------------------------------------------------------
+_compiledStep = None
+_compiledStepMany = None
+_compiledStepRK4 = None
+
+# ------------------------------------------------------------------------------------------------------------
+# Returns the step kernel for a backend, or None when the model should use its own Python step
+def GetStepKernel(backend:str='auto'):
+    global _compiledStep
+
+    if backend not in KERNEL_BACKENDS:
+        raise ValueError(f'Unknown kernel backend {backend}, expected one of {KERNEL_BACKENDS}')
+    if backend == 'python' or (backend == 'auto' and not NUMBA_AVAILABLE):
+        return None
+    if not NUMBA_AVAILABLE:
+        raise ImportError("Kernel backend 'numba' requested, but numba is not installed")
+
+    if _compiledStep is None:
+        _compiledStep = njit(cache=True)(bpd_model2_step)
+    return _compiledStep
+
+# ------------------------------------------------------------------------------------------------------------
+# Returns the compiled batch kernel for a backend, or None when the Python batch kernel should be used
+def GetStepManyKernel(backend:str='auto'):
+    global _compiledStepMany
+
+    step = GetStepKernel(backend)
+    if step is None:
+        return None
+    if _compiledStepMany is None:
+        _compiledStepMany = njit(_make_step_many(step))
+    return _compiledStepMany
+
+# ------------------------------------------------------------------------------------------------------------
+# Returns the rk4 step for a backend: compiled with numba, or the Python function ('python', or 'auto' without numba)
+def GetRK4StepKernel(backend:str='auto'):
+    global _compiledStepRK4
+
+    if GetStepKernel(backend) is None:
+        return bpd_model2_step_rk4
+    if _compiledStepRK4 is None:
+        _compiledStepRK4 = njit(_make_step_rk4(njit(bpd_model2_rates), njit(bpd_model2_delayed)))
+    return _compiledStepRK4
+
+# ------------------------------------------------------------------------------------------------------------
+# Runs the Python and numba backends side by side over every inject mode and returns the largest difference in
+# EB/P/N between them (0.0 means identical trajectories)
+def CompareBackends(nSteps:int=20000) -> float:
+    import numpy as np
+    from BPDModel2 import BPDModel2
+    from BPDModel2Configuration import INJECT_MODES
+
+    rng = np.random.default_rng(1)
+    treatmentEffects = rng.normal(0.0, 0.05, nSteps)
+    maxDiff = 0.0
+
+    for mode in INJECT_MODES:
+        reference = BPDModel2(injectMode=mode, kernel='python', dt=0.0015, lamb=0.5, g_gain=0.07)
+        compiled = BPDModel2(injectMode=mode, kernel='numba', dt=0.0015, lamb=0.5, g_gain=0.07)
+        for te in treatmentEffects:
+            a = reference.step(te)
+            b = compiled.step(te)
+            maxDiff = max(maxDiff, abs(a[0] - b[0]), abs(a[1] - b[1]), abs(a[2] - b[2]))
+        maxDiff = max(maxDiff, abs(reference.ModelState.BpdMood - compiled.ModelState.BpdMood))
+
+    return maxDiff
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    diff = CompareBackends()
+    print(f'Largest difference between the python and numba kernels: {diff}')
+    if diff != 0.0:
+        raise SystemExit('python and numba kernels produced different trajectories')
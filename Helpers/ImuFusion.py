@@ -0,0 +1,232 @@
+import math
+from abc import ABC, abstractmethod
+
+# ------------------------------------------------------------------------------------------------------------
+# Incremental filters that fuse one IMU axis into a filtered angle and angular velocity. Each Update() takes the
+# sample time in seconds, the gyro rate, the accelerometer angle and the angle reported by the IMU (in the units
+# the IMU sends, rates in angle units per second), and costs O(1). The first sample initialises the state.
+# ------------------------------------------------------------------------------------------------------------
+class AbstractImuFilter(ABC):
+    # ------------------------------------------------------------------------------------------------------------
+    _angle:float
+    _angularVelocity:float
+    _lastTime:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Angle(self):
+        return self._angle
+
+    @property
+    def AngularVelocity(self):
+        return self._angularVelocity
+
+    # ------------------------------------------------------------------------------------------------------------
+    def reset(self):
+        self._angle = 0.0
+        self._angularVelocity = 0.0
+        self._lastTime = None
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Seconds since the previous sample (None for the first one). Samples with the same time stamp get a tiny step
+    def _dt(self, timeSeconds:float) -> float:
+        lastTime = self._lastTime
+        self._lastTime = timeSeconds
+        if lastTime is None:
+            return None
+        return max(timeSeconds - lastTime, 1e-6)
+
+    # ------------------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def Update(self, timeSeconds:float, gyroRate:float, accelAngle:float, angle:float):
+        pass
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self):
+        self.reset()
+
+# ------------------------------------------------------------------------------------------------------------
+# Complementary filter: integrates the gyro rate and pulls the result towards a reference angle with time constant
+# timeConstant (seconds). The reference is angleWeight * angle + (1 - angleWeight) * accelAngle; the IMU angle is
+# already fused on the device, lower angleWeight to lean on the accelerometer instead.
+# ------------------------------------------------------------------------------------------------------------
+class ComplementaryFilter(AbstractImuFilter):
+    # ------------------------------------------------------------------------------------------------------------
+    _timeConstant:float
+    _angleWeight:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Update(self, timeSeconds:float, gyroRate:float, accelAngle:float, angle:float):
+        reference:float = self._angleWeight * angle + (1.0 - self._angleWeight) * accelAngle
+        dt = self._dt(timeSeconds)
+        if dt is None:
+            self._angle = reference
+        else:
+            alpha:float = self._timeConstant / (self._timeConstant + dt)
+            self._angle = alpha * (self._angle + gyroRate * dt) + (1.0 - alpha) * reference
+        self._angularVelocity = gyroRate
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, timeConstant:float=0.5, angleWeight:float=1.0):
+        super().__init__()
+        self._timeConstant = timeConstant
+        self._angleWeight = angleWeight
+
+# ------------------------------------------------------------------------------------------------------------
+# Two state (angle, gyro bias) Kalman filter: predicts with the gyro rate, then corrects with the IMU angle and the
+# accelerometer angle as two measurements of different noise. The angular velocity is the bias corrected gyro rate.
+# ------------------------------------------------------------------------------------------------------------
+class KalmanAngleFilter(AbstractImuFilter):
+    # ------------------------------------------------------------------------------------------------------------
+    _qAngle:float
+    _qBias:float
+    _rAngle:float
+    _rAccel:float
+    _bias:float
+    _p00:float
+    _p01:float
+    _p10:float
+    _p11:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Bias(self):
+        return self._bias
+
+    # ------------------------------------------------------------------------------------------------------------
+    def reset(self):
+        super().reset()
+        self._bias = 0.0
+        self._p00, self._p01, self._p10, self._p11 = 0.0, 0.0, 0.0, 0.0
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _correct(self, measurement:float, noise:float):
+        y:float = measurement - self._angle
+        s:float = self._p00 + noise
+        k0:float = self._p00 / s
+        k1:float = self._p10 / s
+        self._angle += k0 * y
+        self._bias += k1 * y
+        p00, p01 = self._p00, self._p01
+        self._p00 -= k0 * p00
+        self._p01 -= k0 * p01
+        self._p10 -= k1 * p00
+        self._p11 -= k1 * p01
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Update(self, timeSeconds:float, gyroRate:float, accelAngle:float, angle:float):
+        dt = self._dt(timeSeconds)
+        if dt is None:
+            self._angle = angle
+            self._angularVelocity = gyroRate
+            return
+
+        # predict
+        rate:float = gyroRate - self._bias
+        self._angle += dt * rate
+        self._p00 += dt * (dt * self._p11 - self._p01 - self._p10 + self._qAngle)
+        self._p01 -= dt * self._p11
+        self._p10 -= dt * self._p11
+        self._p11 += self._qBias * dt
+
+        # correct
+        self._correct(angle, self._rAngle)
+        self._correct(accelAngle, self._rAccel)
+        self._angularVelocity = gyroRate - self._bias
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, qAngle:float=0.001, qBias:float=0.003, rAngle:float=0.03, rAccel:float=0.3):
+        super().__init__()
+        self._qAngle = qAngle
+        self._qBias = qBias
+        self._rAngle = rAngle
+        self._rAccel = rAccel
+
+# ------------------------------------------------------------------------------------------------------------
+# One euro filter (Casiez et al.) on the IMU angle: a low pass whose cutoff rises with the speed of change, so it
+# smooths jitter at rest without lagging behind fast movements. The angular velocity is the filtered derivative.
+# ------------------------------------------------------------------------------------------------------------
+class OneEuroFilter(AbstractImuFilter):
+    # ------------------------------------------------------------------------------------------------------------
+    _minCutoff:float
+    _beta:float
+    _derivativeCutoff:float
+    _lastAngle:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _alpha(cutoff:float, dt:float) -> float:
+        tau:float = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Update(self, timeSeconds:float, gyroRate:float, accelAngle:float, angle:float):
+        dt = self._dt(timeSeconds)
+        if dt is None:
+            self._angle = angle
+            self._angularVelocity = 0.0
+            self._lastAngle = angle
+            return
+
+        # derivative of the raw samples (the filtered angle lags, which would bias the velocity)
+        derivative:float = (angle - self._lastAngle) / dt
+        self._lastAngle = angle
+        alphaDerivative = self._alpha(self._derivativeCutoff, dt)
+        self._angularVelocity += alphaDerivative * (derivative - self._angularVelocity)
+
+        cutoff:float = self._minCutoff + self._beta * abs(self._angularVelocity)
+        self._angle += self._alpha(cutoff, dt) * (angle - self._angle)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, minCutoff:float=1.0, beta:float=0.05, derivativeCutoff:float=1.0):
+        super().__init__()
+        self._minCutoff = minCutoff
+        self._beta = beta
+        self._derivativeCutoff = derivativeCutoff
+
+# Filters selectable by name (main.py --fusion)
+IMU_FILTERS:dict = {'complementary': ComplementaryFilter,
+                    'kalman': KalmanAngleFilter,
+                    'oneeuro': OneEuroFilter}
+
+# ------------------------------------------------------------------------------------------------------------
+# Fusion stage between the IMU data and the treatment. Update() runs the filter on the latest x axis sample of the
+# source (an ImuHistory, or any object with the ImuData properties and a time property); treatments read xAngle as
+# the filtered angle, and all other ImuData properties pass through to the source unchanged.
+# ------------------------------------------------------------------------------------------------------------
+class ImuFusion:
+    # ------------------------------------------------------------------------------------------------------------
+    _source:object
+    _filter:AbstractImuFilter
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Filter(self):
+        return self._filter
+
+    @property
+    def Angle(self):
+        return self._filter.Angle
+
+    @property
+    def AngularVelocity(self):
+        return self._filter.AngularVelocity
+
+    @property
+    def xAngle(self):
+        return self._filter.Angle
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Update(self):
+        source = self._source
+        self._filter.Update(source.time, source.xGyro, source.xAccelAngle, source.xAngle)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __getattr__(self, name:str):
+        # only called for attributes that are not found on ImuFusion itself
+        return getattr(self._source, name)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, source, imuFilter:AbstractImuFilter):
+        self._source = source
+        self._filter = imuFilter
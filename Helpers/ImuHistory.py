@@ -0,0 +1,165 @@
+import time
+
+import numpy as np
+
+from Helpers.ImuTrace import IMU_TRACE_COLUMNS
+
+# ------------------------------------------------------------------------------------------------------------
+# Timestamped history of incoming IMU data in a preallocated ring of rows (columns as in IMU_TRACE_COLUMNS:
+# time in seconds since creation, then angle, gyro, accel, accel-angle and temp). Every OSC message appends a row
+# that carries the other columns forward from the previous row. Rows are written twice (at i and i + capacity), so
+# the last n rows are always a contiguous block and windows are returned as views without copying.
+#
+# The latest values are available through the same properties as ImuData, so treatments can take either.
+# There is one writer (the OSC handlers); readers should keep windows well below the capacity, or copy them,
+# since the oldest rows of a window near the capacity can be overwritten while it is being used.
+# ------------------------------------------------------------------------------------------------------------
+class ImuHistory:
+    # ------------------------------------------------------------------------------------------------------------
+    _capacity:int
+    _rows:np.ndarray
+    _count:int
+    _latest:int
+    _latestValues:list
+    _startTime:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Capacity(self):
+        return self._capacity
+
+    # Rows appended since creation (len() is the number of rows that are still available)
+    @property
+    def Count(self):
+        return self._count
+
+    def __len__(self):
+        return min(self._count, self._capacity)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Latest values, compatible with ImuData (kept as a list of python floats, which is faster to read than the rows)
+    @property
+    def time(self):
+        return self._latestValues[0]
+
+    @property
+    def xAngle(self):
+        return self._latestValues[1]
+
+    @property
+    def yAngle(self):
+        return self._latestValues[2]
+
+    @property
+    def zAngle(self):
+        return self._latestValues[3]
+
+    @property
+    def xGyro(self):
+        return self._latestValues[4]
+
+    @property
+    def yGyro(self):
+        return self._latestValues[5]
+
+    @property
+    def zGyro(self):
+        return self._latestValues[6]
+
+    @property
+    def xAccel(self):
+        return self._latestValues[7]
+
+    @property
+    def yAccel(self):
+        return self._latestValues[8]
+
+    @property
+    def zAccel(self):
+        return self._latestValues[9]
+
+    @property
+    def xAccelAngle(self):
+        return self._latestValues[10]
+
+    @property
+    def yAccelAngle(self):
+        return self._latestValues[11]
+
+    @property
+    def zAccelAngle(self):
+        return self._latestValues[12]
+
+    @property
+    def temp(self):
+        return self._latestValues[13]
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Append a row: the previous row with 'values' written from column 'firstColumn' on
+    def _Append(self, firstColumn:int, values:tuple, timestamp:float=None):
+        rows = self._rows
+        capacity = self._capacity
+        position = self._count % capacity
+        row = rows[position]
+        stamp:float = time.perf_counter() - self._startTime if timestamp is None else timestamp
+        row[:] = rows[self._latest]
+        row[0] = stamp
+        row[firstColumn:firstColumn + len(values)] = values
+        rows[position + capacity] = row
+        # swap in a new list, so readers on other threads never see a half updated sample
+        latestValues = self._latestValues.copy()
+        latestValues[0] = stamp
+        latestValues[firstColumn:firstColumn + len(values)] = values
+        self._latestValues = latestValues
+        self._latest = position
+        self._count += 1
+
+    # ------------------------------------------------------------------------------------------------------------
+    # One append per OSC message type (see the handleOscMessage_* handlers in main.py). timestamp defaults to now
+    def AppendAngle(self, x:float, y:float, z:float, timestamp:float=None):
+        self._Append(1, (x, y, z), timestamp)
+
+    def AppendGyro(self, x:float, y:float, z:float, timestamp:float=None):
+        self._Append(4, (x, y, z), timestamp)
+
+    def AppendAccel(self, x:float, y:float, z:float, timestamp:float=None):
+        self._Append(7, (x, y, z), timestamp)
+
+    def AppendAccelAngle(self, x:float, y:float, timestamp:float=None):
+        self._Append(10, (x, y), timestamp)
+
+    def AppendTemp(self, temp:float, timestamp:float=None):
+        self._Append(13, (temp,), timestamp)
+
+    # A complete row (time first, as in IMU_TRACE_COLUMNS), e.g. a sample forwarded from another process
+    def AppendRow(self, values:list):
+        self._Append(1, values[1:], values[0])
+
+    # ------------------------------------------------------------------------------------------------------------
+    # View of the last 'count' rows (fewer if not that many are available), oldest first
+    def Window(self, count:int) -> np.ndarray:
+        count = min(count, len(self))
+        start = (self._count - count) % self._capacity
+        return self._rows[start:start + count]
+
+    # View of one column (see IMU_TRACE_COLUMNS) over the last 'count' rows
+    def Column(self, name:str, count:int) -> np.ndarray:
+        return self.Window(count)[:, IMU_TRACE_COLUMNS.index(name)]
+
+    # View of the rows received during the last 'seconds' (relative to the latest row)
+    def WindowSince(self, seconds:float) -> np.ndarray:
+        window = self.Window(len(self))
+        if len(window) == 0:
+            return window
+        first = np.searchsorted(window[:, 0], window[-1, 0] - seconds, side='left')
+        return window[first:]
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, capacity:int=4096):
+        self._capacity = capacity
+        self._rows = np.zeros((2 * capacity, len(IMU_TRACE_COLUMNS)))
+        self._count = 0
+        # until the first append, 'latest' is an all-zero row, like a new ImuData
+        self._latest = 0
+        self._latestValues = [0.0] * len(IMU_TRACE_COLUMNS)
+        self._startTime = time.perf_counter()
@@ -0,0 +1,89 @@
+import numpy as np
+import os
+
+from Helpers.ImuData import ImuData
+
+# Column names of a recorded IMU trace, in the order used for header-less CSV and plain .npy files
+IMU_TRACE_COLUMNS:list = ['time',
+                          'xAngle', 'yAngle', 'zAngle',
+                          'xGyro', 'yGyro', 'zGyro',
+                          'xAccel', 'yAccel', 'zAccel',
+                          'xAccelAngle', 'yAccelAngle', 'zAccelAngle',
+                          'temp']
+
+# ------------------------------------------------------------------------------------------------------------
+# A recorded IMU trace: one timestamped row per sample, with a column per ImuData property.
+# Timestamps are in seconds and are made relative to the first sample. Columns missing from the file are 0.
+# ------------------------------------------------------------------------------------------------------------
+class ImuTrace:
+    # ------------------------------------------------------------------------------------------------------------
+    _times:np.ndarray
+    _values:np.ndarray
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Times(self):
+        return self._times
+
+    @property
+    def Duration(self):
+        return float(self._times[-1]) if len(self._times) > 0 else 0.0
+
+    def __len__(self):
+        return len(self._times)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Column(self, name:str) -> np.ndarray:
+        return self._values[:, IMU_TRACE_COLUMNS.index(name) - 1]
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Copy sample 'index' into an ImuData instance
+    def Apply(self, index:int, imuData:ImuData):
+        row = self._values[index]
+        for col, name in enumerate(IMU_TRACE_COLUMNS[1:]):
+            setattr(imuData, name, float(row[col]))
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, columns:dict):
+        times = np.asarray(columns['time'], dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+        self._times = times[order] - (times[order[0]] if len(times) > 0 else 0.0)
+        self._values = np.zeros((len(times), len(IMU_TRACE_COLUMNS) - 1))
+        for col, name in enumerate(IMU_TRACE_COLUMNS[1:]):
+            if name in columns:
+                self._values[:, col] = np.asarray(columns[name], dtype=np.float64)[order]
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Load a trace from a .csv (with or without a header row), .npy (2-D, columns in IMU_TRACE_COLUMNS order),
+    # .npz (one array per column name) or .bin (the imu.bin of a SessionRecorder recording) file
+    @staticmethod
+    def Load(path:str) -> 'ImuTrace':
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext == '.bin':
+            from Helpers.SessionRecorder import OpenRecordFile
+            records = OpenRecordFile(path)
+            return ImuTrace({name: records[name] for name in records.dtype.names})
+
+        if ext == '.npz':
+            with np.load(path) as data:
+                return ImuTrace({name: data[name] for name in data.files})
+
+        if ext == '.npy':
+            return ImuTrace(ImuTrace._positional(np.load(path)))
+
+        with open(path) as f:
+            header = f.readline().strip()
+        names = [n.strip() for n in header.split(',')]
+        if 'time' in names:
+            data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+            return ImuTrace({name: data[:, col] for col, name in enumerate(names)})
+        return ImuTrace(ImuTrace._positional(np.loadtxt(path, delimiter=',', ndmin=2)))
+
+    # ------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _positional(data:np.ndarray) -> dict:
+        data = np.atleast_2d(data)
+        if data.shape[1] > len(IMU_TRACE_COLUMNS):
+            raise ValueError(f'IMU trace has {data.shape[1]} columns, expected at most {len(IMU_TRACE_COLUMNS)}')
+        return {IMU_TRACE_COLUMNS[col]: data[:, col] for col in range(data.shape[1])}
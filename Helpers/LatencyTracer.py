@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Latencies recorded by the LatencyTracer, in the order they are reported
+LATENCY_STAGES:list = ['input_to_model', 'model_to_theremin', 'model_to_osc', 'input_to_theremin', 'input_to_osc']
+
+# ------------------------------------------------------------------------------------------------------------
+# Histogram of latencies with logarithmic bins (binsPerDecade bins per factor of 10, between minSeconds and
+# maxSeconds). Percentiles are reported as the upper edge of the bin they fall into (capped at the maximum), so
+# their relative error is at most one bin width (~12% with the default 20 bins per decade).
+# ------------------------------------------------------------------------------------------------------------
+class LatencyHistogram:
+    # ------------------------------------------------------------------------------------------------------------
+    _edges:list
+    _counts:list
+    _count:int
+    _total:float
+    _max:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Count(self):
+        return self._count
+
+    @property
+    def Mean(self):
+        return self._total / self._count if self._count > 0 else float('nan')
+
+    @property
+    def Max(self):
+        return self._max
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Record(self, seconds:float):
+        self._counts[bisect_left(self._edges, seconds)] += 1
+        self._count += 1
+        self._total += seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Latency below which 'percent' percent of the recorded values fall (nan when nothing was recorded)
+    def Percentile(self, percent:float) -> float:
+        if self._count == 0:
+            return float('nan')
+        rank = percent / 100.0 * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(self._edges[index], self._max) if index < len(self._edges) else self._max
+        return self._max
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Statistics(self) -> dict:
+        return {'count': self._count,
+                'mean': self.Mean,
+                'max': self._max,
+                'p50': self.Percentile(50),
+                'p95': self.Percentile(95),
+                'p99': self.Percentile(99),
+                'bin_edges': list(self._edges),
+                'bin_counts': list(self._counts)}
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, minSeconds:float=1e-6, maxSeconds:float=10.0, binsPerDecade:int=20):
+        edges = []
+        edge = minSeconds
+        while edge < maxSeconds * (1 + 1e-9):
+            edges.append(edge)
+            edge *= 10 ** (1.0 / binsPerDecade)
+        self._edges = edges
+        # one extra bin for everything above the last edge
+        self._counts = [0] * (len(edges) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+# ------------------------------------------------------------------------------------------------------------
+# Opt-in end-to-end latency tracing. The OSC handlers stamp IMU input on arrival (StampInput), the model tick takes
+# the oldest stamp it has not consumed yet before calculating the treatment (TakeInputStamp) and reports when the
+# model and the theremin were updated; the OSC sender reports when the state went out. Each hand-over records the
+# latency since the stamp it carries into a LatencyHistogram. Every histogram is written by a single thread; the
+# pending input stamp is shared by the OSC and model threads and only changed under _inputLock.
+# ------------------------------------------------------------------------------------------------------------
+class LatencyTracer:
+    # ------------------------------------------------------------------------------------------------------------
+    _histograms:dict
+    _pendingInputStamp:float
+    _inputLock:threading.Lock
+    _modelStamp:float
+    _modelInputStamp:float
+    _oscInputStamp:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Histograms(self):
+        return self._histograms
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC handler: an IMU sample arrived. Only the first arrival since the last model tick is kept, so the latency
+    # covers the oldest input the next tick consumes
+    def StampInput(self):
+        with self._inputLock:
+            if self._pendingInputStamp is None:
+                self._pendingInputStamp = time.perf_counter()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model tick, before the treatment is calculated: the input stamp this tick consumes (None if no new input)
+    def TakeInputStamp(self) -> float:
+        with self._inputLock:
+            stamp, self._pendingInputStamp = self._pendingInputStamp, None
+        return stamp
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model tick, after the model step
+    def ModelUpdated(self, inputStamp:float):
+        now = time.perf_counter()
+        self._modelStamp = now
+        if inputStamp is not None:
+            self._histograms['input_to_model'].Record(now - inputStamp)
+            self._modelInputStamp = inputStamp
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model tick, after the theremin was updated with the model state
+    def ThereminUpdated(self, inputStamp:float):
+        now = time.perf_counter()
+        self._histograms['model_to_theremin'].Record(now - self._modelStamp)
+        if inputStamp is not None:
+            self._histograms['input_to_theremin'].Record(now - inputStamp)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC sender, after the model state was sent. Input that reached the model since the last send is reported once
+    def OscSent(self):
+        now = time.perf_counter()
+        if self._modelStamp is None:
+            return
+        self._histograms['model_to_osc'].Record(now - self._modelStamp)
+        inputStamp = self._modelInputStamp
+        if inputStamp is not None and inputStamp != self._oscInputStamp:
+            self._histograms['input_to_osc'].Record(now - inputStamp)
+            self._oscInputStamp = inputStamp
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Statistics(self) -> dict:
+        return {stage: histogram.Statistics() for stage, histogram in self._histograms.items()}
+
+    # ------------------------------------------------------------------------------------------------------------
+    def PrintStatistics(self):
+        print('Latency trace:')
+        for stage, histogram in self._histograms.items():
+            print(f'\t{stage:18s} n={histogram.Count:8d} p50 {histogram.Percentile(50) * 1000:9.3f} ms, ' +
+                  f'p95 {histogram.Percentile(95) * 1000:9.3f} ms, p99 {histogram.Percentile(99) * 1000:9.3f} ms, ' +
+                  f'max {histogram.Max * 1000:9.3f} ms')
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Dump(self, path:str):
+        with open(path, 'w') as f:
+            json.dump(self.Statistics(), f, indent=2)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self):
+        self._histograms = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+        self._pendingInputStamp = None
+        self._inputLock = threading.Lock()
+        self._modelStamp = None
+        self._modelInputStamp = None
+        self._oscInputStamp = None
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Fields of every sample written into a ModelChannel, in tuple order
+SAMPLE_FIELDS:list = ['time', 'mood', 'treatment', 'eb']
+
+# ------------------------------------------------------------------------------------------------------------
+# Bounded single-producer / single-consumer channel of model samples. The producer (model tick) writes immutable
+# (time, mood, treatment, eb) tuples into a fixed ring of slots without locking; when the consumer falls behind,
+# the oldest samples are overwritten and counted as dropped. The consumer drains everything pending in one
+# batch, optionally decimated, as a (samples x fields) array.
+# ------------------------------------------------------------------------------------------------------------
+class ModelChannel:
+    # ------------------------------------------------------------------------------------------------------------
+    _capacity:int
+    _slots:list
+    _writeCount:int
+    _readCount:int
+    _dropped:int
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Capacity(self):
+        return self._capacity
+
+    # Samples written since creation
+    @property
+    def Written(self):
+        return self._writeCount
+
+    # Samples overwritten before the consumer read them
+    @property
+    def Dropped(self):
+        return self._dropped
+
+    # Samples written but not read yet (can exceed the capacity; the excess will be dropped)
+    @property
+    def Lag(self):
+        return self._writeCount - self._readCount
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Producer side: store one sample. Only the slot and then the write counter are assigned, each of which is
+    # atomic under the GIL, so no lock is needed with a single producer
+    def Write(self, sample:tuple):
+        count = self._writeCount
+        self._slots[count % self._capacity] = sample
+        self._writeCount = count + 1
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Most recently written sample, or None
+    def Latest(self) -> tuple:
+        count = self._writeCount
+        return self._slots[(count - 1) % self._capacity] if count > 0 else None
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Consumer side: take all pending samples. With decimation > 1, only samples whose sequence number is a
+    # multiple of 'decimation' are returned, so the decimated stream stays evenly spaced across drains
+    def Drain(self, decimation:int=1) -> np.ndarray:
+        start = self._readCount
+        end = self._writeCount
+        if end - start > self._capacity:
+            self._dropped += end - start - self._capacity
+            start = end - self._capacity
+
+        if decimation > 1:
+            start += (-start) % decimation
+        samples = [self._slots[i % self._capacity] for i in range(start, end, max(1, decimation))]
+
+        # the producer may have lapped the consumer while copying: discard the slots it overwrote (the slot of
+        # sample n is reused for sample n + capacity, which may be in progress before the write counter moves)
+        overwritten = min(self._writeCount - self._capacity + 1, end) - start
+        if overwritten > 0:
+            skip = -(-overwritten // max(1, decimation))
+            samples = samples[skip:]
+            self._dropped += overwritten
+        self._readCount = end
+
+        if len(samples) == 0:
+            return np.zeros((0, len(SAMPLE_FIELDS)))
+        return np.array(samples, dtype=np.float64)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, capacity:int=4096):
+        self._capacity = capacity
+        self._slots = [None] * capacity
+        self._writeCount = 0
+        self._readCount = 0
+        self._dropped = 0
@@ -0,0 +1,57 @@
+import numpy as np
+
+# ------------------------------------------------------------------------------------------------------------
+# Per-tick model output for a batch of ticks (see AbstractModel.step_many). EB/P/N are only allocated for models
+# that have them (includeState=True).
+# ------------------------------------------------------------------------------------------------------------
+class ModelOutputArrays:
+    # ------------------------------------------------------------------------------------------------------------
+    _bpdMood:np.ndarray
+    _bpdTreatmentEffect:np.ndarray
+    _eb:np.ndarray
+    _p:np.ndarray
+    _n:np.ndarray
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def BpdMood(self):
+        return self._bpdMood
+
+    @property
+    def BpdTreatmentEffect(self):
+        return self._bpdTreatmentEffect
+
+    @property
+    def EB(self):
+        return self._eb
+
+    @property
+    def P(self):
+        return self._p
+
+    @property
+    def N(self):
+        return self._n
+
+    def __len__(self):
+        return len(self._bpdMood)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Return 'out' when it is given and large enough for 'size' ticks, otherwise allocate new arrays
+    @staticmethod
+    def Prepare(size:int, out:'ModelOutputArrays'=None, includeState:bool=False) -> 'ModelOutputArrays':
+        if out is None:
+            return ModelOutputArrays(size, includeState)
+        if len(out) < size:
+            raise ValueError(f'Output arrays hold {len(out)} ticks, {size} needed')
+        if includeState and out.EB is None:
+            raise ValueError('Output arrays were allocated without EB/P/N')
+        return out
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, size:int, includeState:bool=False):
+        self._bpdMood = np.zeros(size)
+        self._bpdTreatmentEffect = np.zeros(size)
+        self._eb = np.zeros(size) if includeState else None
+        self._p = np.zeros(size) if includeState else None
+        self._n = np.zeros(size) if includeState else None
@@ -1,8 +1,11 @@
 
-import numpy as np
-
+# ------------------------------------------------------------------------------------------------------------
+# Model output of one tick. Slotted: written on every model tick, so instances carry no __dict__
 # ------------------------------------------------------------------------------------------------------------
 class ModelOutputData:
+    # ------------------------------------------------------------------------------------------------------------
+    __slots__ = ('_bpdMood', '_bpdTreatmentEffect')
+
     # ------------------------------------------------------------------------------------------------------------
     _bpdMood:float
     _bpdTreatmentEffect:float
@@ -14,7 +17,8 @@ class ModelOutputData:
     
     @BpdMood.setter
     def BpdMood(self, val):
-        self._bpdMood = np.clip(val, -1, 1)
+        # scalar clamp to [-1, 1] (np.clip is a full ufunc dispatch on every model tick)
+        self._bpdMood = min(max(val, -1.0), 1.0)
 
     # ------------------------------------------------------------------------------------------------------------
     @property
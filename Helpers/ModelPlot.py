@@ -1,24 +1,43 @@
+import time
+
 import numpy as np
 from numpy.typing import NDArray
 import matplotlib.pyplot as plt
+from matplotlib.lines import Line2D
 
 from Helpers.ModelOutputData import ModelOutputData
 from Helpers.ThereminOutputData import ThereminOutputData
 
 # ------------------------------------------------------------------------------------------------------------
-     
+# Scrolling plot of mood and treatment effect. The history is kept in preallocated ring buffers that are written
+# twice (at i and i + historyLength), so the latest window is always a contiguous view. The line artists are
+# created once and redrawn with blitting over a cached background, at most maxFrameRate times per second.
+# ------------------------------------------------------------------------------------------------------------
 class ModelPlot:
     # --------------------------
     # Model State History
     # --------------------------
-    _moodHistory:NDArray[np.float64] = []
-    _treatmentHistory:NDArray[np.float64] = []
+    _historyLength:int
+    _moodHistory:NDArray[np.float64]
+    _treatmentHistory:NDArray[np.float64]
+    _historyIndex:int
+    _xData:NDArray[np.float64]
 
     # --------------------------
     # Figure Tracking
     # --------------------------
     _fig:plt.Figure
     _ax1:plt.Axes
+    _moodLine:Line2D
+    _treatmentLine:Line2D
+    _background:object
+
+    # --------------------------
+    # Frame rate limiting
+    # --------------------------
+    _maxFrameRate:float
+    _lastDrawTime:float
+    _isDirty:bool
 
     # --------------------------
     # State variable Property Getters
@@ -27,31 +46,110 @@ class ModelPlot:
     def Fig(self):
         return self._fig
 
+    @property
+    def MaxFrameRate(self):
+        return self._maxFrameRate
+
+    @MaxFrameRate.setter
+    def MaxFrameRate(self, value):
+        self._maxFrameRate = value
+
     # --------------------------
-    # Plot``
+    # Plot
     # --------------------------
     def UpdatePlot(self, modelOutputData:ModelOutputData):
-        self._moodHistory.append(modelOutputData.BpdMood)
-        self._treatmentHistory.append(modelOutputData.BpdTreatmentEffect)
-        
-        if len(self._moodHistory)>500:
-            self._moodHistory.pop(0)
-            self._treatmentHistory.pop(0)
-
-        self._ax1.clear()
-        self._ax1.set_ylim(-5, 5)
-        self._ax1.set_ylabel("Mood & Treatment")
-        
-        self._ax1.plot(list(range(len(self._moodHistory))), self._moodHistory, label="Mood")
-        self._ax1.plot(list(range(len(self._treatmentHistory))), self._treatmentHistory, label="Treatment Effect")
-        self._ax1.legend()
-    
+        self._Append(modelOutputData.BpdMood, modelOutputData.BpdTreatmentEffect)
+        self.Render()
+
+    # Add a batch of samples drained from a ModelChannel (rows of time, mood, treatment, eb)
+    def UpdatePlotSamples(self, samples:NDArray[np.float64]):
+        if len(samples) == 0:
+            return
+        length = self._historyLength
+        moods = samples[-length:, 1]
+        treatments = samples[-length:, 2]
+        count = len(moods)
+
+        # write the batch into both halves of the ring, wrapping at most once
+        start = self._historyIndex
+        first = min(count, length - start)
+        for history, values in ((self._moodHistory, moods), (self._treatmentHistory, treatments)):
+            history[start:start + first] = values[:first]
+            history[start + length:start + length + first] = values[:first]
+            history[:count - first] = values[first:]
+            history[length:length + count - first] = values[first:]
+        self._historyIndex = (start + count) % length
+        self._isDirty = True
+        self.Render()
+
+    def _Append(self, mood:float, treatment:float):
+        i = self._historyIndex
+        length = self._historyLength
+        self._moodHistory[i] = self._moodHistory[i + length] = mood
+        self._treatmentHistory[i] = self._treatmentHistory[i + length] = treatment
+        self._historyIndex = (i + 1) % length
+        self._isDirty = True
+
+    # Redraw the lines if there is new data and the frame rate allows it (or force is set)
+    def Render(self, force:bool=False):
+        if not self._isDirty and not force:
+            return
+        now = time.perf_counter()
+        if not force and self._maxFrameRate > 0 and now - self._lastDrawTime < 1.0 / self._maxFrameRate:
+            return
+        self._lastDrawTime = now
+        self._isDirty = False
+
+        i = self._historyIndex
+        self._moodLine.set_ydata(self._moodHistory[i:i + self._historyLength])
+        self._treatmentLine.set_ydata(self._treatmentHistory[i:i + self._historyLength])
+
+        canvas = self._fig.canvas
+        if self._background is None or not getattr(canvas, 'supports_blit', False):
+            # no cached background yet (or no blitting support): a full draw also captures the background
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self._background)
+        self._ax1.draw_artist(self._moodLine)
+        self._ax1.draw_artist(self._treatmentLine)
+        canvas.blit(self._fig.bbox)
+
+    # A full draw (first show, resize) leaves out the animated lines: cache it as the background and blit the
+    # lines on top
+    def _OnDraw(self, event):
+        canvas = self._fig.canvas
+        if not getattr(canvas, 'supports_blit', False):
+            return
+        self._background = canvas.copy_from_bbox(self._fig.bbox)
+        self._ax1.draw_artist(self._moodLine)
+        self._ax1.draw_artist(self._treatmentLine)
+
     # --------------------------
     # Plotting setup
     # --------------------------
-    def __init__(self):
+    def __init__(self, historyLength:int=500, maxFrameRate:float=30.0):
         plt.ion()
 
+        self._historyLength = historyLength
+        self._moodHistory = np.full(2 * historyLength, np.nan)
+        self._treatmentHistory = np.full(2 * historyLength, np.nan)
+        self._historyIndex = 0
+        self._xData = np.arange(historyLength, dtype=np.float64)
+
+        self._maxFrameRate = maxFrameRate
+        self._lastDrawTime = 0.0
+        self._isDirty = False
+        self._background = None
+
         self._fig = plt.figure()
         self._ax1 = self._fig.add_subplot()
+        self._ax1.set_xlim(0, historyLength - 1)
+        self._ax1.set_ylim(-5, 5)
+        self._ax1.set_ylabel("Mood & Treatment")
+
+        # animated lines are left out of normal draws and only drawn by Render()
+        self._moodLine, = self._ax1.plot(self._xData, self._moodHistory[:historyLength], label="Mood", animated=True)
+        self._treatmentLine, = self._ax1.plot(self._xData, self._treatmentHistory[:historyLength], label="Treatment Effect", animated=True)
+        self._ax1.legend()
 
+        self._fig.canvas.mpl_connect('draw_event', self._OnDraw)
@@ -0,0 +1,192 @@
+import threading
+import time
+
+# Upper edges (in seconds) of the tick lateness histogram bins; the last bin holds everything later
+LATENESS_BINS:list = [0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05]
+
+# ------------------------------------------------------------------------------------------------------------
+# Runs the model tick on its own thread at a fixed simulated time step, driven by the monotonic high resolution
+# clock. Ticks that are due are run back to back to catch up (at most maxCatchUpSteps per wake-up); beyond that,
+# steps are dropped and simulated time falls behind wall time. The tick function receives the simulated time.
+# ------------------------------------------------------------------------------------------------------------
+class ModelScheduler:
+    # --------------------------
+    # Configuration
+    # --------------------------
+    _tick:object
+    _interval:float
+    _maxCatchUpSteps:int
+    _spinSeconds:float
+
+    # --------------------------
+    # State variables
+    # --------------------------
+    _thread:threading.Thread
+    _isRunning:bool
+    _startTime:float
+    _wallTime:float
+    _steps:int
+    _droppedSteps:int
+    _lateSteps:int
+    _overruns:int
+    _maxLateness:float
+    _latenessHistogram:list
+    _maxStepDuration:float
+    _totalStepDuration:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Interval(self):
+        return self._interval
+
+    @property
+    def IsRunning(self):
+        return self._isRunning
+
+    # Simulated seconds (steps run * interval)
+    @property
+    def SimTime(self):
+        return self._steps * self._interval
+
+    # Wall clock seconds since Start(), as of the last wake-up
+    @property
+    def WallTime(self):
+        return self._wallTime
+
+    # How far simulated time is behind wall time (grows by one interval per dropped step)
+    @property
+    def Offset(self):
+        return self._wallTime - self.SimTime
+
+    @property
+    def Steps(self):
+        return self._steps
+
+    # Steps that were not run because more than maxCatchUpSteps were due
+    @property
+    def DroppedSteps(self):
+        return self._droppedSteps
+
+    # Steps that ran more than one interval after their deadline (run to catch up)
+    @property
+    def LateSteps(self):
+        return self._lateSteps
+
+    # Wake-ups where more than one step was due
+    @property
+    def Overruns(self):
+        return self._overruns
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Statistics(self) -> dict:
+        steps = max(1, self._steps)
+        return {'steps': self._steps,
+                'sim_time': self.SimTime,
+                'wall_time': self._wallTime,
+                'offset': self.Offset,
+                'dropped_steps': self._droppedSteps,
+                'late_steps': self._lateSteps,
+                'overruns': self._overruns,
+                'max_lateness': self._maxLateness,
+                'lateness_bins': list(LATENESS_BINS),
+                'lateness_histogram': list(self._latenessHistogram),
+                'mean_step_duration': self._totalStepDuration / steps,
+                'max_step_duration': self._maxStepDuration}
+
+    # ------------------------------------------------------------------------------------------------------------
+    def PrintStatistics(self):
+        stats = self.Statistics()
+        print(f'Model scheduler: {stats["steps"]} steps, sim time {stats["sim_time"]:.3f} s, wall time {stats["wall_time"]:.3f} s, offset {stats["offset"] * 1000:.3f} ms')
+        print(f'\tdropped steps {stats["dropped_steps"]}, late steps {stats["late_steps"]}, overruns {stats["overruns"]}, max lateness {stats["max_lateness"] * 1000:.3f} ms')
+        print(f'\tstep duration mean {stats["mean_step_duration"] * 1e6:.1f} us, max {stats["max_step_duration"] * 1e6:.1f} us')
+        lower = 0.0
+        for upper, count in zip(LATENESS_BINS + [float('inf')], stats['lateness_histogram']):
+            print(f'\tlateness {lower * 1000:8.3f} - {upper * 1000:8.3f} ms: {count}')
+            lower = upper
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _recordLateness(self, lateness:float):
+        if lateness > self._maxLateness:
+            self._maxLateness = lateness
+        for index, upper in enumerate(LATENESS_BINS):
+            if lateness < upper:
+                self._latenessHistogram[index] += 1
+                return
+        self._latenessHistogram[-1] += 1
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _run(self):
+        clock = time.perf_counter
+        interval = self._interval
+        self._startTime = clock()
+
+        while self._isRunning:
+            now = clock()
+            elapsed = now - self._startTime
+            self._wallTime = elapsed
+
+            # steps that should have run by now, minus the ones already run or dropped
+            due = int(elapsed / interval) - self._droppedSteps - self._steps
+            if due <= 0:
+                # sleep until the next deadline. With spinSeconds, the last stretch is spun to wake up on time, yielding
+                # the GIL on every pass so that the other threads keep running
+                remaining = (self._steps + self._droppedSteps + 1) * interval - elapsed
+                if remaining > self._spinSeconds:
+                    time.sleep(remaining - self._spinSeconds)
+                else:
+                    time.sleep(0)
+                continue
+
+            if due > 1:
+                self._overruns += 1
+                self._lateSteps += due - 1
+            if due > self._maxCatchUpSteps:
+                self._droppedSteps += due - self._maxCatchUpSteps
+                due = self._maxCatchUpSteps
+
+            for _ in range(due):
+                stepStart = clock()
+                # lateness of this step against its deadline
+                self._recordLateness(stepStart - self._startTime - (self._steps + self._droppedSteps + 1) * interval)
+                self._tick(self._steps * interval)
+                self._steps += 1
+                stepDuration = clock() - stepStart
+                self._totalStepDuration += stepDuration
+                if stepDuration > self._maxStepDuration:
+                    self._maxStepDuration = stepDuration
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Start(self):
+        if self._isRunning:
+            return
+        self._isRunning = True
+        self._thread = threading.Thread(target=self._run, name='ModelScheduler', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Stop(self):
+        self._isRunning = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Constructor. tick is called as tick(simTimeSeconds) once per interval of simulated time. spinSeconds > 0 spins
+    # (instead of sleeping) for that long before every deadline: less lateness, at the cost of a busy core
+    def __init__(self, tick, interval:float, maxCatchUpSteps:int=10, spinSeconds:float=0.0):
+        self._tick = tick
+        self._interval = interval
+        self._maxCatchUpSteps = max(1, maxCatchUpSteps)
+        self._spinSeconds = spinSeconds
+        self._thread = None
+        self._isRunning = False
+        self._startTime = 0.0
+        self._wallTime = 0.0
+        self._steps = 0
+        self._droppedSteps = 0
+        self._lateSteps = 0
+        self._overruns = 0
+        self._maxLateness = 0.0
+        self._latenessHistogram = [0] * (len(LATENESS_BINS) + 1)
+        self._maxStepDuration = 0.0
+        self._totalStepDuration = 0.0
@@ -0,0 +1,139 @@
+import numpy as np
+
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.udp_client import SimpleUDPClient
+
+from Helpers.ModelChannel import ModelChannel, SAMPLE_FIELDS
+
+# Ways of sending the model history (see OscHistorySender)
+OSC_HISTORY_MODES:list = ['bundle', 'blob']
+
+# ------------------------------------------------------------------------------------------------------------
+# Sends every model sample (or every n-th, with decimation) since the previous send, so OSC consumers get the full
+# model rate at a low packet rate. The model tick writes (time, mood, treatment, eb) samples (Write), the OSC send
+# job calls Send(), which splits the pending samples over as few packets of at most maxPacketSize bytes as it can:
+#   bundle: OSC bundles of one '<address>' message per sample, with arguments time (double), mood, treatment, eb
+#   blob:   '<address>/Blob' messages with arguments count (int) and a blob of count rows of time, mood, treatment
+#           and eb as little endian doubles
+# ------------------------------------------------------------------------------------------------------------
+class OscHistorySender:
+    # ------------------------------------------------------------------------------------------------------------
+    _client:SimpleUDPClient
+    _address:str
+    _mode:str
+    _decimation:int
+    _maxPacketSize:int
+    _channel:ModelChannel
+    _samplesPerPacket:int
+    _sentSamples:int
+    _sentPackets:int
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Mode(self):
+        return self._mode
+
+    @property
+    def Decimation(self):
+        return self._decimation
+
+    @property
+    def MaxPacketSize(self):
+        return self._maxPacketSize
+
+    @property
+    def SamplesPerPacket(self):
+        return self._samplesPerPacket
+
+    @property
+    def SentSamples(self):
+        return self._sentSamples
+
+    @property
+    def SentPackets(self):
+        return self._sentPackets
+
+    # Samples the sender did not get to before they were overwritten (see ModelChannel)
+    @property
+    def Dropped(self):
+        return self._channel.Dropped
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model tick: queue one (time, mood, treatment, eb) sample
+    def Write(self, sample:tuple):
+        self._channel.Write(sample)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _sampleMessage(self, sample) -> object:
+        builder = OscMessageBuilder(address=self._address)
+        builder.add_arg(float(sample[0]), OscMessageBuilder.ARG_TYPE_DOUBLE)
+        for value in sample[1:]:
+            builder.add_arg(float(value), OscMessageBuilder.ARG_TYPE_FLOAT)
+        return builder.build()
+
+    def _blobMessage(self, samples:np.ndarray) -> object:
+        builder = OscMessageBuilder(address=self._address + '/Blob')
+        builder.add_arg(len(samples), OscMessageBuilder.ARG_TYPE_INT)
+        builder.add_arg(np.ascontiguousarray(samples, dtype='<f8').tobytes(), OscMessageBuilder.ARG_TYPE_BLOB)
+        return builder.build()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Bundles or blob messages for 'samples' (rows of SAMPLE_FIELDS), each at most maxPacketSize bytes
+    def BuildPackets(self, samples:np.ndarray) -> list:
+        packets = []
+        for start in range(0, len(samples), self._samplesPerPacket):
+            chunk = samples[start:start + self._samplesPerPacket]
+            if self._mode == 'blob':
+                packets.append(self._blobMessage(chunk))
+            else:
+                builder = OscBundleBuilder(IMMEDIATELY)
+                for sample in chunk.tolist():
+                    builder.add_content(self._sampleMessage(sample))
+                packets.append(builder.build())
+        return packets
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC send job: send everything written since the last call. Returns the number of packets sent
+    def Send(self) -> int:
+        samples = self._channel.Drain(self._decimation)
+        packets = self.BuildPackets(samples)
+        for packet in packets:
+            self._client.send(packet)
+        self._sentSamples += len(samples)
+        self._sentPackets += len(packets)
+        return len(packets)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Samples that fit in one packet: every sample message (or blob row) has the same size, so measure one
+    def _measureSamplesPerPacket(self) -> int:
+        sample = (0.0,) * len(SAMPLE_FIELDS)
+        if self._mode == 'blob':
+            # rows are a multiple of 4 bytes, so the blob needs no padding (and OSC blobs cannot be empty)
+            perSample = 8 * len(SAMPLE_FIELDS)
+            overhead = self._blobMessage(np.zeros((1, len(SAMPLE_FIELDS)))).size - perSample
+        else:
+            # '#bundle' and the time tag, then a size prefix per message
+            overhead = 16
+            perSample = 4 + self._sampleMessage(sample).size
+        count = (self._maxPacketSize - overhead) // perSample
+        if count < 1:
+            raise ValueError(f'Maximum packet size {self._maxPacketSize} is too small for one sample ({overhead + perSample} bytes)')
+        return count
+
+    # ------------------------------------------------------------------------------------------------------------
+    # maxPacketSize defaults to what fits in one ethernet frame without IP fragmentation. capacity is the number of
+    # samples (before decimation) kept between sends
+    def __init__(self, client:SimpleUDPClient, address:str='/Brandeis/BPD/Model/History', mode:str='bundle',
+                 decimation:int=1, maxPacketSize:int=1400, capacity:int=8192):
+        if mode not in OSC_HISTORY_MODES:
+            raise ValueError(f'Unknown OSC history mode {mode}, expected one of {OSC_HISTORY_MODES}')
+        self._client = client
+        self._address = address
+        self._mode = mode
+        self._decimation = max(1, decimation)
+        self._maxPacketSize = maxPacketSize
+        self._channel = ModelChannel(capacity)
+        self._samplesPerPacket = self._measureSamplesPerPacket()
+        self._sentSamples = 0
+        self._sentPackets = 0
@@ -0,0 +1,218 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from BPDModel2Configuration import INJECT_MODES
+from Helpers.ImuTrace import IMU_TRACE_COLUMNS
+
+# ------------------------------------------------------------------------------------------------------------
+# Record layouts (little endian, packed). IMU records are the ImuHistory rows: 'time' is seconds on the IMU history
+# clock. Model and parameter records are stamped with simulated model time. 'configuration' numbers the
+# configurations in the order the model first used them.
+IMU_RECORD_DTYPE:np.dtype = np.dtype([(name, '<f8') for name in IMU_TRACE_COLUMNS])
+MODEL_RECORD_DTYPE:np.dtype = np.dtype([('time', '<f8'), ('treatment', '<f8'), ('eb', '<f8'), ('p', '<f8'), ('n', '<f8'),
+                                        ('mood', '<f8'), ('configuration', '<i4')])
+PARAMETER_RECORD_DTYPE:np.dtype = np.dtype([('time', '<f8'), ('configuration', '<i4'), ('parameter', 'S16'), ('value', '<f8')])
+
+# BPDModel2Configuration properties written to the parameter log (InjectMode as its index in INJECT_MODES)
+RECORDED_PARAMETERS:list = ['InjectMode', 'G1', 'G2', 'QPMin', 'QPMax', 'QNMin', 'QNMax', 'Lamb', 'Dt', 'TMin', 'TMax',
+                            'Delay_Seconds', 'Gain', 'ReferenceDt']
+
+# Files of a recording directory: <stream>.bin with the records, <stream>.bin.dtype.json with their layout
+RECORD_STREAMS:dict = {'imu': IMU_RECORD_DTYPE, 'model': MODEL_RECORD_DTYPE, 'parameters': PARAMETER_RECORD_DTYPE}
+
+# ------------------------------------------------------------------------------------------------------------
+# Open a record file written by a SessionRecorder as a read-only memory map, using the layout in its sidecar
+def OpenRecordFile(path:str) -> np.ndarray:
+    with open(path + '.dtype.json', 'r') as f:
+        dtype = np.dtype([tuple(field) for field in json.load(f)['descr']])
+    if os.path.getsize(path) < dtype.itemsize:
+        # numpy cannot map an empty file
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(os.path.getsize(path) // dtype.itemsize,))
+
+# ------------------------------------------------------------------------------------------------------------
+# {stream: records} for every stream present in a recording directory
+def ReadRecording(directory:str) -> dict:
+    streams = {}
+    for name in RECORD_STREAMS:
+        path = os.path.join(directory, name + '.bin')
+        if os.path.exists(path):
+            streams[name] = OpenRecordFile(path)
+    return streams
+
+# ------------------------------------------------------------------------------------------------------------
+# One record file. The producer fills preallocated blocks of records; a full block is queued for the writer
+# thread and replaced by one the writer has finished with, so the producer never touches the file.
+# ------------------------------------------------------------------------------------------------------------
+class _RecordStream:
+    # ------------------------------------------------------------------------------------------------------------
+    _file:object
+    _dtype:np.dtype
+    _blockSize:int
+    _block:np.ndarray
+    _fill:int
+    _freeBlocks:queue.SimpleQueue
+    _written:int
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Written(self):
+        return self._written
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Producer side: store one record; a full block is handed to the writer thread
+    def Append(self, record:tuple, pending:queue.SimpleQueue):
+        self._block[self._fill] = record
+        self._fill += 1
+        if self._fill == self._blockSize:
+            self.Handoff(pending)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Producer side: queue the filled part of the current block for writing and start a new one
+    def Handoff(self, pending:queue.SimpleQueue):
+        if self._fill == 0:
+            return
+        pending.put((self, self._block, self._fill))
+        try:
+            self._block = self._freeBlocks.get_nowait()
+        except queue.Empty:
+            self._block = np.zeros(self._blockSize, dtype=self._dtype)
+        self._fill = 0
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Writer thread: write 'count' records of 'block' and hand the block back for reuse
+    def WriteBlock(self, block:np.ndarray, count:int):
+        self._file.write(block[:count].tobytes())
+        self._written += count
+        self._freeBlocks.put(block)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Close(self):
+        self._file.close()
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, path:str, dtype:np.dtype, blockSize:int):
+        self._dtype = dtype
+        self._blockSize = blockSize
+        self._block = np.zeros(blockSize, dtype=dtype)
+        self._fill = 0
+        self._freeBlocks = queue.SimpleQueue()
+        self._written = 0
+        with open(path + '.dtype.json', 'w') as f:
+            json.dump({'descr': dtype.descr, 'itemsize': dtype.itemsize}, f, indent=2)
+        self._file = open(path, 'wb')
+
+# ------------------------------------------------------------------------------------------------------------
+# Records a session into a directory of fixed size record files (see RECORD_STREAMS), written by a background
+# thread, that can be read back without parsing (ReadRecording). Every IMU sample (RecordImu, on the OSC thread),
+# every model tick (RecordTick, on the model thread) and every change of a configuration parameter is recorded.
+# Parameters are written when the model first uses a configuration, and the ones that changed are written on the
+# first tick after the configuration's Version moved (e.g. by on_key), so each stream keeps a single producer thread.
+# streams selects the files this recorder writes (RecordTick needs 'model' and 'parameters'), e.g. when the IMU
+# and the model are recorded by different processes. Records still in an unfilled block are written by Close().
+# ------------------------------------------------------------------------------------------------------------
+class SessionRecorder:
+    # ------------------------------------------------------------------------------------------------------------
+    _directory:str
+    _streams:dict
+    _pending:queue.SimpleQueue
+    _writerThread:threading.Thread
+    _configurationIds:dict
+    _configurations:list
+    _recordedParameters:dict
+    _recordedVersions:list
+    _imu:_RecordStream
+    _model:_RecordStream
+    _parameters:_RecordStream
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Directory(self):
+        return self._directory
+
+    # Records written to disk so far, per stream
+    @property
+    def Written(self):
+        return {name: stream.Written for name, stream in self._streams.items()}
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC thread: record the latest values of 'source' (an ImuHistory or ImuData)
+    def RecordImu(self, source):
+        self._imu.Append(tuple([getattr(source, name) for name in IMU_TRACE_COLUMNS]), self._pending)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model thread: record one tick, and the parameters of 'configuration' when it is new or has changed
+    def RecordTick(self, simTimeSeconds:float, treatmentEffect:float, EB:float, P:float, N:float, mood:float, configuration):
+        configurationId = self._configurationIds.get(id(configuration))
+        if configurationId is None or self._recordedVersions[configurationId] != configuration.Version:
+            configurationId = self._recordParameters(simTimeSeconds, configuration)
+        self._model.Append((simTimeSeconds, treatmentEffect, EB, P, N, mood, configurationId), self._pending)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _recordParameters(self, simTimeSeconds:float, configuration) -> int:
+        configurationId = self._configurationIds.get(id(configuration))
+        if configurationId is None:
+            configurationId = len(self._configurations)
+            # keep the configuration alive, so its id() is not reused
+            self._configurations.append(configuration)
+            self._configurationIds[id(configuration)] = configurationId
+            self._recordedParameters[configurationId] = {}
+            self._recordedVersions.append(None)
+        self._recordedVersions[configurationId] = configuration.Version
+
+        recorded = self._recordedParameters[configurationId]
+        for name in RECORDED_PARAMETERS:
+            value = getattr(configuration, name)
+            if name == 'InjectMode':
+                value = INJECT_MODES.index(value)
+            if recorded.get(name) != value:
+                recorded[name] = value
+                self._parameters.Append((simTimeSeconds, configurationId, name.encode(), value), self._pending)
+        return configurationId
+
+    # ------------------------------------------------------------------------------------------------------------
+    def _runWriter(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            stream, block, count = item
+            stream.WriteBlock(block, count)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Write the remaining records and close the files. Call when the producers have stopped
+    def Close(self):
+        for stream in self._streams.values():
+            stream.Handoff(self._pending)
+        self._pending.put(None)
+        self._writerThread.join()
+        for stream in self._streams.values():
+            stream.Close()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # blockSize is the number of records per write; up to that many records per stream are lost if the program
+    # is killed instead of closing the recorder
+    def __init__(self, directory:str, streams:list=None, blockSize:int=4096):
+        if streams is None:
+            streams = list(RECORD_STREAMS.keys())
+        for name in streams:
+            if name not in RECORD_STREAMS:
+                raise ValueError(f'Unknown record stream {name}, expected one of {list(RECORD_STREAMS.keys())}')
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._streams = {name: _RecordStream(os.path.join(directory, name + '.bin'), RECORD_STREAMS[name], blockSize)
+                         for name in streams}
+        self._imu = self._streams.get('imu')
+        self._model = self._streams.get('model')
+        self._parameters = self._streams.get('parameters')
+        self._pending = queue.SimpleQueue()
+        self._configurationIds = {}
+        self._configurations = []
+        self._recordedParameters = {}
+        self._recordedVersions = []
+        self._writerThread = threading.Thread(target=self._runWriter, name='SessionRecorder', daemon=True)
+        self._writerThread.start()
@@ -0,0 +1,168 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Helpers.ImuTrace import IMU_TRACE_COLUMNS
+from Helpers.ModelChannel import SAMPLE_FIELDS
+
+# ------------------------------------------------------------------------------------------------------------
+# Shared memory blocks that connect main.py to a model process (see ModelProcess.py) without pickling anything per
+# tick. Both are created by the main process (name=None) and attached to by the model process (by Name); the
+# creator unlinks them when done. Counters are int64 in the block itself, each with a single writing process.
+# ------------------------------------------------------------------------------------------------------------
+def _OpenBlock(name:str, size:int) -> shared_memory.SharedMemory:
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    return shared_memory.SharedMemory(name=name)
+
+# ------------------------------------------------------------------------------------------------------------
+# Latest IMU values (columns as in IMU_TRACE_COLUMNS), written by the OSC handlers and read by the model tick.
+# A sequence counter that is odd while the values are written (a seqlock) lets the reader detect and retry a torn
+# read, and tells it whether anything arrived since its previous read.
+# ------------------------------------------------------------------------------------------------------------
+class SharedImuInput:
+    # ------------------------------------------------------------------------------------------------------------
+    _block:shared_memory.SharedMemory
+    _isOwner:bool
+    _sequence:np.ndarray
+    _values:np.ndarray
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Name(self):
+        return self._block.name
+
+    # Number of samples published since creation
+    @property
+    def Published(self):
+        return int(self._sequence[0]) // 2
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Writer side: publish the latest values of 'source' (an ImuData, ImuHistory or ImuFusion)
+    def Publish(self, source):
+        values = [getattr(source, name) for name in IMU_TRACE_COLUMNS]
+        sequence = int(self._sequence[0])
+        self._sequence[0] = sequence + 1
+        self._values[:] = values
+        self._sequence[0] = sequence + 2
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Reader side: (sequence, values) of the latest sample, or (lastSequence, None) when nothing was published
+    # since the read that returned lastSequence
+    def Read(self, lastSequence:int=0) -> tuple:
+        while True:
+            before = int(self._sequence[0])
+            if before == lastSequence:
+                return lastSequence, None
+            if before & 1:
+                continue
+            values = self._values.tolist()
+            if int(self._sequence[0]) == before:
+                return before, values
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Close(self):
+        self._sequence = None
+        self._values = None
+        self._block.close()
+        if self._isOwner:
+            self._block.unlink()
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, name:str=None):
+        columns = len(IMU_TRACE_COLUMNS)
+        self._block = _OpenBlock(name, 8 * (1 + columns))
+        self._isOwner = name is None
+        self._sequence = np.ndarray((1,), dtype=np.int64, buffer=self._block.buf)
+        self._values = np.ndarray((columns,), dtype=np.float64, buffer=self._block.buf, offset=8)
+        if self._isOwner:
+            self._sequence[0] = 0
+            self._values[:] = 0.0
+
+# ------------------------------------------------------------------------------------------------------------
+# ModelChannel across processes: the model process writes (time, mood, treatment, eb) rows into a ring in shared
+# memory, the main process drains them for the theremin, plotter and OSC output. Same semantics as ModelChannel:
+# the producer never waits, and rows it overwrites before the consumer gets to them are counted as dropped.
+# ------------------------------------------------------------------------------------------------------------
+class SharedModelChannel:
+    # ------------------------------------------------------------------------------------------------------------
+    _block:shared_memory.SharedMemory
+    _isOwner:bool
+    _capacity:int
+    _writeCount:np.ndarray
+    _rows:np.ndarray
+    _readCount:int
+    _dropped:int
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Name(self):
+        return self._block.name
+
+    @property
+    def Capacity(self):
+        return self._capacity
+
+    # Samples written since creation
+    @property
+    def Written(self):
+        return int(self._writeCount[0])
+
+    # Samples overwritten before the consumer read them
+    @property
+    def Dropped(self):
+        return self._dropped
+
+    # Samples written but not read yet
+    @property
+    def Lag(self):
+        return int(self._writeCount[0]) - self._readCount
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Producer side: store one sample, then move the write counter
+    def Write(self, sample:tuple):
+        count = int(self._writeCount[0])
+        self._rows[count % self._capacity] = sample
+        self._writeCount[0] = count + 1
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Consumer side: copy all pending samples (every 'decimation'-th by sequence number) as a (samples x fields) array
+    def Drain(self, decimation:int=1) -> np.ndarray:
+        decimation = max(1, decimation)
+        start = self._readCount
+        end = int(self._writeCount[0])
+        if end - start > self._capacity:
+            self._dropped += end - start - self._capacity
+            start = end - self._capacity
+
+        start += (-start) % decimation
+        samples = self._rows[np.arange(start, end, decimation) % self._capacity]
+
+        # discard rows the producer overwrote while they were copied (see ModelChannel.Drain)
+        overwritten = min(int(self._writeCount[0]) - self._capacity + 1, end) - start
+        if overwritten > 0:
+            samples = samples[-(-overwritten // decimation):]
+            self._dropped += overwritten
+        self._readCount = end
+        return samples
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Close(self):
+        self._writeCount = None
+        self._rows = None
+        self._block.close()
+        if self._isOwner:
+            self._block.unlink()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # capacity must be the same in both processes
+    def __init__(self, name:str=None, capacity:int=8192):
+        self._capacity = capacity
+        self._block = _OpenBlock(name, 8 * (1 + capacity * len(SAMPLE_FIELDS)))
+        self._isOwner = name is None
+        self._writeCount = np.ndarray((1,), dtype=np.int64, buffer=self._block.buf)
+        self._rows = np.ndarray((capacity, len(SAMPLE_FIELDS)), dtype=np.float64, buffer=self._block.buf, offset=8)
+        if self._isOwner:
+            self._writeCount[0] = 0
+        self._readCount = 0
+        self._dropped = 0
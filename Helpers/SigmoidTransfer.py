@@ -0,0 +1,57 @@
+from math import erf
+
+import numpy as np
+
+# Vectorised error function: use scipy when it is available, otherwise map math.erf over the array
+try:
+    from scipy.special import erf as ErfArray
+except ImportError:
+    _erf_ufunc = np.frompyfunc(erf, 1, 1)
+
+    def ErfArray(x:np.ndarray) -> np.ndarray:
+        return _erf_ufunc(x).astype(np.float64)
+
+# f(0) of the S1/S2 sigmoids, f(x) = erf(x - 2)
+SIGMOID_F0:float = erf(0.0 - 2.0)
+
+# ------------------------------------------------------------------------------------------------------------
+# Normalizer f(G) - f(0) of the S1/S2 sigmoids; every model path divides by this value
+def SigmoidDenominator(g:float) -> float:
+    return erf(g - 2.0) - SIGMOID_F0
+
+# SigmoidDenominator of every entry of an array of G values
+def SigmoidDenominators(g:np.ndarray) -> np.ndarray:
+    return ErfArray(g - 2.0) - SIGMOID_F0
+
+# ------------------------------------------------------------------------------------------------------------
+# Normalized sigmoid S(x) = (f(G*x) - f(0)) / (f(G) - f(0)) with f(x) = erf(x - 2), as used for S1/S2 in BPDModel2.
+# The normalizer only depends on G and is computed once.
+# ------------------------------------------------------------------------------------------------------------
+class SigmoidTransfer:
+    # --------------------------
+    # State variables
+    # --------------------------
+    _g:float
+    _f0:float
+    _denom:float
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def G(self):
+        return self._g
+
+    # Normalizer f(G) - f(0)
+    @property
+    def Denominator(self):
+        return self._denom
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Evaluate(self, x:float) -> float:
+        return (erf(self._g * x - 2.0) - self._f0) / self._denom if self._denom != 0 else 0.0
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Constructor
+    def __init__(self, g:float):
+        self._g = g
+        self._f0 = SIGMOID_F0
+        self._denom = SigmoidDenominator(g)
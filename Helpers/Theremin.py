@@ -7,6 +7,28 @@ from Helpers import ModelOutputData
 from pyo import *
 from Helpers.ThereminOutputData import ThereminOutputData
 
+# Default rate (Hz) at which the frequency and volume targets are passed to pyo
+THEREMIN_CONTROL_RATE:float = 100.0
+
+# ------------------------------------------------------------------------------------------------------------
+# Volume and frequency the theremin plays for a model state
+def ThereminVolume(treatmentEffect:float, minVolume:float, maxVolume:float) -> float:
+    return minVolume + (maxVolume - minVolume) * (1 - abs(treatmentEffect / 2.70))
+
+def ThereminFrequency(mood:float, minFrequency:float, maxFrequency:float) -> float:
+    return minFrequency + (maxFrequency - minFrequency) * (mood + 1) / 2
+
+# ------------------------------------------------------------------------------------------------------------
+# The DSP chain of one theremin channel: Sine -> Harmonizer -> Chorus -> FreqShift. frequency is a number or a
+# pyo object (the SigTo ramp of the Theremin, or a table reader when rendering offline). Returns the objects of the
+# chain; the last one is the output
+def CreateVoice(frequency) -> tuple:
+    sine = Sine(freq=frequency)
+    harmonizer = Harmonizer(sine)
+    chorus = Chorus(harmonizer)
+    freqShift = FreqShift(chorus)
+    return sine, harmonizer, chorus, freqShift
+
 class Theremin :
 
     # ------------------------------------------------------------------------------------------------------------
@@ -27,6 +49,22 @@ class Theremin :
     _chorusL:Chorus
     _freqShiftL:FreqShift
 
+    # --------------------------
+    # Control rate: Update only stores the targets; _controlPattern passes them to the ramps (on the pyo server
+    # thread) every 1/_controlRate seconds, and the ramps interpolate to them over _rampTime seconds (the frequency
+    # ramp jumps in discrete mode, so notes do not glide). _targets is the (frequency, volume) of the latest Update,
+    # replaced as a whole so that the pyo thread never reads the frequency of one tick with the volume of another
+    # --------------------------
+    _controlRate:float
+    _rampTime:float
+    _targets:tuple
+    _frequencyRamp:SigTo
+    _volumeRamp:SigTo
+    _controlPattern:Pattern
+    _sentFrequency:float
+    _sentVolume:float
+    _controlUpdates:int
+
     # --------------------------
     # State variables
     # --------------------------
@@ -44,55 +82,90 @@ class Theremin :
     def IsPlaying(self):
         return self._isPlaying
 
+    @property
+    def ControlRate(self):
+        return self._controlRate
+
+    # Number of times new targets were passed to pyo
+    @property
+    def ControlUpdates(self):
+        return self._controlUpdates
+
     # ------------------------------------------------------------------------------------------------------------
     def Stop(self):
         self._dsp.stop(self._channelL)
         self._dsp.stop(self._channelR)
+        if self._controlPattern is not None:
+            self._controlPattern.stop()
         self._isPlaying=False
 
     # ------------------------------------------------------------------------------------------------------------
     def Start(self):
         self._dsp.play(self._channelL, 0)
         self._dsp.play(self._channelR, 1)
+        if self._controlPattern is not None:
+            self._controlPattern.play()
         self._isPlaying=True
 
     # ------------------------------------------------------------------------------------------------------------
+    # Called on every model tick: only computes the targets. Without a control rate they are passed to pyo here
     def Update(self, modelState:ModelOutputData):
-        # update volume
-        self.ThereminState.Volume = float(self._minVolume + (self._maxVolume-self._minVolume)*(1-abs(modelState.BpdTreatmentEffect/2.70)))
-        self._dsp.set_volume(self._channelL, self.ThereminState.Volume)
-        self._dsp.set_volume(self._channelR, self.ThereminState.Volume)
+        volume:float = float(ThereminVolume(modelState.BpdTreatmentEffect, self._minVolume, self._maxVolume))
+        frequency:float = float(ThereminFrequency(modelState.BpdMood, self._minFrequency, self._maxFrequency))
+        self.ThereminState.Volume = volume
+        self.ThereminState.Frequency = frequency
+        self._targets = (frequency, volume)
+        if self._controlPattern is None:
+            self.SendTargets()
 
-        self.ThereminState.Frequency = float(self._minFrequency + (self._maxFrequency-self._minFrequency) * (modelState.BpdMood+1)/2)
+    # ------------------------------------------------------------------------------------------------------------
+    # Pass the latest targets to the ramps, when they changed (called by the control pattern on the pyo thread)
+    def SendTargets(self):
+        frequency, volume = self._targets
+        if volume == self._sentVolume and frequency == self._sentFrequency:
+            return
+        self._sentVolume = volume
+        self._sentFrequency = frequency
         # use raw frequency or convert to midi note if needed
-        frequency:float = self.ThereminState.Frequency
         if self._dsp.discrete:
             frequency = midi_to_freq(freq_to_midi(frequency))
-        self._sineL.freq = frequency
-        self._sineR.freq = frequency
+        self._volumeRamp.value = volume
+        self._frequencyRamp.value = frequency
+        self._controlUpdates += 1
 
     # ------------------------------------------------------------------------------------------------------------
-    def __init__(self, wave='SineLoop', audio_output=None, audio_backend='portaudio', channels=2, min_frequency=55, max_frequency=10000, sampling_rate=44100, discrete=False, min_Volume=0.5, max_Volume=1):
+    # control_rate: Hz at which frequency and volume are passed to pyo, independent of the model rate (0 passes them
+    # on every Update). ramp_time: seconds the DSP takes to glide to new targets (default: one control period; the
+    # frequency does not glide in discrete mode)
+    def __init__(self, wave='SineLoop', audio_output=None, audio_backend='portaudio', channels=2, min_frequency=55, max_frequency=10000, sampling_rate=44100, discrete=False, min_Volume=0.5, max_Volume=1,
+                 control_rate=THEREMIN_CONTROL_RATE, ramp_time=None):
         self._minFrequency = min_frequency
         self._maxFrequency = max_frequency
         self._minVolume = min_Volume
         self._maxVolume = max_Volume
         self._isPlaying = False
-        self._thereminState = ThereminOutputData()
-        
+        self._thereminState = ThereminOutputData(frequency=min_frequency, volume=max_Volume)
+        self._targets = (min_frequency, max_Volume)
+        self._controlRate = control_rate
+        self._rampTime = ramp_time if ramp_time is not None else (1.0 / control_rate if control_rate > 0 else 0.005)
+        self._sentFrequency = None
+        self._sentVolume = None
+        self._controlUpdates = 0
+
         self._dsp = SoundProcessor(output=audio_output, backend=audio_backend, channels=channels, sampling_rate=sampling_rate, discrete=discrete)
 
-        self._sineL = Sine()
-        self._harmonizerL = Harmonizer(self._sineL)
-        self._chorusL = Chorus(self._harmonizerL)
-        self._freqShiftL = FreqShift(self._chorusL)
-        self._sineR = Sine()
-        self._harmonizerR = Harmonizer(self._sineR)
-        self._chorusR = Chorus(self._harmonizerR)
-        self._freqShiftR = FreqShift(self._chorusR)
+        # both channels play the same ramps
+        self._frequencyRamp = SigTo(value=min_frequency, time=0.0 if discrete else self._rampTime, init=min_frequency)
+        self._volumeRamp = SigTo(value=max_Volume, time=self._rampTime, init=max_Volume)
+
+        self._sineL, self._harmonizerL, self._chorusL, self._freqShiftL = CreateVoice(self._frequencyRamp)
+        self._sineR, self._harmonizerR, self._chorusR, self._freqShiftR = CreateVoice(self._frequencyRamp)
 
         self._channelL = self._dsp.add_track(self._freqShiftL)
         self._channelR = self._dsp.add_track(self._freqShiftR)
+        self._dsp.set_volume(self._channelL, self._volumeRamp)
+        self._dsp.set_volume(self._channelR, self._volumeRamp)
+        self._controlPattern = Pattern(self.SendTargets, time=1.0 / control_rate) if control_rate > 0 else None
         self._dsp.start()
         self.Start()
 
@@ -100,6 +173,8 @@ class Theremin :
 
     # ------------------------------------------------------------------------------------------------------------
     def __del__(self):
+        if self._controlPattern is not None:
+            self._controlPattern.stop()
         self._dsp.stop(self._channelL)
         self._dsp.stop(self._channelR)
         self._dsp.shutdown()
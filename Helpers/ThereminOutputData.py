@@ -1,33 +1,15 @@
-
-
-import numpy as np
-
+# ------------------------------------------------------------------------------------------------------------
+# Frequency and volume the theremin is playing. A slotted record with plain attributes, updated on every model tick
 # ------------------------------------------------------------------------------------------------------------
 class ThereminOutputData:
     # ------------------------------------------------------------------------------------------------------------
-    _frequency:float
-    _volume:float
-
-    # ------------------------------------------------------------------------------------------------------------
-    @property
-    def Frequency(self):
-        return self._frequency
-    
-    @Frequency.setter
-    def Frequency(self, val):
-        self._frequency = val
+    __slots__ = ('Frequency', 'Volume')
 
     # ------------------------------------------------------------------------------------------------------------
-    @property
-    def Volume(self):
-        return self._volume
-    
-    @Volume.setter
-    def Volume(self, val):
-        self._volume = val
+    Frequency:float
+    Volume:float
 
     # ------------------------------------------------------------------------------------------------------------
     def __init__(self, frequency:float=0, volume:float=0):
-        self._frequency = frequency
-        self._volume = volume
-        
\ No newline at end of file
+        self.Frequency = frequency
+        self.Volume = volume
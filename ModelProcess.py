@@ -0,0 +1,172 @@
+import multiprocessing
+
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from Helpers.ImuHistory import ImuHistory
+from Helpers.ModelScheduler import ModelScheduler
+from Helpers.SessionRecorder import SessionRecorder
+from Helpers.SharedModelState import SharedImuInput, SharedModelChannel
+from ModelSetup import MODEL_UPDATE_INTERVAL, CreateModel, CreateTreatment, AddModelConfigurations, ScheduleDefaults
+
+# ------------------------------------------------------------------------------------------------------------
+# Key press forwarded to the model process (matplotlib key events hold the figure, so they are not sent as is).
+# Has the 'key' attribute that the on_key methods of models and treatments read.
+# ------------------------------------------------------------------------------------------------------------
+class KeyPress:
+    key:str
+
+    def __init__(self, key:str):
+        self.key = key
+
+# ------------------------------------------------------------------------------------------------------------
+# The model tick of main.py, as run inside the model process: takes the latest IMU sample from shared memory,
+# steps the model with the treatment effect and writes the model sample to the shared output channel.
+# ------------------------------------------------------------------------------------------------------------
+class ModelProcessLoop:
+    # ------------------------------------------------------------------------------------------------------------
+    _interval:float
+    _input:SharedImuInput
+    _output:SharedModelChannel
+    _inputSequence:int
+    _imuData:ImuHistory
+    _model:object
+    _treatment:object
+    _tracker:BPDModel2ConfigurationTracker
+    _scheduler:ModelScheduler
+    _recorder:SessionRecorder
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Tick(self, simTimeSeconds:float):
+        sequence, values = self._input.Read(self._inputSequence)
+        if values is not None:
+            self._inputSequence = sequence
+            self._imuData.AppendRow(values)
+
+        self._model.CurrentConfiguration = self._tracker.GetActiveConfiguration(simTimeSeconds)
+        treatmentEffect:float = self._treatment.CalculateTreatmentEffect(self._imuData)
+        EB, P, N = self._model.step(treatmentEffect, DT=self._interval)
+        state = self._model.ModelState
+        self._output.Write((simTimeSeconds, state.BpdMood, state.BpdTreatmentEffect, EB))
+        if self._recorder is not None:
+            self._recorder.RecordTick(simTimeSeconds, treatmentEffect, EB, P, N, state.BpdMood, self._model.CurrentConfiguration)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Runs the model scheduler until a None command arrives; other commands are keys for on_key
+    def Run(self, commands):
+        self._scheduler.Start()
+        while True:
+            key = commands.get()
+            if key is None:
+                break
+            event = KeyPress(key)
+            self._model.on_key(event)
+            self._treatment.on_key(event)
+            if key == 'i':
+                self._scheduler.PrintStatistics()
+        self._scheduler.Stop()
+        self._scheduler.PrintStatistics()
+        if self._recorder is not None:
+            self._recorder.Close()
+        self._input.Close()
+        self._output.Close()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # recordDirectory: record the model ticks and parameter changes there (the main process records the IMU input)
+    def __init__(self, inputName:str, outputName:str, capacity:int, interval:float, scheduleFile:str=None,
+                 recordDirectory:str=None, integrator:str='euler'):
+        self._interval = interval
+        self._input = SharedImuInput(inputName)
+        self._output = SharedModelChannel(outputName, capacity)
+        self._inputSequence = 0
+        self._imuData = ImuHistory()
+        self._model = CreateModel(interval, integrator)
+        self._treatment = CreateTreatment()
+        self._tracker = BPDModel2ConfigurationTracker()
+        if scheduleFile:
+            self._tracker.LoadConfigurations(scheduleFile, ScheduleDefaults(interval))
+        else:
+            AddModelConfigurations(self._tracker, interval)
+        self._scheduler = ModelScheduler(self.Tick, interval=interval)
+        self._recorder = SessionRecorder(recordDirectory, streams=['model', 'parameters']) if recordDirectory else None
+
+# ------------------------------------------------------------------------------------------------------------
+# Entry point of the model process
+def RunModelProcess(inputName:str, outputName:str, capacity:int, interval:float, scheduleFile:str, recordDirectory:str,
+                    integrator:str, commands):
+    ModelProcessLoop(inputName, outputName, capacity, interval, scheduleFile, recordDirectory, integrator).Run(commands)
+
+# ------------------------------------------------------------------------------------------------------------
+# Runs the model and treatment (see ModelSetup.py) in a separate process, so that the model tick does not share the
+# GIL with the OSC server, the theremin and the plotter. IMU samples go in through a SharedImuInput, model samples
+# come out through a SharedModelChannel; only key presses (SendKey) and start/stop go through a queue.
+# The process is started with 'spawn' on every platform (forking a process that runs audio and OSC threads is not
+# safe), and is a daemon, so it does not outlive main.py.
+# ------------------------------------------------------------------------------------------------------------
+class ModelProcess:
+    # ------------------------------------------------------------------------------------------------------------
+    _interval:float
+    _scheduleFile:str
+    _recordDirectory:str
+    _integrator:str
+    _input:SharedImuInput
+    _output:SharedModelChannel
+    _commands:object
+    _process:multiprocessing.Process
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Output(self):
+        return self._output
+
+    @property
+    def IsRunning(self):
+        return self._process is not None and self._process.is_alive()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC handlers: publish the latest values of 'source' (what the treatment reads, see main.py _treatmentInput)
+    def PublishImu(self, source):
+        self._input.Publish(source)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def SendKey(self, key:str):
+        if self._process is not None:
+            self._commands.put(key)
+
+    # ------------------------------------------------------------------------------------------------------------
+    def Start(self):
+        if self._process is not None:
+            return
+        context = multiprocessing.get_context('spawn')
+        self._commands = context.Queue()
+        self._process = context.Process(target=RunModelProcess, name='ModelProcess', daemon=True,
+                                        args=(self._input.Name, self._output.Name, self._output.Capacity,
+                                              self._interval, self._scheduleFile, self._recordDirectory, self._integrator,
+                                              self._commands))
+        self._process.start()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Stop the model process and release the shared memory
+    def Stop(self, timeout:float=5.0):
+        if self._process is not None:
+            self._commands.put(None)
+            self._process.join(timeout)
+            if self._process.is_alive():
+                print('Model process did not stop, terminating it')
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        self._input.Close()
+        self._output.Close()
+
+    # ------------------------------------------------------------------------------------------------------------
+    # capacity is the number of model samples buffered between the processes. With recordDirectory, the model
+    # process records its ticks and parameter changes there (see SessionRecorder). integrator: see CreateModel
+    def __init__(self, interval:float=MODEL_UPDATE_INTERVAL, scheduleFile:str=None, capacity:int=8192,
+                 recordDirectory:str=None, integrator:str='euler'):
+        self._interval = interval
+        self._integrator = integrator
+        self._scheduleFile = scheduleFile
+        self._recordDirectory = recordDirectory
+        self._input = SharedImuInput()
+        self._output = SharedModelChannel(capacity=capacity)
+        self._commands = None
+        self._process = None
@@ -0,0 +1,93 @@
+from BPDModel2 import BPDModel2
+from BPDModel2Configuration import BPDModel2Configuration
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from BPDTreatment1 import BPDTreatment1
+
+# ------------------------------------------------------------------------------------------------------------
+# Model, treatment and configuration schedule shared by main.py and the offline tools
+# ------------------------------------------------------------------------------------------------------------
+# Default model update interval. Gain and the treatment injection amounts of the configurations below are specified
+# per tick of this interval (their ReferenceDt), so a model running at another interval with the 'rk4' integrator
+# follows the same dynamics
+MODEL_UPDATE_INTERVAL:float = 0.0015
+
+# ------------------------------------------------------------------------------------------------------------
+# integrator: 'euler' or 'rk4' (see MODEL_INTEGRATORS); 'euler' changes the dynamics when the interval is not
+# MODEL_UPDATE_INTERVAL
+def CreateModel(modelUpdateInterval:float=MODEL_UPDATE_INTERVAL, integrator:str='euler') -> BPDModel2:
+    return BPDModel2(dt=modelUpdateInterval, delay_seconds=0.02, g_gain=0.07, lamb=0.5, integrator=integrator,
+                     reference_dt=MODEL_UPDATE_INTERVAL)
+
+# ------------------------------------------------------------------------------------------------------------
+# BPDModel2Configuration arguments that follow the model update interval, for schedules that do not set them
+def ScheduleDefaults(modelUpdateInterval:float=MODEL_UPDATE_INTERVAL) -> dict:
+    return {'dt': modelUpdateInterval, 'reference_dt': MODEL_UPDATE_INTERVAL}
+
+# ------------------------------------------------------------------------------------------------------------
+def CreateTreatment() -> BPDTreatment1:
+    return BPDTreatment1(XAngleRatio=1, XAngleVelocityRatio=0.0, TreatmentScale=0.015)
+
+# ------------------------------------------------------------------------------------------------------------
+# The example schedule, stepped every modelUpdateInterval seconds (the model's interval)
+def AddModelConfigurations(tracker:BPDModel2ConfigurationTracker, modelUpdateInterval:float=MODEL_UPDATE_INTERVAL):
+    # add an example configuration, active from t=0 seconds to t=10 seconds
+    tracker.AddConfiguration(
+                            startTimeSeconds=0,
+                            endTimeSeconds=10,
+                            configuration = BPDModel2Configuration(
+                                g1=3.0,
+                                g2=3.0,
+                                qPmin=10.0,
+                                qPmax=10.0,
+                                qNmin=2.5,
+                                qNmax=7.0,
+                                lamb=0.5,
+                                dt=modelUpdateInterval,
+                                tmin=1.0,
+                                tmax=5.0,
+                                injectMode='tilt_to_PN',
+                                delay_seconds=0.02,
+                                g_gain=0.07,
+                                reference_dt=MODEL_UPDATE_INTERVAL
+                            )
+                            )
+
+    # add an example configuration, active from t=10 seconds to t=20 seconds
+    tracker.AddConfiguration(
+                            startTimeSeconds=10,
+                            endTimeSeconds=20,
+                            configuration = BPDModel2Configuration(
+                                g1=3.0,
+                                g2=3.0,
+                                qPmin=10.0,
+                                qPmax=10.0,
+                                qNmin=2.5,
+                                qNmax=7.0,
+                                lamb=0.5,
+                                dt=modelUpdateInterval,
+                                tmin=1.0,
+                                tmax=5.0,
+                                injectMode='tilt_to_PN',
+                                delay_seconds=0.02,
+                                g_gain=0.07,
+                                reference_dt=MODEL_UPDATE_INTERVAL
+                            )
+                            )
+
+    # beyond t=20 seconds, or in general, if no 'active' model configuration has been found, a default BPModel2Configuration will be used
+    tracker.DefaultConfiguration = BPDModel2Configuration(
+                                g1=3.0,
+                                g2=3.0,
+                                qPmin=10.0,
+                                qPmax=10.0,
+                                qNmin=2.5,
+                                qNmax=7.0,
+                                lamb=0.5,
+                                dt=modelUpdateInterval,
+                                tmin=1.0,
+                                tmax=5.0,
+                                injectMode='tilt_to_PN',
+                                delay_seconds=0.02,
+                                g_gain=0.07,
+                                reference_dt=MODEL_UPDATE_INTERVAL
+                            )
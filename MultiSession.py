@@ -0,0 +1,86 @@
+# ------------------------------------------------------------------------------------------------------------
+# Runs a BPD model and treatment per IMU device in one process (see SessionManager.py), without sound or
+# plotting. Every device gets a session on its first OSC message; all sessions are stepped together on one
+# model scheduler tick, and each session's mood and treatment effect are sent to its own OSC address.
+# Press CTRL+C to stop.
+# ------------------------------------------------------------------------------------------------------------
+from pythonosc.osc_server import AsyncIOOSCUDPServer
+from pythonosc.dispatcher import Dispatcher
+from pythonosc.udp_client import SimpleUDPClient
+
+import argparse
+import asyncio
+import sys
+
+from Helpers.ModelScheduler import ModelScheduler
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from ModelSetup import MODEL_UPDATE_INTERVAL, AddModelConfigurations, ScheduleDefaults
+from SessionManager import SessionManager, SESSION_KEYS
+
+# ------------------------------------------------------------------------------------------------------------
+async def RunSessions(manager:SessionManager, scheduler:ModelScheduler, client:SimpleUDPClient, listenIP:str, listenPort:int, sendInterval:float):
+    dispatcher = Dispatcher()
+    dispatcher.set_default_handler(manager.HandleImuMessage, needs_reply_address=True)
+    server = AsyncIOOSCUDPServer((listenIP, listenPort), dispatcher, asyncio.get_event_loop())
+    transport, protocol = await server.create_serve_endpoint()
+    print(f'OSC server is running on {listenIP}:{listenPort}')
+
+    scheduler.Start()
+    try:
+        while True:
+            await asyncio.sleep(sendInterval)
+            for address, values in manager.Outputs():
+                client.send_message(address, values)
+    finally:
+        scheduler.Stop()
+        transport.close()
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='MultiSession.py',
+            description='Runs one BPD model and treatment per IMU device in a single process, without sound or plotting.\n' +
+            'Devices are told apart by an OSC address prefix (e.g. /imu3/Brandeis/BPD/SendAngle) or by sender address,\n' +
+            'and each session\'s output is sent to <prefix>/Brandeis/BPD/Model (or /Session<n>/Brandeis/BPD/Model).\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--listen-ip', dest='listen_ip', required=False, default='0.0.0.0',
+            help='Address to receive IMU OSC messages on (default: 0.0.0.0)')
+    parser.add_argument('--listen-port', dest='listen_port', required=False, type=int, default=2323,
+            help='Port to receive IMU OSC messages on (default: 2323)')
+    parser.add_argument('--destination-ip', dest='destination_ip', required=False, default='255.255.255.255',
+            help='Address to send the model output to (default: 255.255.255.255)')
+    parser.add_argument('--destination-port', dest='destination_port', required=False, type=int, default=2324,
+            help='Port to send the model output to (default: 2324)')
+    parser.add_argument('--key', dest='key', required=False, default='prefix', choices=SESSION_KEYS,
+            help='Tell devices apart by OSC address prefix or by sender address (default: prefix)')
+    parser.add_argument('--max-sessions', dest='max_sessions', required=False, type=int, default=16,
+            help='Maximum number of sessions (default: 16)')
+    parser.add_argument('--send-interval', dest='send_interval', required=False, type=float, default=0.1,
+            help='Seconds between model output messages (default: 0.1)')
+    parser.add_argument('--schedule', '-s', dest='schedule', required=False, type=str, default=None,
+            help='JSON or YAML file with the model configuration schedule (default: the schedule in ModelSetup.py)')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+
+    tracker:BPDModel2ConfigurationTracker = BPDModel2ConfigurationTracker()
+    if opts.schedule:
+        tracker.LoadConfigurations(opts.schedule, ScheduleDefaults(MODEL_UPDATE_INTERVAL))
+    else:
+        AddModelConfigurations(tracker, MODEL_UPDATE_INTERVAL)
+
+    manager:SessionManager = SessionManager(tracker, keyBy=opts.key, maxSessions=opts.max_sessions)
+    scheduler:ModelScheduler = ModelScheduler(manager.Tick, interval=MODEL_UPDATE_INTERVAL)
+    client:SimpleUDPClient = SimpleUDPClient(address=opts.destination_ip, port=opts.destination_port, allow_broadcast=True)
+
+    try:
+        asyncio.run(RunSessions(manager, scheduler, client, opts.listen_ip, opts.listen_port, opts.send_interval))
+    except KeyboardInterrupt:
+        pass
+    scheduler.PrintStatistics()
+    print(f'{len(manager.Sessions)} session(s)')
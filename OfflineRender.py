@@ -0,0 +1,201 @@
+# ------------------------------------------------------------------------------------------------------------
+# Offline rendering of sessions to WAV files, as fast as the CPU allows. The mood and treatment effect of every model
+# tick (a SessionRecorder directory, or the output of Replay.py) are turned into the frequency and volume the
+# Theremin would pass to pyo at its control rate. These curves are played from tables through the Theremin DSP chain
+# (see CreateVoice) on a pyo offline server, which computes the audio without a sound card or a real time clock.
+# Sessions are rendered in parallel, one per worker process; each worker reuses a single offline server.
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Helpers.SessionRecorder import ReadRecording
+from Helpers.Theremin import CreateVoice, ThereminFrequency, ThereminVolume, THEREMIN_CONTROL_RATE
+from Sound.utils import freq_to_midi, midi_to_freq, midi_str_to_midi
+
+# pyo record options: WAV file, 16 bit int / 24 bit int / 32 bit float samples
+_FILE_FORMAT_WAV:int = 0
+SAMPLE_TYPES:dict = {'16': 0, '24': 1, '32f': 3}
+
+# Offline server of this worker process, booted again for every session (pyo allows one server per process)
+_server = None
+
+# ------------------------------------------------------------------------------------------------------------
+# (time, mood, treatment effect) arrays of a session: a SessionRecorder directory (its 'model' stream) or a
+# Replay.py output file (.npz or .csv)
+def LoadSession(path:str) -> tuple:
+    if os.path.isdir(path):
+        recording = ReadRecording(path)
+        if 'model' not in recording:
+            raise ValueError(f'{path} has no model.bin record file')
+        records = recording['model']
+        return np.array(records['time']), np.array(records['mood']), np.array(records['treatment'])
+    if os.path.splitext(path)[1].lower() == '.csv':
+        records = np.genfromtxt(path, delimiter=',', names=True)
+    else:
+        records = np.load(path)
+    return np.asarray(records['time'], dtype=np.float64), np.asarray(records['mood'], dtype=np.float64), np.asarray(records['treatment'], dtype=np.float64)
+
+# ------------------------------------------------------------------------------------------------------------
+# Frequency and volume curves at controlRate: like the Theremin control pattern, every control period takes the
+# latest model tick at or before it, so the rendered audio follows the session the way the live theremin does
+def ControlCurves(times:np.ndarray, mood:np.ndarray, treatment:np.ndarray, controlRate:float=THEREMIN_CONTROL_RATE,
+                  minFrequency:float=55, maxFrequency:float=5000, minVolume:float=0.5, maxVolume:float=1,
+                  discrete:bool=False) -> tuple:
+    if len(times) == 0:
+        raise ValueError('The session has no model ticks')
+    controlTimes = times[0] + np.arange(max(1, int(np.ceil((times[-1] - times[0]) * controlRate)))) / controlRate
+    ticks = np.maximum(np.searchsorted(times, controlTimes, side='right') - 1, 0)
+
+    frequency = ThereminFrequency(mood[ticks], minFrequency, maxFrequency)
+    volume = ThereminVolume(treatment[ticks], minVolume, maxVolume)
+    if discrete:
+        frequency = np.array([midi_to_freq(freq_to_midi(f)) for f in frequency])
+    return frequency, volume
+
+# ------------------------------------------------------------------------------------------------------------
+def _BootOfflineServer(samplingRate:int, channels:int):
+    from pyo import Server
+
+    global _server
+    if _server is None:
+        _server = Server(audio='offline', sr=samplingRate, nchnls=channels, duplex=0)
+    else:
+        _server.setSamplingRate(samplingRate)
+        _server.setNchnls(channels)
+    _server.boot()
+    return _server
+
+# ------------------------------------------------------------------------------------------------------------
+# Worker: render one session to a WAV file. Returns (output path, rendered seconds, wall clock seconds)
+def RenderSession(task:dict) -> tuple:
+    from pyo import DataTable, TableRead
+
+    startTime = time.perf_counter()
+    times, mood, treatment = LoadSession(task['input'])
+    frequency, volume = ControlCurves(times, mood, treatment, task['controlRate'], task['minFrequency'],
+                                      task['maxFrequency'], task['minVolume'], task['maxVolume'], task['discrete'])
+    duration = len(frequency) / task['controlRate']
+
+    server = _BootOfflineServer(task['samplingRate'], task['channels'])
+    server.recordOptions(dur=duration, filename=task['output'], fileformat=_FILE_FORMAT_WAV,
+                         sampletype=SAMPLE_TYPES[task['sampleType']])
+
+    # the tables are read once over the session with linear interpolation, which glides between the control
+    # values like the SigTo ramps of the live theremin (discrete notes are held without interpolation, as the
+    # live theremin does not glide between them either)
+    frequencyTable = DataTable(size=len(frequency), init=frequency.tolist())
+    volumeTable = DataTable(size=len(volume), init=volume.tolist())
+    frequencyReader = TableRead(frequencyTable, freq=1.0 / duration, loop=0, interp=1 if task['discrete'] else 2).play()
+    volumeReader = TableRead(volumeTable, freq=1.0 / duration, loop=0, interp=2).play()
+
+    voices = []
+    for channel in range(task['channels']):
+        voice = CreateVoice(frequencyReader)
+        voice[-1].setMul(volumeReader)
+        voice[-1].out(channel)
+        voices.append(voice)
+
+    # renders the whole duration before returning
+    server.start()
+    server.shutdown()
+    return task['output'], duration, time.perf_counter() - startTime
+
+# ------------------------------------------------------------------------------------------------------------
+# Render every input to a WAV file of the same name in outputDirectory, over a process pool. options are the
+# RenderSession task fields other than 'input' and 'output'
+def RenderSessions(inputs:list, outputDirectory:str, options:dict, workers:int=None) -> list:
+    os.makedirs(outputDirectory, exist_ok=True)
+    tasks = []
+    for path in inputs:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        output = os.path.join(outputDirectory, name + '.wav')
+        if any(task['output'] == output for task in tasks):
+            raise ValueError(f'{path} would overwrite {output}, rename one of the inputs')
+        tasks.append(dict(options, input=path, output=output))
+
+    # spawned workers: each one boots its own pyo server
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks)), mp_context=context) as pool:
+        return list(pool.map(RenderSession, tasks))
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='OfflineRender.py',
+            description='Renders the theremin sound of recorded or replayed sessions to WAV files, faster than real time\n' +
+            'and without a sound card. Sessions are rendered in parallel, one per worker process.\n',
+            epilog='Examples:\n' +
+            '  python OfflineRender.py session1 session2 --output-dir audio\n' +
+            '  python OfflineRender.py replay_output.npz --discrete --min-note A2 --max-note A6\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('inputs', nargs='+',
+            help='Sessions to render: SessionRecorder directories (main.py --record) or Replay.py output files (.npz or .csv)')
+    parser.add_argument('--output-dir', '-o', dest='output_dir', required=False, default='.',
+            help='Directory the WAV files are written to, named after the inputs (default: current directory)')
+    parser.add_argument('--workers', '-w', dest='workers', required=False, type=int, default=None,
+            help='Worker processes (default: all cores)')
+    parser.add_argument('--channels', '-c', dest='channels', required=False, type=int, default=2,
+            help='Number of audio channels (default: 2)')
+    parser.add_argument('--rate', '-r', dest='sampling_rate', required=False, type=int, default=44100,
+            help='Sampling rate (default: 44100 Hz)')
+    parser.add_argument('--sample-type', dest='sample_type', required=False, default='16', choices=list(SAMPLE_TYPES),
+            help='WAV sample type: 16 or 24 bit int, or 32 bit float (default: 16)')
+    parser.add_argument('--discrete', '-d', dest='discrete', required=False, action='store_true',
+            help='If set then discrete notes will be generated instead of samples over a continuous ' +
+            'frequency space (default: false)')
+    parser.add_argument('--min-frequency', dest='min_frequency', required=False, type=int, default=55,
+            help='Minimum audio frequency (default: 55 Hz)')
+    parser.add_argument('--max-frequency', dest='max_frequency', required=False, type=int, default=5000,
+            help='Maximum audio frequency (default: 5 kHz)')
+    parser.add_argument('--min-note', dest='min_note', required=False, type=str, default=None,
+            help='Minimum MIDI note, as a string (e.g. A4)')
+    parser.add_argument('--max-note', dest='max_note', required=False, type=str, default=None,
+            help='Maximum MIDI note, as a string (e.g. A4)')
+    parser.add_argument('--min-volume', dest='min_volume', required=False, type=float, default=0.5,
+            help='Volume at the largest treatment effect (default: 0.5)')
+    parser.add_argument('--max-volume', dest='max_volume', required=False, type=float, default=1.0,
+            help='Volume without treatment effect (default: 1)')
+    parser.add_argument('--control-rate', dest='control_rate', required=False, type=float, default=THEREMIN_CONTROL_RATE,
+            help=f'Rate of the frequency and volume curves, as passed to the audio engine by the live theremin\n' +
+            f'(default: {THEREMIN_CONTROL_RATE:g} Hz)')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+
+    if opts.min_note:
+        opts.min_frequency = midi_to_freq(midi_str_to_midi(opts.min_note))
+    if opts.max_note:
+        opts.max_frequency = midi_to_freq(midi_str_to_midi(opts.max_note))
+    if opts.control_rate <= 0:
+        sys.exit('--control-rate must be positive')
+
+    options:dict = {'controlRate': opts.control_rate,
+                    'minFrequency': opts.min_frequency,
+                    'maxFrequency': opts.max_frequency,
+                    'minVolume': opts.min_volume,
+                    'maxVolume': opts.max_volume,
+                    'discrete': opts.discrete,
+                    'samplingRate': opts.sampling_rate,
+                    'channels': opts.channels,
+                    'sampleType': opts.sample_type}
+
+    print(f'Rendering {len(opts.inputs)} sessions to {opts.output_dir}')
+    startTime:float = time.perf_counter()
+    results:list = RenderSessions(opts.inputs, opts.output_dir, options, opts.workers)
+    elapsed:float = time.perf_counter() - startTime
+
+    for output, duration, seconds in results:
+        print(f'{output}: {duration:.1f} s of audio in {seconds:.2f} s')
+    rendered:float = sum(duration for _, duration, _ in results)
+    print(f'Rendered {rendered:.1f} s of audio in {elapsed:.2f} s ({rendered / max(elapsed, 1e-9):.0f}x real time)')
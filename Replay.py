@@ -0,0 +1,125 @@
+# ------------------------------------------------------------------------------------------------------------
+# Headless replay of a recorded IMU trace through the treatment and model, as fast as the CPU allows.
+# Simulated time advances by the model update interval per tick; the configuration schedule is looked up in
+# simulated time, and the IMU data seen by the treatment is the latest trace sample at or before each tick.
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from Helpers.ImuData import ImuData
+from Helpers.ImuTrace import ImuTrace, IMU_TRACE_COLUMNS
+from BPDModel2 import BPDModel2
+from BPDTreatment1 import BPDTreatment1
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from Helpers.AbstractModel import MODEL_INTEGRATORS
+from ModelSetup import MODEL_UPDATE_INTERVAL, CreateModel, CreateTreatment, AddModelConfigurations, ScheduleDefaults
+
+# Output arrays written by the replay, one entry per model tick
+REPLAY_OUTPUTS:list = ['time', 'mood', 'treatment', 'eb', 'p', 'n']
+
+# ------------------------------------------------------------------------------------------------------------
+def _StepRun(model:BPDModel2, configuration, out:dict, start:int, end:int, dt:float):
+    if end <= start:
+        return
+    model.CurrentConfiguration = configuration
+    result = model.step_many(out['treatment'][start:end], DT=dt)
+    out['mood'][start:end] = result.BpdMood
+    out['eb'][start:end] = result.EB
+    out['p'][start:end] = result.P
+    out['n'][start:end] = result.N
+
+# ------------------------------------------------------------------------------------------------------------
+def RunReplay(trace:ImuTrace,
+              model:BPDModel2,
+              treatment:BPDTreatment1,
+              tracker:BPDModel2ConfigurationTracker,
+              dt:float=MODEL_UPDATE_INTERVAL,
+              duration:float=None) -> dict:
+    if duration is None:
+        duration = trace.Duration
+    nSteps = int(round(duration / dt))
+
+    out = {name: np.zeros(nSteps) for name in REPLAY_OUTPUTS}
+    out['time'][:] = np.arange(nSteps) * dt
+    times = trace.Times
+    imuData = ImuData()
+    sample = -1
+    runStart = 0
+    runConfiguration = None
+
+    # The treatment only depends on the IMU data, so the treatment effects are calculated first, and the model is
+    # then advanced with step_many() over each run of ticks that share the same active configuration
+    for k in range(nSteps):
+        t = k * dt
+
+        # sample-and-hold the IMU trace at the current simulated time
+        while sample + 1 < len(times) and times[sample + 1] <= t:
+            sample += 1
+            trace.Apply(sample, imuData)
+
+        configuration = tracker.GetActiveConfiguration(t)
+        if configuration is not runConfiguration:
+            _StepRun(model, runConfiguration, out, runStart, k, dt)
+            runStart, runConfiguration = k, configuration
+
+        out['treatment'][k] = treatment.CalculateTreatmentEffect(imuData)
+
+    _StepRun(model, runConfiguration, out, runStart, nSteps, dt)
+    return out
+
+# ------------------------------------------------------------------------------------------------------------
+# Write replay output as .npz (one array per output) or .csv (one column per output)
+def WriteReplayOutput(path:str, out:dict):
+    if os.path.splitext(path)[1].lower() == '.csv':
+        np.savetxt(path, np.column_stack([out[name] for name in REPLAY_OUTPUTS]), delimiter=',', header=','.join(REPLAY_OUTPUTS), comments='')
+    else:
+        np.savez(path, **out)
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='Replay.py',
+            description='Replays a recorded IMU trace through the BPD treatment and model, without OSC, sound or plotting,\n' +
+            'and writes the mood/treatment/EB/P/N output arrays.\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('trace',
+            help='IMU trace file (.csv, .npy or .npz). Header-less CSV and .npy columns are, in order:\n' + ', '.join(IMU_TRACE_COLUMNS))
+    parser.add_argument('--output', '-o', dest='output', required=False, default='replay_output.npz',
+            help='Output file, .npz or .csv (default: replay_output.npz)')
+    parser.add_argument('--dt', dest='dt', required=False, type=float, default=MODEL_UPDATE_INTERVAL,
+            help=f'Model update interval in simulated seconds (default: {MODEL_UPDATE_INTERVAL}). Other intervals keep\n' +
+            'the dynamics of the default interval with --integrator rk4')
+    parser.add_argument('--integrator', dest='integrator', required=False, type=str, default='euler', choices=MODEL_INTEGRATORS,
+            help='Model integrator (default: euler)')
+    parser.add_argument('--schedule', '-s', dest='schedule', required=False, type=str, default=None,
+            help='JSON or YAML file with the model configuration schedule (default: the schedule in ModelSetup.py)')
+    parser.add_argument('--duration', dest='duration', required=False, type=float, default=None,
+            help='Simulated seconds to replay (default: length of the trace)')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+
+    trace:ImuTrace = ImuTrace.Load(opts.trace)
+    tracker:BPDModel2ConfigurationTracker = BPDModel2ConfigurationTracker()
+    if opts.schedule:
+        tracker.LoadConfigurations(opts.schedule, ScheduleDefaults(opts.dt))
+    else:
+        AddModelConfigurations(tracker, opts.dt)
+
+    print(f'Replaying {len(trace)} IMU samples ({trace.Duration:.1f} s) from {opts.trace}')
+    startTime:float = time.perf_counter()
+    out:dict = RunReplay(trace, CreateModel(opts.dt, opts.integrator), CreateTreatment(), tracker, dt=opts.dt, duration=opts.duration)
+    elapsed:float = time.perf_counter() - startTime
+
+    WriteReplayOutput(opts.output, out)
+    simulated:float = len(out['time']) * opts.dt
+    print(f'Simulated {simulated:.1f} s in {elapsed:.2f} s ({simulated / max(elapsed, 1e-9):.0f}x real time), output written to {opts.output}')
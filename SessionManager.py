@@ -0,0 +1,195 @@
+from collections import deque
+
+import numpy as np
+
+from BPDModel2Ensemble import BPDModel2Ensemble
+from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from Helpers.AbstractTreatment import AbstractTreatment
+from Helpers.ImuHistory import ImuHistory
+from ModelSetup import CreateTreatment
+
+# IMU messages a session handles, as the last part of the incoming OSC address (see main.py)
+SESSION_IMU_MESSAGES:list = ['/Brandeis/BPD/SendAngle', '/Brandeis/BPD/SendGyro', '/Brandeis/BPD/SendAccel',
+                             '/Brandeis/BPD/SendAccelAngle', '/Brandeis/BPD/SendTemp']
+
+# How incoming OSC messages are assigned to sessions
+SESSION_KEYS:list = ['prefix', 'sender']
+
+# ------------------------------------------------------------------------------------------------------------
+# One participant: the IMU data and treatment of one device, and its member index in the shared model ensemble.
+# Its model output is sent to '<OutputPrefix>/Brandeis/BPD/Model'.
+# ------------------------------------------------------------------------------------------------------------
+class Session:
+    # ------------------------------------------------------------------------------------------------------------
+    _key:object
+    _member:int
+    _outputPrefix:str
+    _imuData:ImuHistory
+    _treatment:AbstractTreatment
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Key(self):
+        return self._key
+
+    @property
+    def Member(self):
+        return self._member
+
+    @property
+    def OutputPrefix(self):
+        return self._outputPrefix
+
+    @property
+    def ImuData(self):
+        return self._imuData
+
+    @property
+    def Treatment(self):
+        return self._treatment
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, key, member:int, outputPrefix:str, treatment:AbstractTreatment):
+        self._key = key
+        self._member = member
+        self._outputPrefix = outputPrefix
+        self._imuData = ImuHistory()
+        self._treatment = treatment
+
+# ------------------------------------------------------------------------------------------------------------
+# Runs one model + treatment + IMU state per device in a single process. Sessions are created on the first message
+# from a device, keyed by the OSC address prefix in front of '/Brandeis/BPD/Send...' (keyBy='prefix', e.g.
+# '/imu3/Brandeis/BPD/SendAngle') or by the sender's (ip, port) (keyBy='sender'). All sessions share the
+# configuration schedule and are stepped together by Tick(): every session is one member of a BPDModel2Ensemble, so
+# a tick is one vectorised step for all of them. Members are preallocated for maxSessions devices.
+#
+# Threads: HandleImuMessage runs on the OSC thread, Tick on the model scheduler thread and the output on the OSC
+# send job. The session list is replaced (never modified in place) when a session is added.
+# ------------------------------------------------------------------------------------------------------------
+class SessionManager:
+    # ------------------------------------------------------------------------------------------------------------
+    _keyBy:str
+    _maxSessions:int
+    _tracker:BPDModel2ConfigurationTracker
+    _createTreatment:object
+    _ensemble:BPDModel2Ensemble
+    _configuration:object
+    _sessions:list
+    _sessionsByKey:dict
+    _treatmentEffects:np.ndarray
+    _rejectedKeys:set
+    _newMembers:deque
+
+    # ------------------------------------------------------------------------------------------------------------
+    @property
+    def Sessions(self):
+        return self._sessions
+
+    @property
+    def Ensemble(self):
+        return self._ensemble
+
+    @property
+    def MaxSessions(self):
+        return self._maxSessions
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Split an incoming address into (prefix, message), or None when it is not an IMU message
+    @staticmethod
+    def SplitAddress(address:str) -> tuple:
+        for message in SESSION_IMU_MESSAGES:
+            if address.endswith(message):
+                return address[:-len(message)], message
+        return None
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Session of 'key', created on first use. outputPrefix=None numbers the output: '/Session<n>'
+    def GetSession(self, key, outputPrefix:str=None) -> Session:
+        session = self._sessionsByKey.get(key)
+        if session is not None:
+            return session
+        if len(self._sessions) >= self._maxSessions:
+            if key not in self._rejectedKeys:
+                self._rejectedKeys.add(key)
+                print(f'Session limit of {self._maxSessions} reached, ignoring {key}')
+            return None
+
+        member = len(self._sessions)
+        if outputPrefix is None:
+            outputPrefix = f'/Session{member}'
+        session = Session(key, member, outputPrefix, self._createTreatment())
+        # the member is reset by the next tick, on the model thread
+        self._newMembers.append(member)
+        self._sessionsByKey[key] = session
+        self._sessions = self._sessions + [session]
+        print(f'New session {member} for {key}, output on {outputPrefix}/Brandeis/BPD/Model')
+        return session
+
+    # ------------------------------------------------------------------------------------------------------------
+    # OSC handler for every incoming message (dispatcher default handler, mapped with needs_reply_address=True)
+    def HandleImuMessage(self, clientAddress:tuple, address:str, *args):
+        split = self.SplitAddress(address)
+        if split is None:
+            return
+        prefix, message = split
+        if self._keyBy == 'sender':
+            session = self.GetSession(clientAddress)
+        else:
+            session = self.GetSession(prefix, prefix)
+        if session is None:
+            return
+
+        imuData = session.ImuData
+        if message == '/Brandeis/BPD/SendAngle':
+            imuData.AppendAngle(args[0], args[1], args[2])
+        elif message == '/Brandeis/BPD/SendGyro':
+            imuData.AppendGyro(args[0], args[1], args[2])
+        elif message == '/Brandeis/BPD/SendAccel':
+            imuData.AppendAccel(args[0], args[1], args[2])
+        elif message == '/Brandeis/BPD/SendAccelAngle':
+            imuData.AppendAccelAngle(args[0], args[1])
+        elif message == '/Brandeis/BPD/SendTemp':
+            imuData.AppendTemp(args[0])
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Model scheduler tick: calculate each session's treatment and step all sessions at once
+    def Tick(self, simTimeSeconds:float):
+        configuration = self._tracker.GetActiveConfiguration(simTimeSeconds)
+        if configuration is not self._configuration:
+            self._ensemble.ApplyConfiguration(configuration)
+            self._configuration = configuration
+        while self._newMembers:
+            self._ensemble.ResetMember(self._newMembers.popleft())
+
+        treatmentEffects = self._treatmentEffects
+        for session in self._sessions:
+            treatmentEffects[session.Member] = session.Treatment.CalculateTreatmentEffect(session.ImuData)
+        self._ensemble.step(treatmentEffects)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # (output address, [mood, treatment effect]) for every session, like the /Brandeis/BPD/Model message of main.py
+    def Outputs(self) -> list:
+        mood = self._ensemble.BpdMood
+        treatmentEffect = self._ensemble.BpdTreatmentEffect
+        return [(f'{session.OutputPrefix}/Brandeis/BPD/Model', [float(mood[session.Member]), float(treatmentEffect[session.Member])])
+                for session in self._sessions]
+
+    # ------------------------------------------------------------------------------------------------------------
+    def __init__(self, tracker:BPDModel2ConfigurationTracker, keyBy:str='prefix', maxSessions:int=16,
+                 createTreatment=CreateTreatment):
+        if keyBy not in SESSION_KEYS:
+            raise ValueError(f'Unknown session key {keyBy}, expected one of {SESSION_KEYS}')
+        self._keyBy = keyBy
+        self._maxSessions = maxSessions
+        self._tracker = tracker
+        self._createTreatment = createTreatment
+
+        self._configuration = tracker.GetActiveConfiguration(0.0)
+        self._ensemble = BPDModel2Ensemble(size=maxSessions)
+        self._ensemble.ApplyConfiguration(self._configuration)
+        self._ensemble.reset()
+        self._sessions = []
+        self._sessionsByKey = {}
+        self._treatmentEffects = np.zeros(maxSessions)
+        self._rejectedKeys = set()
+        self._newMembers = deque()
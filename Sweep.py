@@ -0,0 +1,297 @@
+# ------------------------------------------------------------------------------------------------------------
+# Parameter sweep over BPDModel2Configuration fields. The sweep points (a grid or a Latin hypercube sample) are
+# split into chunks, each chunk is simulated as one BPDModel2Ensemble in a worker process, and every point is
+# summarized after a burn-in period: EB min/max, oscillation amplitude, dominant period and time to settle.
+# Optionally a bifurcation diagram (EB extrema against one swept parameter) is written as an image.
+# ------------------------------------------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from BPDModel2Configuration import BPDModel2Configuration
+from BPDModel2Ensemble import BPDModel2Ensemble
+from ModelSetup import CreateModel
+
+# BPDModel2Configuration properties that can be swept, and the matching BPDModel2Ensemble argument
+CONFIGURATION_FIELDS:dict = {'G1': 'g1',
+                             'G2': 'g2',
+                             'QPMin': 'qPmin',
+                             'QPMax': 'qPmax',
+                             'QNMin': 'qNmin',
+                             'QNMax': 'qNmax',
+                             'Lamb': 'lamb',
+                             'Dt': 'dt',
+                             'TMin': 'tmin',
+                             'TMax': 'tmax',
+                             'Delay_Seconds': 'delay_seconds',
+                             'Gain': 'g_gain'}
+
+# Summary statistics written per sweep point
+SWEEP_STATISTICS:list = ['eb_min', 'eb_max', 'amplitude', 'period', 'settle_time']
+
+# Number of EB samples kept per point for the period, settle time and bifurcation analysis
+_RECORD_SAMPLES:int = 4096
+
+# Largest number of EB extrema kept per point for the bifurcation diagram
+_MAX_EXTREMA:int = 64
+
+# Default number of distinct Dt values a sweep is simulated at (see BinTimeSteps)
+DT_BINS:int = 16
+
+# ------------------------------------------------------------------------------------------------------------
+# Parse 'Name=start:stop:count' (grid), 'Name=start:stop' (range, for Latin hypercube sampling) or
+# 'Name=v1,v2,...' (explicit values)
+def ParseParameter(spec:str):
+    name, _, values = spec.partition('=')
+    name = name.strip()
+    if name not in CONFIGURATION_FIELDS:
+        raise ValueError(f'Unknown configuration field {name}, expected one of {list(CONFIGURATION_FIELDS)}')
+    if ':' in values:
+        parts = [float(v) for v in values.split(':')]
+        if len(parts) == 2:
+            return name, (parts[0], parts[1])
+        if len(parts) == 3:
+            return name, np.linspace(parts[0], parts[1], int(parts[2]))
+        raise ValueError(f'Cannot parse parameter range {spec}')
+    return name, np.array([float(v) for v in values.split(',')])
+
+# ------------------------------------------------------------------------------------------------------------
+# Full grid over the given values: returns one flat array per parameter
+def GridPoints(parameters:dict) -> dict:
+    names = list(parameters)
+    for name in names:
+        if isinstance(parameters[name], tuple):
+            raise ValueError(f'{name} is given as a range; grid sweeps need start:stop:count or explicit values')
+    grids = np.meshgrid(*[parameters[name] for name in names], indexing='ij')
+    return {name: grid.ravel() for name, grid in zip(names, grids)}
+
+# ------------------------------------------------------------------------------------------------------------
+# Latin hypercube sample of 'count' points over the (min, max) range of every parameter
+def LatinHypercubePoints(parameters:dict, count:int, seed:int=None) -> dict:
+    rng = np.random.default_rng(seed)
+    points = {}
+    for name, values in parameters.items():
+        low, high = (values if isinstance(values, tuple) else (np.min(values), np.max(values)))
+        strata = (rng.permutation(count) + rng.random(count)) / count
+        points[name] = low + strata * (high - low)
+    return points
+
+# ------------------------------------------------------------------------------------------------------------
+# An ensemble steps all its members with one Dt, so sweep points are simulated per distinct Dt. Snaps Dt values to
+# the nearest of 'bins' evenly spaced values over their range when there are more distinct values than that (a Latin
+# hypercube sample over Dt has one per point); fewer distinct values, e.g. a small grid, are kept as they are
+def BinTimeSteps(dt:np.ndarray, bins:int=DT_BINS) -> np.ndarray:
+    dt = np.asarray(dt, dtype=np.float64)
+    if len(np.unique(dt)) <= bins:
+        return dt
+    centers = np.linspace(dt.min(), dt.max(), bins)
+    return centers[np.argmin(np.abs(dt[:, None] - centers[None, :]), axis=1)]
+
+# ------------------------------------------------------------------------------------------------------------
+# Worker: simulate one chunk of sweep points as an ensemble and summarize every member
+def SimulateChunk(task:dict) -> dict:
+    kwargs = task['kwargs']
+    dt:float = task['dt']
+    nSteps:int = max(1, int(round(task['duration'] / dt)))
+    burnInSteps:int = min(nSteps - 1, int(round(task['burnIn'] / dt)))
+    decimation:int = max(1, nSteps // _RECORD_SAMPLES)
+    settleTolerance:float = task['settleTolerance']
+
+    ensemble = BPDModel2Ensemble(**kwargs)
+    size = ensemble.Size
+    ebMin = np.full(size, np.inf)
+    ebMax = np.full(size, -np.inf)
+    record = np.zeros((nSteps // decimation, size), dtype=np.float32)
+
+    for k in range(nSteps):
+        eb, p, n = ensemble.step(task['treatmentEffect'])
+        if k >= burnInSteps:
+            np.minimum(ebMin, eb, out=ebMin)
+            np.maximum(ebMax, eb, out=ebMax)
+        if k % decimation == decimation - 1 and k // decimation < len(record):
+            record[k // decimation] = eb
+
+    recordDt = dt * decimation
+    recordTimes = (np.arange(len(record)) + 1) * recordDt
+    steady = record[recordTimes > burnInSteps * dt].astype(np.float64)
+    if len(steady) < 4:
+        steady = record.astype(np.float64)
+    amplitude = (ebMax - ebMin) / 2.0
+
+    # dominant period from the spectrum of the steady-state part of the record
+    spectrum = np.abs(np.fft.rfft(steady - steady.mean(axis=0), axis=0))
+    spectrum[0] = 0.0
+    peak = np.argmax(spectrum, axis=0)
+    with np.errstate(divide='ignore'):
+        # fewer than two cycles in the window is a slow drift rather than an oscillation
+        period = np.where((peak >= 2) & (amplitude > settleTolerance), len(steady) * recordDt / np.maximum(peak, 1), np.nan)
+
+    # time to settle: end of the last recorded sample outside the tolerance band around the final value
+    # (NaN when the record is still outside the band within its final stretch)
+    finalSamples = max(1, len(record) // 20)
+    final = record[-finalSamples:].mean(axis=0)
+    outside = np.abs(record - final) > settleTolerance
+    lastOutside = np.where(outside.any(axis=0), len(record) - 1 - np.argmax(outside[::-1], axis=0), -1)
+    settleTime = np.where(lastOutside >= len(record) - finalSamples, np.nan, (lastOutside + 1) * recordDt)
+
+    # local extrema of the steady state for the bifurcation diagram (the final value when there are none)
+    extrema = []
+    slope = np.sign(np.diff(steady, axis=0))
+    for m in range(size):
+        turns = np.nonzero(slope[1:, m] * slope[:-1, m] < 0)[0] + 1
+        values = steady[turns, m][-_MAX_EXTREMA:] if len(turns) > 0 else steady[-1:, m]
+        extrema.append(values)
+
+    return {'eb_min': ebMin,
+            'eb_max': ebMax,
+            'amplitude': amplitude,
+            'period': period,
+            'settle_time': settleTime,
+            'extrema': extrema}
+
+# ------------------------------------------------------------------------------------------------------------
+# Run all sweep points, chunked over a process pool. 'points' maps configuration field names to one value per
+# point; all other fields come from 'baseConfiguration'. A swept Dt is binned to at most 'dtBins' values (see
+# BinTimeSteps), and the results hold the Dt each point was simulated at
+def RunSweep(points:dict,
+             baseConfiguration:BPDModel2Configuration,
+             duration:float=20.0,
+             burnIn:float=5.0,
+             treatmentEffect:float=0.0,
+             settleTolerance:float=1e-3,
+             workers:int=None,
+             chunkSize:int=512,
+             dtBins:int=DT_BINS) -> dict:
+    count = len(next(iter(points.values())))
+    if 'Dt' in points:
+        points = {**points, 'Dt': BinTimeSteps(points['Dt'], dtBins)}
+    base = {arg: np.full(count, getattr(baseConfiguration, field), dtype=np.float64) for field, arg in CONFIGURATION_FIELDS.items()}
+    for field, values in points.items():
+        base[CONFIGURATION_FIELDS[field]] = np.asarray(values, dtype=np.float64)
+
+    # the ensemble steps all members in lockstep, so points are chunked per time step value; every chunk runs
+    # 'duration' seconds in its own number of steps
+    tasks = []
+    for dt in np.unique(base['dt']):
+        indices = np.nonzero(base['dt'] == dt)[0]
+        for start in range(0, len(indices), chunkSize):
+            chunk = indices[start:start + chunkSize]
+            kwargs = {arg: values[chunk] for arg, values in base.items()}
+            kwargs['size'] = len(chunk)
+            kwargs['injectMode'] = baseConfiguration.InjectMode
+            tasks.append({'indices': chunk, 'kwargs': kwargs, 'dt': float(dt), 'duration': duration, 'burnIn': burnIn,
+                          'treatmentEffect': treatmentEffect, 'settleTolerance': settleTolerance})
+
+    results = {name: np.zeros(count) for name in SWEEP_STATISTICS}
+    extrema = [None] * count
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for task, chunkResult in zip(tasks, pool.map(SimulateChunk, tasks)):
+            for name in SWEEP_STATISTICS:
+                results[name][task['indices']] = chunkResult[name]
+            for index, values in zip(task['indices'], chunkResult['extrema']):
+                extrema[index] = values
+
+    results.update({field: np.asarray(values) for field, values in points.items()})
+    results['extrema'] = extrema
+    return results
+
+# ------------------------------------------------------------------------------------------------------------
+def WriteSweepOutput(path:str, results:dict):
+    extrema = results['extrema']
+    arrays = {name: values for name, values in results.items() if name != 'extrema'}
+    if os.path.splitext(path)[1].lower() == '.csv':
+        names = list(arrays)
+        np.savetxt(path, np.column_stack([arrays[name] for name in names]), delimiter=',', header=','.join(names), comments='')
+    else:
+        # extrema are stored flattened, with the number of extrema per point alongside
+        arrays['extrema'] = np.concatenate(extrema) if len(extrema) > 0 else np.zeros(0)
+        arrays['extrema_count'] = np.array([len(e) for e in extrema])
+        np.savez(path, **arrays)
+
+# ------------------------------------------------------------------------------------------------------------
+def PlotBifurcation(path:str, results:dict, parameter:str):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    x = np.concatenate([np.full(len(e), v) for v, e in zip(results[parameter], results['extrema'])])
+    y = np.concatenate(results['extrema'])
+
+    fig = plt.figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.scatter(x, y, s=0.5, c='k', alpha=0.5, linewidths=0)
+    ax.set_xlabel(parameter)
+    ax.set_ylabel('EB extrema after burn-in')
+    ax.set_ylim(0, 1)
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
+
+# ------------------------------------------------------------------------------------------------------------
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            prog='Sweep.py',
+            description='Parameter sweep of BPDModel2 configurations. Fields that are not swept use the model configuration\n' +
+            'from ModelSetup.py. Writes per point summary statistics and optionally a bifurcation diagram.\n',
+            epilog='Examples:\n' +
+            '  python Sweep.py --param Lamb=0.1:2.0:200 --param Gain=0.0:0.2:50 --plot bifurcation.png\n' +
+            '  python Sweep.py --param Lamb=0.1:2.0 --param Delay_Seconds=0.005:0.05 --lhs 100000\n',
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--param', '-p', dest='params', action='append', required=True,
+            help='Swept field: Name=start:stop:count, Name=start:stop (with --lhs) or Name=v1,v2,...\n' +
+            'Fields: ' + ', '.join(CONFIGURATION_FIELDS) + '\n' +
+            'Dt is treated specially: points are simulated per distinct Dt, so a swept Dt is snapped to\n' +
+            'at most --dt-bins evenly spaced values, and the output holds the Dt each point ran at')
+    parser.add_argument('--lhs', dest='lhs', required=False, type=int, default=None,
+            help='Draw this many Latin hypercube points instead of a full grid')
+    parser.add_argument('--seed', dest='seed', required=False, type=int, default=None,
+            help='Random seed for --lhs')
+    parser.add_argument('--duration', dest='duration', required=False, type=float, default=20.0,
+            help='Simulated seconds per point (default: 20)')
+    parser.add_argument('--burn-in', dest='burn_in', required=False, type=float, default=5.0,
+            help='Simulated seconds discarded before computing statistics (default: 5)')
+    parser.add_argument('--treatment', dest='treatment', required=False, type=float, default=0.0,
+            help='Constant treatment effect (default: 0)')
+    parser.add_argument('--settle-tolerance', dest='settle_tolerance', required=False, type=float, default=1e-3,
+            help='EB band for settling / oscillation detection (default: 0.001)')
+    parser.add_argument('--workers', '-w', dest='workers', required=False, type=int, default=None,
+            help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', dest='chunk_size', required=False, type=int, default=512,
+            help='Sweep points simulated together in one ensemble (default: 512)')
+    parser.add_argument('--dt-bins', dest='dt_bins', required=False, type=int, default=DT_BINS,
+            help=f'Largest number of distinct Dt values simulated when Dt is swept (default: {DT_BINS})')
+    parser.add_argument('--output', '-o', dest='output', required=False, default='sweep_output.npz',
+            help='Output file, .npz or .csv (default: sweep_output.npz)')
+    parser.add_argument('--plot', dest='plot', required=False, default=None,
+            help='Write a bifurcation diagram to this image file')
+    parser.add_argument('--plot-param', dest='plot_param', required=False, default=None,
+            help='Parameter on the bifurcation diagram x axis (default: the first --param)')
+
+    opts, args = parser.parse_known_args(args)
+    return opts, args
+
+# ------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    opts, args = parse_args(sys.argv[1:])
+
+    parameters:dict = dict(ParseParameter(spec) for spec in opts.params)
+    points:dict = LatinHypercubePoints(parameters, opts.lhs, opts.seed) if opts.lhs else GridPoints(parameters)
+    count:int = len(next(iter(points.values())))
+
+    print(f'Sweeping {count} points over {", ".join(parameters)}')
+    startTime:float = time.perf_counter()
+    results:dict = RunSweep(points, CreateModel().CurrentConfiguration, duration=opts.duration, burnIn=opts.burn_in,
+                            treatmentEffect=opts.treatment, settleTolerance=opts.settle_tolerance,
+                            workers=opts.workers, chunkSize=opts.chunk_size, dtBins=opts.dt_bins)
+    print(f'Simulated {count} points in {time.perf_counter() - startTime:.1f} s')
+
+    WriteSweepOutput(opts.output, results)
+    print(f'Summary statistics written to {opts.output}')
+
+    if opts.plot:
+        PlotBifurcation(opts.plot, results, opts.plot_param or next(iter(parameters)))
+        print(f'Bifurcation diagram written to {opts.plot}')
@@ -18,19 +18,24 @@ import sys
 
 import matplotlib.pyplot as plt
 import threading
-from queue import Queue
 
 # ------------------------------------------------------------------------------------------------------------
 # Helper code
-from Helpers.AbstractModel import AbstractModel
+from Helpers.AbstractModel import AbstractModel, MODEL_INTEGRATORS
 from Helpers.AbstractTreatment import AbstractTreatment
 from Helpers.ModelOutputData import ModelOutputData
 from Helpers.ModelPlot import ModelPlot
-from Helpers.ImuData import ImuData
-from Helpers.Theremin import Theremin
+from Helpers.ImuHistory import ImuHistory
+from Helpers.ImuFusion import ImuFusion, IMU_FILTERS
+from Helpers.Theremin import Theremin, THEREMIN_CONTROL_RATE
 from Helpers.ThereminOutputData import ThereminOutputData
-from Helpers.TimeKeeper import TimeKeeper
+from Helpers.ModelScheduler import ModelScheduler
+from Helpers.ModelChannel import ModelChannel
+from Helpers.LatencyTracer import LatencyTracer
+from Helpers.OscHistorySender import OscHistorySender, OSC_HISTORY_MODES
+from Helpers.SessionRecorder import SessionRecorder
 from BPDModel2ConfigurationTracker import BPDModel2ConfigurationTracker
+from ModelProcess import ModelProcess
 
 from Sound import list_output_devices
 from Sound.utils import midi_str_to_midi, midi_to_freq
@@ -38,13 +43,13 @@ from Sound.utils import midi_str_to_midi, midi_to_freq
 # ------------------------------------------------------------------------------------------------------------
 # The bpd model and treatment logic
 from BPDModel2 import BPDModel2
-from BPDModel2 import BPDModel2Configuration
 from BPDTreatment1 import BPDTreatment1
+from ModelSetup import MODEL_UPDATE_INTERVAL, CreateModel, CreateTreatment, AddModelConfigurations, ScheduleDefaults
 
-# Instantiate the bpd model and treatment logic to use
-_modelUpdateInterval:float = 0.0015
-_modelToUse:BPDModel2 = BPDModel2(dt=_modelUpdateInterval, delay_seconds=0.02, g_gain=0.07, lamb=0.5)
-_treatmentToUse:BPDTreatment1 = BPDTreatment1(XAngleRatio=1, XAngleVelocityRatio=0.0, TreatmentScale=0.015)
+# Instantiate the bpd model and treatment logic to use (see ModelSetup.py)
+_modelUpdateInterval:float = MODEL_UPDATE_INTERVAL
+_modelToUse:BPDModel2 = CreateModel(_modelUpdateInterval)
+_treatmentToUse:BPDTreatment1 = CreateTreatment()
 _modelConfigurationTracker:BPDModel2ConfigurationTracker = BPDModel2ConfigurationTracker()
 _theremin:Theremin
 
@@ -56,6 +61,8 @@ _oscMessageDestinationIP = "255.255.255.255"
 _oscMessageDestinationPort = 2324
 _debugLogOSCActivity:bool = False
 _oscSendInterval:float = 0.1
+# set with --osc-history: also sends every (decimated) model sample since the last send, in bundles or blobs
+_oscHistorySender:OscHistorySender = None
 
 # ------------------------------------------------------------------------------------------------------------
 _oscDispatcher:Dispatcher = Dispatcher()
@@ -64,18 +71,44 @@ _oscTransport:BaseTransport
 _oscProtocol:DatagramProtocol
 _oscClient:SimpleUDPClient = SimpleUDPClient(address=_oscMessageDestinationIP, port=_oscMessageDestinationPort, allow_broadcast=True)
 _timeLoop:Timeloop = Timeloop()
-_timeKeeper:TimeKeeper = TimeKeeper()
-_imuData:ImuData = ImuData()
-_plottingQueue:Queue = Queue()
+# every incoming IMU OSC message is appended as a timestamped row; treatments read the latest values (like ImuData)
+_imuData:ImuHistory = ImuHistory()
+# set with --fusion: filters the x axis on every angle message; the treatment then reads the filtered angle
+_imuFusion:ImuFusion = None
+# what the treatment reads: _imuData, or _imuFusion when a fusion filter is used
+_treatmentInput = _imuData
+# model samples for the plotter: bounded, so a slow plotter drops old samples instead of growing memory
+_plottingChannel:ModelChannel = ModelChannel(capacity=4096)
+# plot every n-th model tick (at 1.5ms ticks, 500 plotted points then span ~6 seconds)
+_plottingDecimation:int = 8
+# the plot is redrawn at most this many times per second, independent of the model rate
+_plottingFrameRate:float = 30.0
 _mainIsRunning:bool = True
+# set with --trace-latency: stamps IMU input and records input -> model -> theremin/OSC latencies
+_latencyTracer:LatencyTracer = None
+# set with --model-process: the model and treatment run in their own process, this one follows its output
+_modelProcess:ModelProcess = None
+# set with --record: records IMU samples, model ticks and parameter changes to binary files in a directory
+_sessionRecorder:SessionRecorder = None
+
+# ------------------------------------------------------------------------------------------------------------
+# Called by the OSC handlers after every IMU sample
+def imuSampleReceived():
+    if _modelProcess is not None:
+        _modelProcess.PublishImu(_treatmentInput)
+    if _sessionRecorder is not None:
+        _sessionRecorder.RecordImu(_imuData)
 
 # ------------------------------------------------------------------------------------------------------------
 def handleOscMessage_Angle(address, *args):
     global _imuData
     global _debugLogOSCActivity
-    _imuData.xAngle = args[0]
-    _imuData.yAngle = args[1]
-    _imuData.zAngle = args[2]
+    if _latencyTracer is not None:
+        _latencyTracer.StampInput()
+    _imuData.AppendAngle(args[0], args[1], args[2])
+    if _imuFusion is not None:
+        _imuFusion.Update()
+    imuSampleReceived()
     if _debugLogOSCActivity:
         print(f"Received OSC: {address}: {args}")
 
@@ -83,9 +116,10 @@ def handleOscMessage_Angle(address, *args):
 def handleOscMessage_Gyro(address, *args):
     global _imuData
     global _debugLogOSCActivity
-    _imuData.xGyro = args[0]
-    _imuData.yGyro = args[1]
-    _imuData.zGyro = args[2]
+    if _latencyTracer is not None:
+        _latencyTracer.StampInput()
+    _imuData.AppendGyro(args[0], args[1], args[2])
+    imuSampleReceived()
     if _debugLogOSCActivity:
         print(f"Received OSC: {address}: {args}")
 
@@ -93,9 +127,10 @@ def handleOscMessage_Gyro(address, *args):
 def handleOscMessage_Accel(address, *args):
     global _imuData
     global _debugLogOSCActivity
-    _imuData.xAccel = args[0]
-    _imuData.yAccel = args[1]
-    _imuData.zAccel= args[2]
+    if _latencyTracer is not None:
+        _latencyTracer.StampInput()
+    _imuData.AppendAccel(args[0], args[1], args[2])
+    imuSampleReceived()
     if _debugLogOSCActivity:
         print(f"Received OSC: {address}: {args}")
 
@@ -103,9 +138,10 @@ def handleOscMessage_Accel(address, *args):
 def handleOscMessage_AccelAngle(address, *args):
     global _imuData
     global _debugLogOSCActivity
-    _imuData.xAccelAngle = args[0]
-
-    _imuData.yAccelAngle = args[1]
+    if _latencyTracer is not None:
+        _latencyTracer.StampInput()
+    _imuData.AppendAccelAngle(args[0], args[1])
+    imuSampleReceived()
     if _debugLogOSCActivity:
         print(f"Received OSC: {address}: {args}")
 
@@ -113,7 +149,10 @@ def handleOscMessage_AccelAngle(address, *args):
 def handleOscMessage_Temp(address, *args):
     global _imuData
     global _debugLogOSCActivity
-    _imuData.temp = args[0]
+    if _latencyTracer is not None:
+        _latencyTracer.StampInput()
+    _imuData.AppendTemp(args[0])
+    imuSampleReceived()
     if _debugLogOSCActivity:
         print(f"Received OSC: {address}: {args}")
 
@@ -124,43 +163,94 @@ def sendOscMessages():
     global _modelToUse
     global _theremin
     _oscClient.send_message("/Brandeis/BPD/Model", [_modelToUse.ModelState.BpdMood, _modelToUse.ModelState.BpdTreatmentEffect])
+    if _oscHistorySender is not None:
+        _oscHistorySender.Send()
+    if _latencyTracer is not None:
+        _latencyTracer.OscSent()
     if _debugLogOSCActivity:
         print(f"Sent OSC: {time.ctime()}, BPD model mood: {_modelToUse.ModelState.BpdMood}, Treatment model effect: {_modelToUse.ModelState.BpdTreatmentEffect}")
 
 # ------------------------------------------------------------------------------------------------------------
-@_timeLoop.job(interval=timedelta(seconds=_modelUpdateInterval))
-def updateBPDModel():
+# Runs on the model scheduler thread, once per _modelUpdateInterval of simulated time
+def updateBPDModel(simTimeSeconds:float):
     global _modelToUse
     global _imuData
-    global _timeKeeper
 
-    # Update the configurationt that the model should use, based on the elapsed time
-    _modelToUse.CurrentConfiguration = _modelConfigurationTracker.GetActiveConfiguration(_timeKeeper.ElapsedTimeInSeconds())
+    # Update the configurationt that the model should use, based on the simulated time
+    _modelToUse.CurrentConfiguration = _modelConfigurationTracker.GetActiveConfiguration(simTimeSeconds)
+
+    # IMU input that arrived since the last tick is consumed by this one
+    inputStamp:float = _latencyTracer.TakeInputStamp() if _latencyTracer is not None else None
 
     # Update the model
-    _modelToUse.step(_treatmentToUse.CalculateTreatmentEffect(_imuData), DT=_modelUpdateInterval)
+    treatmentEffect:float = _treatmentToUse.CalculateTreatmentEffect(_treatmentInput)
+    EB, P, N = _modelToUse.step(treatmentEffect, DT=_modelUpdateInterval)
+    if _latencyTracer is not None:
+        _latencyTracer.ModelUpdated(inputStamp)
 
     # update the theremin
     _theremin.Update(_modelToUse.ModelState)
+    if _latencyTracer is not None:
+        _latencyTracer.ThereminUpdated(inputStamp)
+
+    # Hand a snapshot of the values to the plotter (which runs in parallel on the main thread) and the OSC history
+    sample:tuple = (simTimeSeconds, _modelToUse.ModelState.BpdMood, _modelToUse.ModelState.BpdTreatmentEffect, EB)
+    _plottingChannel.Write(sample)
+    if _oscHistorySender is not None:
+        _oscHistorySender.Write(sample)
+    if _sessionRecorder is not None:
+        _sessionRecorder.RecordTick(simTimeSeconds, treatmentEffect, EB, P, N, _modelToUse.ModelState.BpdMood, _modelToUse.CurrentConfiguration)
+
+# ------------------------------------------------------------------------------------------------------------
+# Replaces updateBPDModel with --model-process: takes the samples the model process wrote since the last tick,
+# mirrors the latest one in _modelToUse.ModelState (which is not stepped in this process) for the theremin and OSC
+# output, and hands them to the plotter and the OSC history
+def followModelProcess(simTimeSeconds:float):
+    samples = _modelProcess.Output.Drain()
+    if len(samples) == 0:
+        return
+    for sample in samples.tolist():
+        _plottingChannel.Write(sample)
+        if _oscHistorySender is not None:
+            _oscHistorySender.Write(sample)
+
+    _, mood, treatmentEffect, _ = samples[-1].tolist()
+    _modelToUse.ModelState.BpdMood = mood
+    _modelToUse.ModelState.BpdTreatmentEffect = treatmentEffect
+    _theremin.Update(_modelToUse.ModelState)
 
-    # Queue date for plotting (which happens in a different timeloop job that runs in parallel)
-    _plottingQueue.put(_modelToUse.ModelState)
+# The model tick runs on its own deadline-driven thread (not a Timeloop job) so that it can catch up after stalls
+_modelScheduler:ModelScheduler = ModelScheduler(updateBPDModel, interval=_modelUpdateInterval)
 
 # ------------------------------------------------------------------------------------------------------------
 async def mainLoop():
     global _timeLoop
     print('Starting main loop - press and hold ESC/SPACE to exit')
+    if _modelProcess is not None:
+        _modelProcess.Start()
+    _modelScheduler.Start()
     _timeLoop.start()
     while(not keyboard.is_pressed('Esc') and not keyboard.is_pressed('Space')):
         await asyncio.sleep(0.1)
     _timeLoop.stop()
+    _modelScheduler.Stop()
+    if _modelProcess is not None:
+        # the model process prints its own scheduler statistics when it stops
+        _modelProcess.Stop()
+    else:
+        _modelScheduler.PrintStatistics()
+    if _latencyTracer is not None:
+        _latencyTracer.PrintStatistics()
 
 # ------------------------------------------------------------------------------------------------------------
 def on_key(event:str):
     global _debugLogOSCActivity
 
-    _modelToUse.on_key(event)
-    _treatmentToUse.on_key(event)
+    if _modelProcess is not None:
+        _modelProcess.SendKey(event.key)
+    else:
+        _modelToUse.on_key(event)
+        _treatmentToUse.on_key(event)
     
     printMsg:bool=False
 
@@ -180,6 +270,16 @@ def on_key(event:str):
         print(f"BPD model mood: {_modelToUse.ModelState.BpdMood}, Treatment model effect: {_modelToUse.ModelState.BpdTreatmentEffect}")
     elif event.key == 'O': 
         print(f"BPD model mood: {_modelToUse.ModelState.BpdMood}, Treatment model effect: {_modelToUse.ModelState.BpdTreatmentEffect}")
+    elif event.key == 'i': 
+        if _modelProcess is None:
+            _modelScheduler.PrintStatistics()
+        else:
+            print(f'Model process: {_modelProcess.Output.Written} samples written, {_modelProcess.Output.Dropped} dropped')
+        print(f'Plotting channel: {_plottingChannel.Written} samples written, {_plottingChannel.Dropped} dropped, lag {_plottingChannel.Lag}')
+        if _oscHistorySender is not None:
+            print(f'OSC history: {_oscHistorySender.SentSamples} samples in {_oscHistorySender.SentPackets} packets, {_oscHistorySender.Dropped} dropped')
+        if _latencyTracer is not None:
+            _latencyTracer.PrintStatistics()
     
     if printMsg:
         print(f"Debug log incoming OSC messages = {_debugLogOSCActivity}, Theremin is playing: {_theremin.IsPlaying}")
@@ -226,15 +326,14 @@ def run_event_loop(loop):
 # ------------------------------------------------------------------------------------------------------------
 def runPlotter():
     print('Entering runPlotter()')
-    modelPlot:ModelPlot = ModelPlot()
+    modelPlot:ModelPlot = ModelPlot(maxFrameRate=_plottingFrameRate)
     
     modelPlot.Fig.canvas.mpl_connect('key_press_event', on_key)
 
     while _mainIsRunning:
-        if not _plottingQueue.empty():
-            message:ModelOutputData = _plottingQueue.get()
-            modelPlot.UpdatePlot(message)
-        plt.pause(_modelUpdateInterval)
+        modelPlot.UpdatePlotSamples(_plottingChannel.Drain(_plottingDecimation))
+        # the plot redraws at most _plottingFrameRate times per second, so there is no point in polling faster
+        plt.pause(1.0 / _plottingFrameRate)
     print('Exiting runPlotter()')
 
 # ------------------------------------------------------------------------------------------------------------
@@ -267,10 +366,46 @@ def parse_args(args):
             help='Minimum audio frequency (default: 55 Hz)')
     parser.add_argument('--max-frequency', dest='max_frequency', required=False, type=int, default=5000,
             help='Maximum audio frequency (default: 5 kHz)')
+    parser.add_argument('--control-rate', dest='control_rate', required=False, type=float, default=THEREMIN_CONTROL_RATE,
+            help=f'Rate at which the theremin frequency and volume are passed to the audio engine, which glides\n' +
+            f'between them (default: {THEREMIN_CONTROL_RATE:g} Hz; 0 passes them on every model tick)')
     parser.add_argument('--min-note', dest='min_note', required=False, type=str, default=None,
             help='Minimum MIDI note, as a string (e.g. A4)')
     parser.add_argument('--max-note', dest='max_note', required=False, type=str, default=None,
             help='Maximum MIDI note, as a string (e.g. A4)')
+    parser.add_argument('--schedule', '-s', dest='schedule', required=False, type=str, default=None,
+            help='JSON or YAML file with the model configuration schedule (default: the schedule in ModelSetup.py)')
+    parser.add_argument('--model-rate', dest='model_rate', required=False, type=float, default=1.0 / MODEL_UPDATE_INTERVAL,
+            help=f'Model updates per second (default: {1.0 / MODEL_UPDATE_INTERVAL:.0f} Hz). Other rates keep the dynamics\n' +
+            'of the default rate with --integrator rk4')
+    parser.add_argument('--integrator', dest='integrator', required=False, type=str, default='euler', choices=MODEL_INTEGRATORS,
+            help='Model integrator (default: euler)')
+    parser.add_argument('--scheduler-spin', dest='scheduler_spin', required=False, type=float, default=0.0,
+            help='Seconds the model scheduler spins before every tick instead of sleeping, to tick closer to its\n' +
+            'deadlines at the cost of a busy core (default: 0, sleep only)')
+    parser.add_argument('--fusion', dest='fusion', required=False, type=str, default='none',
+            choices=['none'] + list(IMU_FILTERS.keys()),
+            help='Filter the IMU x axis (gyro, accel angle and angle) before the treatment (default: none).\n' +
+            'complementary: gyro integration pulled towards the angle, kalman: angle + gyro bias Kalman filter,\n' +
+            'oneeuro: adaptive low pass on the angle')
+    parser.add_argument('--osc-history', dest='osc_history', required=False, type=str, default='off',
+            choices=['off'] + OSC_HISTORY_MODES,
+            help='Besides the latest mood and treatment effect, send all model samples since the previous send ' +
+            '(default: off).\nbundle: OSC bundles of /Brandeis/BPD/Model/History [time, mood, treatment, eb] messages,\n' +
+            'blob: /Brandeis/BPD/Model/History/Blob [count, blob of little endian doubles] messages')
+    parser.add_argument('--osc-decimation', dest='osc_decimation', required=False, type=int, default=1,
+            help='Send every n-th model sample in the OSC history (default: 1, all samples)')
+    parser.add_argument('--osc-max-packet', dest='osc_max_packet', required=False, type=int, default=1400,
+            help='Maximum size of an OSC history packet in bytes (default: 1400)')
+    parser.add_argument('--trace-latency', dest='trace_latency', required=False, type=str, default=None,
+            help='Trace IMU input -> model -> theremin/OSC output latencies and write the histograms (JSON) ' +
+            'to this file on exit (default: off)')
+    parser.add_argument('--model-process', dest='model_process', required=False, action='store_true',
+            help='Run the model and treatment in a separate process, connected through shared memory ' +
+            '(default: false).\nNot combined with --trace-latency')
+    parser.add_argument('--record', dest='record', required=False, type=str, default=None,
+            help='Record IMU samples, model ticks and parameter changes to binary files in this directory ' +
+            '(default: off).\nRead them back with Helpers.SessionRecorder.ReadRecording')
 
     parser.print_help()
     print()
@@ -278,68 +413,13 @@ def parse_args(args):
     return opts, args
 
 # ------------------------------------------------------------------------------------------------------------
-def SetupModelConfigurations():
+def SetupModelConfigurations(scheduleFile:str=None):
     global _modelConfigurationTracker
 
-    # add an example configuration, active from t=0 seconds to t=10 seconds
-    _modelConfigurationTracker.AddConfiguration(
-                                                startTimeSeconds=0,
-                                                endTimeSeconds=10,
-                                                configuration = BPDModel2Configuration(
-                                                    g1=3.0, 
-                                                    g2=3.0,
-                                                    qPmin=10.0, 
-                                                    qPmax=10.0,
-                                                    qNmin=2.5, 
-                                                    qNmax=7.0,
-                                                    lamb=0.5,
-                                                    dt=0.0015,
-                                                    tmin=1.0, 
-                                                    tmax=5.0,
-                                                    injectMode='tilt_to_PN',
-                                                    delay_seconds=0.02,
-                                                    g_gain=0.07                                                    
-                                                )
-                                                )
-
-    # add an example configuration, active from t=10 seconds to t=20 seconds
-    _modelConfigurationTracker.AddConfiguration(
-                                                startTimeSeconds=10,
-                                                endTimeSeconds=20,
-                                                configuration = BPDModel2Configuration(
-                                                    g1=3.0, 
-                                                    g2=3.0,
-                                                    qPmin=10.0, 
-                                                    qPmax=10.0,
-                                                    qNmin=2.5, 
-                                                    qNmax=7.0,
-                                                    lamb=0.5,
-                                                    dt=0.0015,
-                                                    tmin=1.0, 
-                                                    tmax=5.0,
-                                                    injectMode='tilt_to_PN',
-                                                    delay_seconds=0.02,
-                                                    g_gain=0.07                                                    
-                                                )
-                                                )
-    
-    # beyond t=20 seconds, or in general, if no 'active' model configuration has been found, a default BPModel2Configuration will be used
-    _modelConfigurationTracker.DefaultConfiguration = BPDModel2Configuration(
-                                                    g1=3.0, 
-                                                    g2=3.0,
-                                                    qPmin=10.0, 
-                                                    qPmax=10.0,
-                                                    qNmin=2.5, 
-                                                    qNmax=7.0,
-                                                    lamb=0.5,
-                                                    dt=0.0015,
-                                                    tmin=1.0, 
-                                                    tmax=5.0,
-                                                    injectMode='tilt_to_PN',
-                                                    delay_seconds=0.02,
-                                                    g_gain=0.07                                                    
-                                                )
-
+    if scheduleFile:
+        _modelConfigurationTracker.LoadConfigurations(scheduleFile, ScheduleDefaults(_modelUpdateInterval))
+    else:
+        AddModelConfigurations(_modelConfigurationTracker, _modelUpdateInterval)
     _modelConfigurationTracker.PrintConfigurationInfo()
 
 # ------------------------------------------------------------------------------------------------------------
@@ -359,6 +439,14 @@ if __name__ == '__main__':
         list_output_devices()
         exit()
 
+    # the model and its scheduler were created with the default rate and integrator, and without spinning
+    if opts.model_rate != 1.0 / MODEL_UPDATE_INTERVAL or opts.integrator != 'euler':
+        _modelUpdateInterval = 1.0 / opts.model_rate
+        _modelToUse = CreateModel(_modelUpdateInterval, opts.integrator)
+        _modelScheduler = ModelScheduler(updateBPDModel, interval=_modelUpdateInterval, spinSeconds=opts.scheduler_spin)
+    elif opts.scheduler_spin > 0:
+        _modelScheduler = ModelScheduler(updateBPDModel, interval=_modelUpdateInterval, spinSeconds=opts.scheduler_spin)
+
     # print keys that the scripts respond to
     print(f'Listing keys:')
     print(f'=============')
@@ -367,15 +455,37 @@ if __name__ == '__main__':
     print(f'{os.path.basename(__file__)}: d/D = Debug printing incoming OSC message info off/on')      
     print(f'{os.path.basename(__file__)}: x/X = Theremin sound generation off/on')      
     print(f'{os.path.basename(__file__)}: o = Debug print model state')      
+    print(f'{os.path.basename(__file__)}: i = Print model scheduler timing (and latency trace) statistics')      
     print()
     input('Press ENTER to continue...')
     print()
 
-    SetupModelConfigurations()
+    SetupModelConfigurations(opts.schedule)
+
+    if opts.fusion != 'none':
+        _imuFusion = ImuFusion(_imuData, IMU_FILTERS[opts.fusion]())
+        _treatmentInput = _imuFusion
+
+    if opts.osc_history != 'off':
+        _oscHistorySender = OscHistorySender(_oscClient, mode=opts.osc_history, decimation=opts.osc_decimation, maxPacketSize=opts.osc_max_packet)
+
+    if opts.record:
+        # with --model-process, the model process records the model ticks and parameters itself
+        _sessionRecorder = SessionRecorder(opts.record, streams=['imu'] if opts.model_process else None)
+
+    if opts.model_process:
+        _modelProcess = ModelProcess(_modelUpdateInterval, opts.schedule, recordDirectory=opts.record, integrator=opts.integrator)
+        _modelScheduler = ModelScheduler(followModelProcess, interval=_modelUpdateInterval, spinSeconds=opts.scheduler_spin)
+        if opts.trace_latency:
+            print('Latency tracing is not supported with --model-process, ignoring --trace-latency')
+            opts.trace_latency = None
+
+    if opts.trace_latency:
+        _latencyTracer = LatencyTracer()
 
     print('Instantiating Theremin')
     # create sound generator based on command line properties
-    _theremin=Theremin(wave=opts.generator, audio_backend=opts.audio_backend, discrete=opts.discrete, min_frequency=opts.min_frequency, max_frequency=opts.max_frequency, audio_output=opts.audio_output, channels=opts.channels, sampling_rate=opts.sampling_rate)
+    _theremin=Theremin(wave=opts.generator, audio_backend=opts.audio_backend, discrete=opts.discrete, min_frequency=opts.min_frequency, max_frequency=opts.max_frequency, audio_output=opts.audio_output, channels=opts.channels, sampling_rate=opts.sampling_rate, control_rate=opts.control_rate)
     print()
 
     print('Initializing Main')
@@ -387,4 +497,10 @@ if __name__ == '__main__':
     runPlotter()
 
     eventThread.join()
+    if _latencyTracer is not None:
+        _latencyTracer.Dump(opts.trace_latency)
+        print(f'Latency trace written to {opts.trace_latency}')
+    if _sessionRecorder is not None:
+        _sessionRecorder.Close()
+        print(f'Session recorded to {opts.record}: {_sessionRecorder.Written}')
     print('All done!')
\ No newline at end of file
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from BPDModel2 import BPDModel2
+from BPDModel2Analysis import AnalyzeConfiguration, AnalyzeConfigurations
+
+# Five simulated seconds at the ModelSetup.py rate: the stable fixed point settles in about two, and at Gain 0.3 the
+# dominant root grows perturbations by e every 6 ms
+DT:float = 0.0015
+STEPS:int = int(5.0 / DT)
+
+# ------------------------------------------------------------------------------------------------------------
+# Starts next to the low EB fixed point (EB about 0.2655, P about 5.9, N about 16.4)
+def _model(gain:float) -> BPDModel2:
+    return BPDModel2(kernel='python', dt=DT, delay_seconds=0.02, g_gain=gain, lamb=0.5, P0=6.0, N0=16.0)
+
+def _lowFixedPoint(model:BPDModel2) -> dict:
+    return min(AnalyzeConfiguration(model.CurrentConfiguration), key=lambda fixedPoint: fixedPoint['eb'])
+
+# ------------------------------------------------------------------------------------------------------------
+def test_stable_fixed_point_is_where_the_simulation_settles():
+    model = _model(0.07)
+    fixedPoint = _lowFixedPoint(model)
+    assert fixedPoint['stable']
+    assert fixedPoint['eb'] == pytest.approx(0.2655, abs=1e-4)
+
+    out = model.step_many(np.zeros(STEPS))
+    assert out.EB[-1] == pytest.approx(fixedPoint['eb'], abs=1e-4)
+    assert out.P[-1] == pytest.approx(fixedPoint['p'], rel=1e-3)
+    assert out.N[-1] == pytest.approx(fixedPoint['n'], rel=1e-3)
+    assert np.ptp(out.EB[-500:]) < 1e-3
+
+# ------------------------------------------------------------------------------------------------------------
+def test_unstable_fixed_point_is_left_by_the_simulation():
+    model = _model(0.3)
+    fixedPoint = _lowFixedPoint(model)
+    assert not fixedPoint['stable']
+    assert fixedPoint['growth_rate'] > 0
+
+    out = model.step_many(np.zeros(STEPS))
+    assert np.max(np.abs(out.EB - fixedPoint['eb'])) > 0.5
+    assert max(out.P.max(), out.N.max()) > 1e3 * max(fixedPoint['p'], fixedPoint['n'])
+
+# ------------------------------------------------------------------------------------------------------------
+# The vectorised analysis agrees with the per configuration one
+def test_vectorised_analysis_matches_single_configurations():
+    base = _model(0.07).CurrentConfiguration
+    gains = np.array([0.07, 0.3])
+    results = AnalyzeConfigurations({'Gain': gains}, base)
+
+    for i, gain in enumerate(gains):
+        fixedPoints = AnalyzeConfiguration(_model(gain).CurrentConfiguration)
+        assert results['fixed_points'][i] == len(fixedPoints)
+        for k, fixedPoint in enumerate(fixedPoints):
+            assert results['eb'][i, k] == pytest.approx(fixedPoint['eb'])
+            assert results['stable'][i, k] == fixedPoint['stable']
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from BPDModel2 import BPDModel2
+from BPDModel2Configuration import INJECT_MODES
+from Helpers.BPDModel2Kernel import bpd_model2_step
+
+# Long enough for the delayed term to act and for every inject mode to see both signs of the treatment effect
+STEPS:int = 5000
+
+# ------------------------------------------------------------------------------------------------------------
+def _treatmentEffects(count:int=STEPS) -> np.ndarray:
+    return np.random.default_rng(1).normal(0.0, 0.05, count)
+
+def _model(mode:str, kernel:str) -> BPDModel2:
+    return BPDModel2(injectMode=mode, kernel=kernel, dt=0.0015, lamb=0.5, g_gain=0.07)
+
+# ------------------------------------------------------------------------------------------------------------
+# The uncompiled kernel (what numba compiles), run through the model's kernel path, against BPDModel2's own
+# Python step; runs without numba
+@pytest.mark.parametrize('mode', INJECT_MODES)
+def test_python_kernel_matches_model_step(mode):
+    reference = _model(mode, 'python')
+    kernel = _model(mode, 'python')
+    kernel._kernel = bpd_model2_step
+
+    for treatmentEffect in _treatmentEffects():
+        assert kernel.step(treatmentEffect) == reference.step(treatmentEffect)
+    assert kernel.ModelState.BpdMood == reference.ModelState.BpdMood
+    np.testing.assert_array_equal(kernel._P_buf, reference._P_buf)
+    np.testing.assert_array_equal(kernel._N_buf, reference._N_buf)
+
+# ------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('mode', INJECT_MODES)
+def test_numba_kernel_matches_python(mode):
+    pytest.importorskip('numba')
+    reference = _model(mode, 'python')
+    compiled = _model(mode, 'numba')
+
+    for treatmentEffect in _treatmentEffects():
+        assert compiled.step(treatmentEffect) == reference.step(treatmentEffect)
+    assert compiled.ModelState.BpdMood == reference.ModelState.BpdMood
+
+# ------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('mode', INJECT_MODES)
+def test_python_step_many_matches_step(mode):
+    treatmentEffects = _treatmentEffects()
+    model = _model(mode, 'python')
+    expected = [model.step(treatmentEffect) for treatmentEffect in treatmentEffects]
+
+    out = _model(mode, 'python').step_many(treatmentEffects)
+    np.testing.assert_array_equal(out.EB, [eb for eb, _, _ in expected])
+    np.testing.assert_array_equal(out.P, [p for _, p, _ in expected])
+    np.testing.assert_array_equal(out.N, [n for _, _, n in expected])
+
+# ------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('mode', INJECT_MODES)
+def test_numba_step_many_matches_python(mode):
+    pytest.importorskip('numba')
+    treatmentEffects = _treatmentEffects()
+    reference = _model(mode, 'python').step_many(treatmentEffects)
+    compiled = _model(mode, 'numba').step_many(treatmentEffects)
+
+    np.testing.assert_array_equal(compiled.EB, reference.EB)
+    np.testing.assert_array_equal(compiled.P, reference.P)
+    np.testing.assert_array_equal(compiled.N, reference.N)
+    np.testing.assert_array_equal(compiled.BpdMood, reference.BpdMood)